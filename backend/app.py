@@ -11,6 +11,7 @@ from backend.config import get_settings
 from backend.database import init_db
 from backend.routes import auto_edit, chat, consent, ingest, multi_chat, render, social, timeline, tools
 from backend.schemas import APIMessage, HealthResponse
+from backend.services.render_progress import render_progress_hub
 from backend.workers.queue import queue_manager
 
 settings = get_settings()
@@ -51,17 +52,20 @@ async def unhandled_exception_handler(_: Request, exc: Exception) -> JSONRespons
 @app.on_event("startup")
 async def startup_event() -> None:
     init_db()
-    # queue_manager.ensure_worker()  # Disabled - run worker separately with: rq worker renders
+    if settings.render_progress_push:
+        render_progress_hub.start(settings.redis_url)
+    # queue_manager.ensure_worker()  # Disabled - run worker separately with: rq worker -w backend.workers.queue.PriorityWorker render-interactive renders render-bulk
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
+    await render_progress_hub.stop()
     # queue_manager.shutdown_worker()  # Disabled
-    pass
 
 
 for directory, mount in [
     (settings.final_dir, "/media/final"),
+    (settings.preview_dir, "/media/previews"),
     (settings.ingest_dir, "/media/ingest"),
     (settings.consent_dir, "/media/consent"),
     (settings.thumbnails_dir, "/media/thumbnails"),
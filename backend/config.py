@@ -4,7 +4,7 @@ import json
 import logging
 from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 from dotenv import load_dotenv
 from pydantic import Field, field_validator
@@ -31,6 +31,10 @@ class Settings(BaseSettings):
     sfx_dir: Path = Field(default=ROOT_DIR / "media" / "sfx")
     consent_dir: Path = Field(default=ROOT_DIR / "media" / "consent")
     thumbnails_dir: Path = Field(default=ROOT_DIR / "media" / "thumbnails")
+    segments_dir: Path = Field(default=ROOT_DIR / "media" / "segments")
+    preview_dir: Path = Field(default=ROOT_DIR / "media" / "previews")
+    normalized_dir: Path = Field(default=ROOT_DIR / "media" / "normalized")
+    stems_dir: Path = Field(default=ROOT_DIR / "media" / "stems")
 
     whisper_model: str = Field(default="small.en")
     chat_backend: str = Field(default="stub")
@@ -43,6 +47,63 @@ class Settings(BaseSettings):
     watermark_enabled: bool = Field(default=True)
     watermark_text: str = Field(default="ai-video-editor")
 
+    # Render pipeline
+    render_engine: str = Field(default="ffmpeg")  # "ffmpeg" filtergraph or "moviepy"
+    render_single_pass: bool = Field(default=True)
+    render_parallel_segments: bool = Field(default=True)
+    render_segment_workers: int = Field(default=0)  # 0 = one process per CPU core
+
+    # Render and segment caches
+    render_cache_enabled: bool = Field(default=True)
+    render_cache_max_bytes: int = Field(default=10 * 1024**3)
+    segment_cache_max_bytes: int = Field(default=5 * 1024**3)
+
+    # Previews and progressive output
+    preview_max_bytes: int = Field(default=1024**3)
+    preview_max_age_seconds: int = Field(default=2 * 60 * 60)
+    render_progressive_segment_seconds: float = Field(default=2.0)  # HLS segment length for progressive renders
+    render_progressive_max_age_seconds: int = Field(default=24 * 60 * 60)  # progressive playlists are swept after this
+
+    # Render queue: progress, priorities, retries and admission
+    render_progress_push: bool = Field(default=True)
+    render_job_log_limit: int = Field(default=50)  # live log lines kept in RQ job meta
+    render_priority_starvation_limit: int = Field(default=4)  # higher-class jobs before a waiting lower class goes first
+    render_preempt_bulk: bool = Field(default=True)  # interactive jobs may bump a running bulk render
+    render_max_retries: int = Field(default=2)  # RQ retries; each attempt resumes from stage checkpoints
+    render_admission_enabled: bool = Field(default=True)
+    render_capacity_cpu_seconds: float = Field(default=4 * 60 * 60)  # predicted queued+running work before jobs are deferred to bulk
+    render_admission_reject_factor: float = Field(default=2.0)  # reject new jobs above this multiple of capacity
+    render_worker_memory_mb: int = Field(default=8192)  # segment encoders are capped to fit; jobs that cannot fit one are rejected
+
+    # Auto-edit
+    auto_edit_single_pass: bool = Field(default=True)  # false runs the step-by-step debug pipeline
+    auto_edit_checkpoints: str = Field(default="")  # comma-separated step-by-step stages also written to disk
+    auto_edit_normalize: bool = Field(default=True)  # convert clips to the plan's canvas before editing
+    auto_edit_normalize_workers: int = Field(default=0)  # 0 = one conversion per CPU core
+    auto_edit_normalize_preset: str = Field(default="veryfast")
+    normalized_cache_max_bytes: int = Field(default=5 * 1024**3)
+    auto_edit_smart_cut: bool = Field(default=True)  # cut-only plans copy whole GOPs instead of re-encoding
+    auto_edit_sync_max_clips: int = Field(default=2)  # plans this small may run inside the request (`wait=true`)
+    auto_edit_sync_max_seconds: float = Field(default=15.0)
+    auto_edit_batch_max_plans: int = Field(default=100)  # plans accepted by one `/api/auto-edit/batch` request
+    auto_edit_audio_stems: bool = Field(default=True)  # mix music/SFX through cached pre-mixed stems
+    audio_stem_cache_max_bytes: int = Field(default=1024**3)
+
+    # Media probing
+    probe_cache_max_entries: int = Field(default=1024)  # in-memory LRU of ffprobe results
+    probe_cache_path: Optional[Path] = Field(default=None)  # JSON file persisting probes across restarts; unset = memory only
+
+    # ffmpeg process limits
+    ffmpeg_timeout_seconds: float = Field(default=0.0)  # wall-clock limit per ffmpeg invocation; 0 = none
+    ffmpeg_cpu_limit_seconds: int = Field(default=0)  # RLIMIT_CPU per ffmpeg process; 0 = none
+    ffmpeg_memory_limit_bytes: int = Field(default=0)  # RLIMIT_AS per ffmpeg process; 0 = none
+
+    # Thumbnail sprites
+    sprite_interval_seconds: float = Field(default=2.0)  # scrub-strip spacing; widened for long assets
+    sprite_max_tiles: int = Field(default=100)
+    sprite_columns: int = Field(default=10)
+    sprite_tile_width: int = Field(default=160)
+
     log_level: str = Field(default="INFO")
 
     # AI Model Configuration (AIVE_ prefix added automatically)
@@ -74,6 +135,10 @@ class Settings(BaseSettings):
         "sfx_dir",
         "consent_dir",
         "thumbnails_dir",
+        "segments_dir",
+        "preview_dir",
+        "normalized_dir",
+        "stems_dir",
         "template_path",
         "video_model_path",
         "image_edit_model_path",
@@ -113,6 +178,10 @@ def get_settings() -> Settings:
         settings.sfx_dir,
         settings.consent_dir,
         settings.thumbnails_dir,
+        settings.segments_dir,
+        settings.preview_dir,
+        settings.normalized_dir,
+        settings.stems_dir,
     ):
         directory.mkdir(parents=True, exist_ok=True)
     settings.configure_logging()
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -57,6 +57,68 @@ class Render(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     project = relationship("Project", back_populates="renders")
+    events = relationship("RenderEvent", back_populates="render", cascade="all, delete-orphan", order_by="RenderEvent.id")
+    outputs = relationship("RenderOutput", back_populates="render", cascade="all, delete-orphan", order_by="RenderOutput.id")
+    checkpoints = relationship("RenderCheckpoint", back_populates="render", cascade="all, delete-orphan")
+
+
+class RenderCheckpoint(Base):
+    __tablename__ = "render_checkpoints"
+    __table_args__ = (UniqueConstraint("render_id", "stage", name="uq_render_checkpoint_stage"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    render_id = Column(Integer, ForeignKey("renders.id"), nullable=False, index=True)
+    stage = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)  # render inputs the stage was produced from
+    path = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    render = relationship("Render", back_populates="checkpoints")
+
+
+class RenderOutput(Base):
+    __tablename__ = "render_outputs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    render_id = Column(Integer, ForeignKey("renders.id"), nullable=False, index=True)
+    variant = Column(String, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    output_path = Column(String, nullable=False)
+    output_url = Column(String, nullable=False)
+    size_bytes = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    render = relationship("Render", back_populates="outputs")
+
+
+class RenderEvent(Base):
+    __tablename__ = "render_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    render_id = Column(Integer, ForeignKey("renders.id"), nullable=False, index=True)
+    job_id = Column(String, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    stage = Column(String, nullable=True)
+    level = Column(String, default="info", nullable=False)
+    message = Column(Text, nullable=False)
+    progress = Column(Float, nullable=True)
+
+    render = relationship("Render", back_populates="events")
+
+
+class RenderCacheEntry(Base):
+    __tablename__ = "render_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    fingerprint = Column(String, nullable=False, unique=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    output_path = Column(String, nullable=False)
+    output_url = Column(String, nullable=False)
+    size_bytes = Column(Integer, default=0, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
 class Consent(Base):
@@ -1,6 +1,12 @@
 """
 Auto-Editing API Routes
 Endpoints for automatic video editing
+
+Edits run on the render workers: the POST endpoints return a job id and
+`/status/{job_id}` reports progress parsed from ffmpeg. Tiny plans may still
+be run inside the request with `wait=true` (in the thread pool, never on the
+event loop). `/batch` queues many plans and shares the preparation of plans
+over the same clips.
 """
 
 from __future__ import annotations
@@ -8,9 +14,12 @@ from __future__ import annotations
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
+from backend.config import get_settings
+
 from backend.services.auto_editor import (
     AudioTrack,
     AutoEditor,
@@ -19,8 +28,11 @@ from backend.services.auto_editor import (
     VideoClip,
     get_auto_editor,
 )
+from backend.services.render_progress import TERMINAL_STATUSES
+from backend.workers.queue import PRIORITY_CLASSES, queue_manager
 
 router = APIRouter()
+settings = get_settings()
 
 
 class VideoClipRequest(BaseModel):
@@ -54,16 +66,47 @@ class EditVideoRequest(BaseModel):
     transitions: str = Field(default="fade", description="Transition type: fade, cut, dissolve")
     output_resolution: str = Field(default="1080x1920", description="Output resolution (width x height)")
     output_fps: int = Field(default=30, description="Output frames per second")
+    wait: bool = Field(default=False, description="Edit inside the request instead of queueing; tiny plans only")
 
 
 class EditVideoResponse(BaseModel):
-    output_path: str = Field(..., description="Path to edited video")
-    output_url: str = Field(..., description="URL to access edited video")
-    duration: float = Field(..., description="Total duration in seconds")
+    job_id: Optional[str] = Field(default=None, description="Worker job id; poll status_url until finished")
+    status: str = Field(..., description="queued, or finished for wait=true edits")
+    status_url: Optional[str] = Field(default=None, description="Progress endpoint for queued edits")
+    output_path: Optional[str] = Field(default=None, description="Path to edited video")
+    output_url: Optional[str] = Field(default=None, description="URL to access edited video")
+    duration: Optional[float] = Field(default=None, description="Total duration in seconds")
+
+
+class BatchEditRequest(BaseModel):
+    plans: List[EditVideoRequest] = Field(..., min_length=1, description="Plans to edit; `wait` is ignored")
+    priority: str = Field(default="normal", description="Queue priority: interactive, normal, bulk")
+
+
+class BatchEditGroup(BaseModel):
+    job_id: str = Field(..., description="Job that probes, normalizes and mixes audio stems for the group")
+    plan_indexes: List[int] = Field(..., description="Positions in `plans` of the plans sharing these clips")
+
+
+class BatchEditResponse(BaseModel):
+    status: str = "queued"
+    groups: List[BatchEditGroup]
+    jobs: List[EditVideoResponse] = Field(..., description="One queued edit per plan, in request order")
 
 
-@router.post("/edit", response_model=EditVideoResponse)
-async def edit_video(request: EditVideoRequest) -> EditVideoResponse:
+class AutoEditStatus(BaseModel):
+    id: str
+    status: str
+    progress: float = 0.0
+    logs: List[str] = Field(default_factory=list)
+    output_path: Optional[str] = None
+    output_url: Optional[str] = None
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+
+@router.post("/edit", response_model=EditVideoResponse, status_code=202)
+async def edit_video(request: EditVideoRequest, response: Response) -> EditVideoResponse:
     """
     Automatic video editing - combines clips, adds captions, music, effects.
 
@@ -86,6 +129,112 @@ async def edit_video(request: EditVideoRequest) -> EditVideoResponse:
       "transitions": "fade"
     }
     """
+    return await _submit(_plan_from_request(request), request.wait, response)
+
+
+@router.post("/quick-edit", response_model=EditVideoResponse, status_code=202)
+async def quick_edit(
+    clip_paths: List[str],
+    response: Response,
+    add_captions: bool = False,
+    add_music: bool = False,
+    platform: str = "tiktok",
+    wait: bool = False,
+) -> EditVideoResponse:
+    """
+    Quick edit - simple concatenation with optional captions/music.
+
+    Example:
+    POST /api/auto-edit/quick-edit
+    {
+      "clip_paths": [
+        "/path/to/clip1.mp4",
+        "/path/to/clip2.mp4"
+      ],
+      "add_captions": true,
+      "platform": "tiktok"
+    }
+    """
+    # Validate paths
+    clips = []
+    for path_str in clip_paths:
+        path = Path(path_str)
+        if not path.exists():
+            raise HTTPException(status_code=404, detail=f"Clip not found: {path_str}")
+        clips.append(VideoClip(path=path))
+
+    plan = EditingPlan(clips=clips, transitions="fade", output_resolution="1080x1920")
+
+    # Auto-generate captions if requested
+    if add_captions:
+        # Simple auto-captions at start of each clip
+        captions = []
+        current_time = 0.0
+        for i, clip in enumerate(clips):
+            captions.append(
+                Caption(text=f"Part {i+1}", start=current_time + 0.5, end=current_time + 2.0, position="bottom")
+            )
+            # Estimate clip duration (will be filled in by editor)
+            current_time += 5.0  # Assume 5s per clip
+
+        plan.captions = captions
+
+    return await _submit(plan, wait, response)
+
+
+@router.post("/batch", response_model=BatchEditResponse, status_code=202)
+async def batch_edit(request: BatchEditRequest) -> BatchEditResponse:
+    """
+    Queue many plans at once, e.g. A/B variants of one clip set.
+
+    Plans over the same clips, canvas and frame rate form a group: its
+    sources are probed and normalized once and each music/SFX layout is
+    mixed into its cached audio stem once. The plans themselves then edit in
+    parallel across the render workers; each has its own job and status.
+    """
+    if len(request.plans) > settings.auto_edit_batch_max_plans:
+        raise HTTPException(status_code=422, detail=f"A batch is limited to {settings.auto_edit_batch_max_plans} plans")
+    if request.priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {request.priority}")
+    plans = [_plan_from_request(plan_request) for plan_request in request.plans]
+    queued = queue_manager.enqueue_auto_edit_batch(plans, priority=request.priority)
+
+    jobs: List[Optional[EditVideoResponse]] = [None] * len(plans)
+    groups = []
+    for group_job, edit_jobs in queued:
+        groups.append(BatchEditGroup(job_id=group_job.id, plan_indexes=[index for index, _ in edit_jobs]))
+        for index, job in edit_jobs:
+            jobs[index] = EditVideoResponse(job_id=job.id, status="queued", status_url=f"/api/auto-edit/status/{job.id}")
+    return BatchEditResponse(groups=groups, jobs=jobs)
+
+
+@router.get("/status/{job_id}", response_model=AutoEditStatus)
+async def auto_edit_status(job_id: str) -> AutoEditStatus:
+    """Progress of a queued edit; `output_url` is set once it has finished."""
+    job = queue_manager.fetch_job(job_id)
+    if not job or (job.meta or {}).get("kind") not in ("auto_edit", "auto_edit_group"):
+        raise HTTPException(status_code=404, detail="Auto-edit job not found")
+
+    meta = job.meta or {}
+    status = meta.get("status") or job.get_status(refresh=False)
+    # A worker that died mid-edit never wrote its own failure.
+    if status not in TERMINAL_STATUSES and job.is_failed:
+        status = "failed"
+    edit = meta.get("edit") or {}
+    return AutoEditStatus(
+        id=job_id,
+        status=status,
+        progress=float(meta.get("progress") or 0.0),
+        logs=list(meta.get("logs") or []),
+        output_path=edit.get("output_path"),
+        output_url=edit.get("output_url"),
+        duration=edit.get("duration"),
+        error=meta.get("error"),
+    )
+
+
+def _plan_from_request(request: EditVideoRequest) -> EditingPlan:
+    """Validate the request's media paths and convert it into an `EditingPlan`."""
     # Validate all clip paths exist
     for clip_req in request.clips:
         clip_path = Path(clip_req.path)
@@ -148,8 +297,7 @@ async def edit_video(request: EditVideoRequest) -> EditVideoResponse:
                 )
             )
 
-    # Create editing plan
-    plan = EditingPlan(
+    return EditingPlan(
         clips=clips,
         captions=captions,
         music=music,
@@ -159,65 +307,37 @@ async def edit_video(request: EditVideoRequest) -> EditVideoResponse:
         output_fps=request.output_fps,
     )
 
-    # Execute editing
-    editor = get_auto_editor()
-    output_path = editor.edit_video(plan)
-
-    # Get duration
-    duration = editor.get_video_duration(output_path)
-
-    # Generate URL
-    output_url = f"/media/final/{output_path.name}"
-
-    return EditVideoResponse(output_path=str(output_path), output_url=output_url, duration=duration)
-
-
-@router.post("/quick-edit")
-async def quick_edit(
-    clip_paths: List[str],
-    add_captions: bool = False,
-    add_music: bool = False,
-    platform: str = "tiktok",
-):
-    """
-    Quick edit - simple concatenation with optional captions/music.
-
-    Example:
-    POST /api/auto-edit/quick-edit
-    {
-      "clip_paths": [
-        "/path/to/clip1.mp4",
-        "/path/to/clip2.mp4"
-      ],
-      "add_captions": true,
-      "platform": "tiktok"
-    }
-    """
-    # Validate paths
-    clips = []
-    for path_str in clip_paths:
-        path = Path(path_str)
-        if not path.exists():
-            raise HTTPException(status_code=404, detail=f"Clip not found: {path_str}")
-        clips.append(VideoClip(path=path))
-
-    plan = EditingPlan(clips=clips, transitions="fade", output_resolution="1080x1920")
-
-    # Auto-generate captions if requested
-    if add_captions:
-        # Simple auto-captions at start of each clip
-        captions = []
-        current_time = 0.0
-        for i, clip in enumerate(clips):
-            captions.append(
-                Caption(text=f"Part {i+1}", start=current_time + 0.5, end=current_time + 2.0, position="bottom")
-            )
-            # Estimate clip duration (will be filled in by editor)
-            current_time += 5.0  # Assume 5s per clip
 
-        plan.captions = captions
+async def _submit(plan: EditingPlan, wait: bool, response: Response) -> EditVideoResponse:
+    """Queue the plan, or edit it in the thread pool when the caller waits and the plan is tiny."""
+    if not wait:
+        job = queue_manager.enqueue_auto_edit(plan)
+        return EditVideoResponse(job_id=job.id, status="queued", status_url=f"/api/auto-edit/status/{job.id}")
 
     editor = get_auto_editor()
-    output_path = editor.edit_video(plan)
+    if not await run_in_threadpool(_is_tiny_plan, editor, plan):
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                f"wait=true is limited to {settings.auto_edit_sync_max_clips} clips and "
+                f"{settings.auto_edit_sync_max_seconds:g} seconds; submit without wait and poll the job"
+            ),
+        )
+    output_path = await run_in_threadpool(editor.edit_video, plan)
+    duration = await run_in_threadpool(editor.get_video_duration, output_path)
+    response.status_code = 200
+    return EditVideoResponse(
+        status="finished",
+        output_path=str(output_path),
+        output_url=f"/media/final/{output_path.name}",
+        duration=duration,
+    )
+
 
-    return {"output_path": str(output_path), "output_url": f"/media/final/{output_path.name}"}
+def _is_tiny_plan(editor: AutoEditor, plan: EditingPlan) -> bool:
+    if len(plan.clips) > settings.auto_edit_sync_max_clips:
+        return False
+    for clip in plan.clips:
+        if clip.duration is None:
+            clip.duration = editor.get_video_duration(clip.path)
+    return editor.output_duration(plan) <= settings.auto_edit_sync_max_seconds
@@ -8,7 +8,6 @@ from pathlib import Path
 from typing import Optional
 from uuid import uuid4
 
-import ffmpeg
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
@@ -19,6 +18,8 @@ from backend.models import Asset, Project
 from backend.schemas import AssetSchema, ConsentSchema, IngestResponse, ProjectSchema, TimelineSchema
 from backend.services.beat_detection import BeatDetectionService
 from backend.services.captions import CaptionService
+from backend.services.probe_cache import ProbeError, probe_media
+from backend.services.thumbnails import generate_asset_thumbnails, sprite_urls
 from backend.services.timeline_engine import TimelineEngine
 
 LOGGER = logging.getLogger(__name__)
@@ -36,45 +37,13 @@ def _validate_extension(filename: str) -> None:
 
 def _probe_video(path: Path) -> tuple[float, str, float]:
     try:
-        probe = ffmpeg.probe(str(path))
-    except ffmpeg.Error as exc:  # pragma: no cover - ffmpeg handles its own messaging
+        probe = probe_media(path)
+    except ProbeError as exc:  # pragma: no cover - ffmpeg handles its own messaging
         raise HTTPException(status_code=500, detail="Failed to inspect uploaded video") from exc
 
-    duration = float(probe["format"].get("duration", 0.0))
-    video_stream = next((stream for stream in probe["streams"] if stream.get("codec_type") == "video"), None)
-    if not video_stream:
+    if not probe.has_video:
         raise HTTPException(status_code=400, detail="No video stream detected in upload")
-
-    width = int(video_stream.get("width", 0))
-    height = int(video_stream.get("height", 0))
-    resolution = f"{width}x{height}"
-
-    fps_str = video_stream.get("r_frame_rate", "0/1")
-    try:
-        num, denom = fps_str.split("/")
-        fps = float(num) / float(denom) if float(denom) != 0 else 0.0
-    except Exception:
-        fps = 0.0
-
-    return duration, resolution, fps
-
-
-def _generate_thumbnail(video_path: Path) -> Optional[Path]:
-    thumbnails_dir = settings.thumbnails_dir
-    thumbnails_dir.mkdir(parents=True, exist_ok=True)
-    thumbnail_path = thumbnails_dir / f"{video_path.stem}_{uuid4().hex[:8]}.jpg"
-    try:
-        (
-            ffmpeg
-            .input(str(video_path), ss=1)
-            .filter("scale", 480, -1)
-            .output(str(thumbnail_path), vframes=1)
-            .run(quiet=True, overwrite_output=True)
-        )
-    except Exception as exc:  # pragma: no cover - thumbnail failure tolerated
-        LOGGER.warning("Thumbnail generation failed for %s: %s", video_path, exc)
-        return None
-    return thumbnail_path
+    return probe.duration, probe.resolution, probe.fps
 
 
 def _project_to_schema(project: Project) -> ProjectSchema:
@@ -95,6 +64,7 @@ def _project_to_schema(project: Project) -> ProjectSchema:
             document_url=f"/media/consent/{Path(consent.document_path).name}" if consent.document_path else None,
             updated_at=consent.updated_at,
         )
+    sprite_url, sprite_vtt_url = sprite_urls(Path(asset.path))
     asset_schema = AssetSchema(
         id=asset.id,
         path=asset.path,
@@ -103,6 +73,8 @@ def _project_to_schema(project: Project) -> ProjectSchema:
         fps=asset.fps,
         thumbnail_url=f"/media/thumbnails/{Path(asset.thumbnail_path).name}" if asset.thumbnail_path else None,
         ingest_url=f"/media/ingest/{Path(asset.path).name}",
+        sprite_url=sprite_url,
+        sprite_vtt_url=sprite_vtt_url,
         created_at=asset.created_at,
         updated_at=asset.updated_at,
     )
@@ -134,7 +106,10 @@ async def ingest_video(
         shutil.copyfileobj(file.file, buffer)
 
     duration, resolution, fps = _probe_video(destination)
-    thumbnail_path = _generate_thumbnail(destination)
+    width, height = (int(value) for value in resolution.split("x"))
+    # Poster, scrub sprite sheet and its WebVTT index come from one decode.
+    thumbnails = await run_in_threadpool(generate_asset_thumbnails, destination, duration, width, height)
+    thumbnail_path = thumbnails.poster_path
 
     asset = Asset(
         path=str(destination),
@@ -1,13 +1,24 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from pathlib import Path
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from backend.config import get_settings
 from backend.database import get_session
-from backend.models import Consent, Project, Render
-from backend.schemas import RenderRequest, RenderResponse, RenderStatus
-from backend.workers.queue import queue_manager
+from backend.models import Consent, Project, Render, RenderEvent
+from backend.schemas import RenderEventPage, RenderEventSchema, RenderRequest, RenderResponse, RenderStatus
+from backend.services.render_cache import render_cache, render_fingerprint, timeline_is_empty
+from backend.services.render_estimator import DEFER, REJECT, RenderEstimate, admission_decision, estimate_render
+from backend.services.render_profile import FINAL_PROFILE, OUTPUT_PROFILES, PREVIEW_PROFILE, RenderProfile
+from backend.services.render_progress import TERMINAL_STATUSES, publish_progress, render_progress_hub
+from backend.workers.queue import PRIORITY_CLASSES, QUEUE_PRIORITY, queue_manager
 
 router = APIRouter()
 settings = get_settings()
@@ -26,21 +37,256 @@ async def enqueue_render(project_id: int, payload: RenderRequest | None = None,
         raise HTTPException(status_code=400, detail="Creator consent required before rendering")
 
     watermark = payload.watermark if payload else None
-    job = queue_manager.enqueue_render(project_id, watermark=watermark)
+    preview = bool(payload and payload.preview)
+    # Previews are never watermarked; they are not meant to leave the editor.
+    effective_watermark = False if preview else (settings.watermark_enabled if watermark is None else bool(watermark))
+    profile = PREVIEW_PROFILE if preview else FINAL_PROFILE
+    variants = [] if preview or not payload else list(dict.fromkeys(payload.variants))
+    progressive = bool(payload and payload.progressive) and not preview
+    unknown = [name for name in variants if name not in OUTPUT_PROFILES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown output variants: {', '.join(unknown)}")
+
+    # Variants are encoded by the worker, so only plain renders can be answered from the cache here.
+    engine = "ffmpeg" if progressive else None
+    cached = None if variants else await _lookup_cached_render(session, project, effective_watermark, profile, engine)
+    if cached:
+        return cached
+
+    priority = payload.priority if payload else None
+    if priority is not None and priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}")
+
+    estimate = _estimate(project, profile, variants, progressive)
+    admission = None
+    # Previews are small and interactive by definition; only full renders are budgeted.
+    if settings.render_admission_enabled and not preview:
+        outstanding = await run_in_threadpool(queue_manager.outstanding_cpu_seconds)
+        decision = admission_decision(estimate, outstanding, priority or "normal")
+        if decision.action == REJECT:
+            if decision.retry_after is None:
+                raise HTTPException(status_code=422, detail=decision.reason)
+            raise HTTPException(status_code=503, detail=decision.reason, headers={"Retry-After": str(decision.retry_after)})
+        if decision.action == DEFER:
+            priority = "bulk"
+        admission = decision.action
 
-    effective_watermark = settings.watermark_enabled if watermark is None else bool(watermark)
-    log_line = f"Queued render job (watermark={'on' if effective_watermark else 'off'})"
-    render_record = Render(project=project, job_id=job.id, status="queued", progress=0.0, logs=log_line)
+    job = queue_manager.enqueue_render(
+        project_id,
+        watermark=watermark,
+        preview=preview,
+        variants=variants,
+        priority=priority,
+        progressive=progressive,
+        estimate=estimate.as_dict(),
+    )
+    priority = job.meta["priority"]
+    # Status is left out: the worker may already have picked the job up.
+    publish_progress(queue_manager.redis, job.id, {"priority": priority})
+
+    kind = "preview" if preview else "render"
+    log_line = (
+        f"Queued {kind} job (watermark={'on' if effective_watermark else 'off'}, priority={priority}, "
+        f"estimated {estimate.cpu_seconds:.0f} CPU-s, {estimate.peak_memory_mb:.0f} MB)"
+    )
+    render_record = Render(project=project, job_id=job.id, status="queued", progress=0.0)
+    render_record.events.append(RenderEvent(job_id=job.id, stage="queued", message=log_line, progress=0.0))
     session.add(render_record)
-    project.status = "queued"
+    if not preview:
+        project.status = "queued"
     session.commit()
 
     status_url = f"/api/render/status/{job.id}"
-    return RenderResponse(job_id=job.id, status_url=status_url)
+    return RenderResponse(
+        job_id=job.id,
+        status_url=status_url,
+        preview=preview,
+        priority=priority,
+        estimate=estimate.as_dict(),
+        admission=admission,
+    )
+
+
+def _estimate(project: Project, profile: RenderProfile, variants: list[str], progressive: bool) -> RenderEstimate:
+    asset = project.asset
+    timeline = None if timeline_is_empty(project.timeline_json) else json.loads(project.timeline_json)
+    # Variants encoded exactly like the main output reuse its file and cost nothing extra.
+    extra = {item.digest(): item for item in (OUTPUT_PROFILES[name] for name in variants) if item.digest() != profile.digest()}
+    return estimate_render(
+        asset.duration,
+        asset.resolution,
+        asset.fps,
+        timeline,
+        profile,
+        list(extra.values()),
+        engine="ffmpeg" if progressive else None,
+        parallel=False if progressive else None,
+    )
+
+
+async def _lookup_cached_render(
+    session: Session, project: Project, watermark: bool, profile: RenderProfile, engine: str | None = None
+) -> RenderResponse | None:
+    if not render_cache.enabled or timeline_is_empty(project.timeline_json):
+        return None
+    asset_path = Path(project.asset.path)
+    if not asset_path.exists():
+        return None
+
+    fingerprint = await run_in_threadpool(render_fingerprint, asset_path, project.timeline_json, watermark, profile, engine)
+    entry = render_cache.lookup(session, fingerprint)
+    if not entry:
+        return None
+
+    job_id = f"cache-{uuid4().hex}"
+    render_record = Render(
+        project=project,
+        job_id=job_id,
+        status="finished",
+        progress=100.0,
+        output_path=entry.output_path,
+        output_url=entry.output_url,
+    )
+    render_record.events.append(
+        RenderEvent(job_id=job_id, stage="finished", message=f"Served from render cache ({fingerprint[:12]})", progress=100.0)
+    )
+    session.add(render_record)
+    preview = profile.name == PREVIEW_PROFILE.name
+    if not preview:
+        project.status = "rendered"
+    session.commit()
+    return RenderResponse(
+        job_id=job_id,
+        status_url=f"/api/render/status/{job_id}",
+        cached=True,
+        preview=preview,
+        output_url=entry.output_url,
+    )
 
 
 @router.get("/render/status/{job_id}", response_model=RenderStatus)
 async def render_status(job_id: str, session: Session = Depends(get_session)) -> RenderStatus:
+    snapshot = _snapshot_status(job_id)
+    if snapshot:
+        return snapshot
+    status = _load_status(job_id, session)
+    render_progress_hub.seed(job_id, status.model_dump())
+    return status
+
+
+@router.post("/render/cancel/{job_id}", response_model=RenderStatus)
+async def cancel_render(job_id: str, session: Session = Depends(get_session)) -> RenderStatus:
+    """Cancel a queued render immediately, or ask a running one to stop at its next checkpoint."""
+    job = queue_manager.fetch_job(job_id)
+    render_record = session.query(Render).filter_by(job_id=job_id).one_or_none()
+    if not job and not render_record:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    status = (job.meta or {}).get("status") if job else render_record.status
+    if status in TERMINAL_STATUSES or (job and job.get_status(refresh=True) in ("finished", "failed", "canceled")):
+        raise HTTPException(status_code=409, detail=f"Render already {status}")
+    if not job:
+        raise HTTPException(status_code=409, detail="Render job is no longer tracked by the queue")
+
+    canceled = queue_manager.cancel_render(job)
+    if render_record:
+        message = "Render canceled before it started" if canceled else "Cancellation requested"
+        if canceled:
+            render_record.status = "canceled"
+            if render_record.project.status == "queued":
+                render_record.project.status = "canceled"
+        session.add(
+            RenderEvent(
+                render_id=render_record.id,
+                job_id=job_id,
+                stage=render_record.status,
+                level="warning",
+                message=message,
+                progress=render_record.progress,
+            )
+        )
+        session.commit()
+    return _load_status(job_id, session)
+
+
+@router.get("/render/events/{job_id}", response_model=RenderEventPage)
+async def render_events(
+    job_id: str,
+    after_id: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=500),
+    session: Session = Depends(get_session),
+) -> RenderEventPage:
+    """Render history in insertion order; pass `next_after_id` back as `after_id` for the next page."""
+    if not session.query(Render.id).filter_by(job_id=job_id).first():
+        raise HTTPException(status_code=404, detail="Job not found")
+    events = (
+        session.query(RenderEvent)
+        .filter(RenderEvent.job_id == job_id, RenderEvent.id > after_id)
+        .order_by(RenderEvent.id.asc())
+        .limit(limit)
+        .all()
+    )
+    return RenderEventPage(
+        job_id=job_id,
+        events=[RenderEventSchema.model_validate(event) for event in events],
+        next_after_id=events[-1].id if len(events) == limit else None,
+    )
+
+
+@router.get("/render/stream/{job_id}")
+async def render_stream(job_id: str, request: Request, session: Session = Depends(get_session)) -> StreamingResponse:
+    """Server-Sent Events feed of progress/log updates published by the render worker."""
+    initial = _snapshot_status(job_id) or _load_status(job_id, session)
+    render_progress_hub.seed(job_id, initial.model_dump())
+    queue = render_progress_hub.subscribe(job_id)
+
+    async def _events():
+        try:
+            yield _sse("status", initial.model_dump())
+            if initial.status in TERMINAL_STATUSES:
+                return
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse("progress", event)
+                if event.get("status") in TERMINAL_STATUSES:
+                    break
+        finally:
+            render_progress_hub.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _snapshot_status(job_id: str) -> RenderStatus | None:
+    snapshot = render_progress_hub.snapshot(job_id)
+    if not snapshot:
+        return None
+    result = snapshot.get("result")
+    return RenderStatus(
+        id=job_id,
+        status=snapshot["status"],
+        progress=float(snapshot["progress"]),
+        logs=snapshot["logs"],
+        result=result,
+        output_url=result if snapshot["status"] == "finished" else None,
+        outputs=snapshot.get("outputs") or {},
+        priority=snapshot.get("priority"),
+        error=snapshot.get("error"),
+    )
+
+
+def _load_status(job_id: str, session: Session) -> RenderStatus:
     job = queue_manager.fetch_job(job_id)
     render_record = session.query(Render).filter_by(job_id=job_id).one_or_none()
 
@@ -50,14 +296,18 @@ async def render_status(job_id: str, session: Session = Depends(get_session)) ->
     meta = job.meta if job else {}
     status = meta.get("status", job.get_status(refresh=True) if job else (render_record.status if render_record else "unknown"))
     progress = meta.get("progress", 0.0) if job else (render_record.progress if render_record else 0.0)
-    logs = meta.get("logs", []) if job else (render_record.logs.splitlines() if render_record and render_record.logs else [])
+    logs = meta.get("logs", []) if job else _recent_logs(session, render_record)
     result = meta.get("result") if job else (render_record.output_url if render_record else None)
     error = meta.get("error") if job else None
+    outputs = dict(meta.get("outputs") or {})
+    priority = meta.get("priority") or (QUEUE_PRIORITY.get(job.origin) if job else None)
     output_url = None
 
     if render_record and render_record.output_url:
         output_url = render_record.output_url
         result = result or render_record.output_url
+    if render_record and not outputs:
+        outputs = {output.variant: output.output_url for output in render_record.outputs}
 
     return RenderStatus(
         id=job_id,
@@ -66,5 +316,23 @@ async def render_status(job_id: str, session: Session = Depends(get_session)) ->
         logs=logs,
         result=result,
         output_url=output_url,
+        outputs=outputs,
+        priority=priority,
         error=error,
     )
+
+
+def _recent_logs(session: Session, render_record: Render | None) -> list[str]:
+    if not render_record:
+        return []
+    events = (
+        session.query(RenderEvent.message)
+        .filter(RenderEvent.render_id == render_record.id)
+        .order_by(RenderEvent.id.desc())
+        .limit(settings.render_job_log_limit)
+        .all()
+    )
+    if events:
+        return [message for (message,) in reversed(events)]
+    # Renders recorded before render_events existed kept their history inline.
+    return render_record.logs.splitlines() if render_record.logs else []
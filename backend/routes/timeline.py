@@ -22,6 +22,7 @@ from backend.schemas import (
 )
 from backend.services.beat_detection import BeatDetectionService
 from backend.services.captions import CaptionService
+from backend.services.thumbnails import sprite_urls
 from backend.services.timeline_engine import TimelineEngine
 
 router = APIRouter()
@@ -35,10 +36,11 @@ def _public_ingest_url(asset: Asset) -> str:
 def _public_thumbnail_url(asset: Asset) -> str | None:
     if not asset.thumbnail_path:
         return None
-    return f"/media/ingest/{Path(asset.thumbnail_path).name}"
+    return f"/media/thumbnails/{Path(asset.thumbnail_path).name}"
 
 
 def _asset_to_schema(asset: Asset) -> AssetSchema:
+    sprite_url, sprite_vtt_url = sprite_urls(Path(asset.path))
     return AssetSchema(
         id=asset.id,
         path=asset.path,
@@ -47,6 +49,8 @@ def _asset_to_schema(asset: Asset) -> AssetSchema:
         fps=asset.fps,
         thumbnail_url=_public_thumbnail_url(asset),
         ingest_url=_public_ingest_url(asset),
+        sprite_url=sprite_url,
+        sprite_vtt_url=sprite_vtt_url,
         created_at=asset.created_at,
         updated_at=asset.updated_at,
     )
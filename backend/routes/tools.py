@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 import json
+import math
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-import ffmpeg
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
@@ -22,11 +22,16 @@ from backend.schemas import (
 from backend.services.beat_detection import BeatDetectionService
 from backend.services.captions import CaptionSegment, CaptionService
 from backend.services.chat_service import get_chat_service
+from backend.services.ffmpeg_runner import FFmpegError, FFmpegTimeout
 from backend.services.model_loaders import get_image_edit_loader, get_video_loader
+from backend.services.probe_cache import ProbeError, probe_media
+from backend.services.thumbnails import extract_frames
 
 router = APIRouter()
 settings = get_settings()
 
+FRAME_EPSILON = 0.05  # seconds before the end that still decodes a frame
+
 
 @router.post("/tools", response_model=ToolResponse)
 async def run_tool(payload: ToolRequest, session: Session = Depends(get_session)) -> ToolResponse:
@@ -121,22 +126,38 @@ async def _run_thumbnail(args: Dict[str, Any]) -> Dict[str, Any]:
     video_path = Path(path)
     if not video_path.exists():
         raise HTTPException(status_code=404, detail="Media file not found")
-    timestamp = float(args.get("time", 0))
+    times = args.get("times")
+    if times is not None and not isinstance(times, list):
+        raise HTTPException(status_code=400, detail="'times' must be a list of seconds")
+    try:
+        timestamps = [float(value) for value in times] if times else [float(args.get("time", 0))]
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Thumbnail times must be numbers of seconds") from exc
+    if not all(math.isfinite(value) for value in timestamps):
+        raise HTTPException(status_code=400, detail="Thumbnail times must be finite")
+    try:
+        duration = (await run_in_threadpool(probe_media, video_path)).duration
+    except ProbeError as exc:
+        raise HTTPException(status_code=400, detail="Could not inspect media file") from exc
+    if duration > 0:
+        # Seeking past the end yields no frame; clamp to the last one instead.
+        timestamps = [min(max(value, 0.0), max(duration - FRAME_EPSILON, 0.0)) for value in timestamps]
 
     thumbnails_dir = settings.thumbnails_dir
     thumbnails_dir.mkdir(parents=True, exist_ok=True)
-    filename = thumbnails_dir / f"thumb_{video_path.stem}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.jpg"
-    (
-        ffmpeg
-        .input(str(video_path), ss=timestamp)
-        .filter("scale", 480, -1)
-        .output(str(filename), vframes=1)
-        .run(quiet=True, overwrite_output=True)
-    )
-    return {
-        "path": str(filename),
-        "url": f"/media/thumbnails/{filename.name}",
-    }
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    filenames = [thumbnails_dir / f"thumb_{video_path.stem}_{stamp}_{index:03d}.jpg" for index in range(len(timestamps))]
+    # All requested frames come from one ffmpeg process.
+    try:
+        written = await run_in_threadpool(extract_frames, video_path, timestamps, filenames)
+    except FFmpegTimeout as exc:
+        raise HTTPException(status_code=504, detail="Frame extraction timed out") from exc
+    except FFmpegError as exc:
+        raise HTTPException(status_code=500, detail="Frame extraction failed") from exc
+    frames = [{"path": str(path), "url": f"/media/thumbnails/{path.name}"} for path in written]
+    if times:
+        return {"frames": frames}
+    return frames[0] if frames else {"path": None, "url": None}
 
 
 def _run_caption_srt(args: Dict[str, Any]) -> Dict[str, Any]:
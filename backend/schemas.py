@@ -52,6 +52,8 @@ class AssetSchema(BaseModel):
     fps: Optional[float]
     thumbnail_url: Optional[str] = None
     ingest_url: Optional[str] = None
+    sprite_url: Optional[str] = None  # tiled scrub-strip JPEG
+    sprite_vtt_url: Optional[str] = None  # WebVTT index mapping time ranges to sprite tiles
     created_at: datetime
     updated_at: datetime
 
@@ -91,13 +93,30 @@ class IngestResponse(BaseModel):
     project: ProjectSchema
 
 
+class RenderEstimateSchema(BaseModel):
+    cpu_seconds: float
+    peak_memory_mb: float
+    output_seconds: float
+    segments: int
+
+
 class RenderResponse(BaseModel):
     job_id: str
     status_url: str
+    cached: bool = False
+    preview: bool = False
+    priority: Optional[str] = None
+    output_url: Optional[str] = None
+    estimate: Optional[RenderEstimateSchema] = None
+    admission: Optional[str] = None  # "admit" or "defer" (demoted to the bulk queue)
 
 
 class RenderRequest(BaseModel):
     watermark: Optional[bool] = None
+    preview: bool = False
+    variants: List[str] = Field(default_factory=list)  # extra publishing targets, see OUTPUT_PROFILES
+    priority: Optional[str] = None  # "interactive", "normal" or "bulk"; previews default to interactive
+    progressive: bool = False  # also stream HLS under /media/final/<job_id>/ while encoding
 
 
 class RenderStatus(BaseModel):
@@ -107,9 +126,28 @@ class RenderStatus(BaseModel):
     logs: List[str] = Field(default_factory=list)
     result: Optional[str] = None
     output_url: Optional[str] = None
+    outputs: Dict[str, str] = Field(default_factory=dict)  # variant name -> URL
+    priority: Optional[str] = None
     error: Optional[str] = None
 
 
+class RenderEventSchema(BaseModel):
+    id: int
+    created_at: datetime
+    stage: Optional[str] = None
+    level: str = "info"
+    message: str
+    progress: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class RenderEventPage(BaseModel):
+    job_id: str
+    events: List[RenderEventSchema] = Field(default_factory=list)
+    next_after_id: Optional[int] = None
+
+
 class ConsentSchema(BaseModel):
     asset_id: int
     has_checkbox: bool
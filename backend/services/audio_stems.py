@@ -0,0 +1,134 @@
+"""
+Pre-mixed audio stems for auto-edit.
+
+Music beds and SFX sets are reused across many edits, yet mixing them inline
+means decoding every track and rebuilding the volume/fade/delay/amix graph on
+each one. This stage renders a plan's music + SFX layout once into a PCM stem
+of the edit's length, so an edit only mixes that one stem over its clip audio.
+
+Stems are content-addressed: the file name is a hash of each track's bytes,
+placement, volume and fades, plus the duration. Any plan with the same layout
+reuses the stem, and the directory is kept under `audio_stem_cache_max_bytes`
+by LRU eviction.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from backend.config import get_settings
+from backend.services.ffmpeg_runner import run_ffmpeg
+from backend.services.render_cache import asset_content_hash, evict_lru_files
+
+LOGGER = logging.getLogger(__name__)
+
+# Bump when the stem filters change output for identical layouts.
+STEM_VERSION = 1
+STEM_AUDIO_RATE = 48000
+
+# (path, start, volume, fade_in, fade_out) of one music or SFX track.
+StemTrack = Tuple[Path, float, float, float, float]
+
+
+@dataclass(frozen=True)
+class AudioStem:
+    """A rendered layout; `tracks` is how many tracks it stands in for in the final amix."""
+
+    path: Path
+    tracks: int
+
+
+def stem_key(music: Optional[StemTrack], sfx: Sequence[StemTrack], duration: float) -> str:
+    def _track(track: StemTrack) -> List:
+        path, start, volume, fade_in, fade_out = track
+        return [asset_content_hash(Path(path)), round(start, 3), round(volume, 4), round(fade_in, 3), round(fade_out, 3)]
+
+    payload = {
+        "version": STEM_VERSION,
+        "music": _track(music) if music else None,
+        "sfx": [_track(track) for track in sfx],
+        "duration": round(duration, 3),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def track_filters(
+    cmd: List[str], filters: List[str], music: Optional[StemTrack], sfx: Sequence[StemTrack], total: float
+) -> List[str]:
+    """Add the music and SFX inputs to `cmd` with their volume/fade/delay chains; returns the chain labels."""
+    input_index = sum(1 for arg in cmd if arg == "-i")
+    labels = []
+    if music:
+        path, start, volume, fade_in, fade_out = music
+        cmd.extend(["-i", str(path)])
+        chain = [f"[{input_index}:a]volume={volume}"]
+        if fade_in:
+            chain.append(f"afade=t=in:d={fade_in}:curve=log")
+        if fade_out:
+            chain.append(f"afade=t=out:st={max(total - fade_out, 0.0):.3f}:d={fade_out}:curve=log")
+        if start:
+            delay = int(start * 1000)
+            chain.append(f"adelay={delay}|{delay}")
+        filters.append(",".join(chain) + "[music]")
+        labels.append("music")
+        input_index += 1
+    for index, (path, start, volume, _, _) in enumerate(sfx):
+        cmd.extend(["-i", str(path)])
+        delay = int(start * 1000)
+        filters.append(f"[{input_index}:a]volume={volume},adelay={delay}|{delay}[sfx{index}]")
+        labels.append(f"sfx{index}")
+        input_index += 1
+    return labels
+
+
+def stem_command(music: Optional[StemTrack], sfx: Sequence[StemTrack], duration: float, output_path: Path) -> List[str]:
+    """One ffmpeg command mixing the layout into `duration` seconds of 48 kHz stereo PCM."""
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    filters: List[str] = []
+    labels = track_filters(cmd, filters, music, sfx, duration)
+    if not labels:
+        raise ValueError("No audio tracks to mix into a stem")
+    inputs = "".join(f"[{label}]" for label in labels)
+    mixed = f"{inputs}amix=inputs={len(labels)}:duration=longest:dropout_transition=2," if len(labels) > 1 else inputs
+    filters.append(
+        f"{mixed}apad,atrim=duration={duration:.3f},aresample={STEM_AUDIO_RATE},"
+        f"aformat=sample_rates={STEM_AUDIO_RATE}:channel_layouts=stereo[stem]"
+    )
+    cmd.extend(["-filter_complex", ";".join(filters), "-map", "[stem]", "-c:a", "pcm_s16le", "-f", "wav", str(output_path)])
+    return cmd
+
+
+def ensure_stem(music: Optional[StemTrack], sfx: Sequence[StemTrack], duration: float) -> AudioStem:
+    """The cached stem for this layout, rendering it on a miss."""
+    settings = get_settings()
+    cache_dir = settings.stems_dir
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tracks = (1 if music else 0) + len(sfx)
+    target = cache_dir / f"{stem_key(music, sfx, duration)}.wav"
+    if target.exists():
+        # mtime doubles as the LRU clock for eviction.
+        target.touch(exist_ok=True)
+        return AudioStem(target, tracks)
+
+    temp_path = target.with_name(f"{target.stem}.{uuid4().hex[:8]}.tmp.wav")
+    LOGGER.info("Mixing %s audio tracks into stem %s", tracks, target.name)
+    try:
+        run_ffmpeg(stem_command(music, sfx, duration, temp_path), "stem")
+        # Concurrent edits may race on the same key; both write identical bytes, last rename wins.
+        os.replace(temp_path, target)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    evict_lru_files(cache_dir, settings.audio_stem_cache_max_bytes, pattern="*.wav")
+    return AudioStem(target, tracks)
+
+
+def is_stem(path: Path) -> bool:
+    return Path(path).resolve().parent == get_settings().stems_dir.resolve()
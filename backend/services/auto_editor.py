@@ -5,18 +5,42 @@ Takes multiple video clips and assembles them into a complete video with:
 - Captions
 - Music/SFX sync
 - Effects
+
+By default a plan is compiled into one ffmpeg filter_complex (trim, per-clip
+effects, fit to the output canvas, transitions, ASS captions and audio mix),
+so it costs one decode and one encode. The step-by-step multi-pass pipeline is
+kept for debugging (`AIVE_AUTO_EDIT_SINGLE_PASS=false`).
+
+Before either pipeline runs, clips are normalized in parallel to the plan's
+canvas, frame rate and audio layout (see `clip_normalizer`), so the join
+filters see uniform inputs and reused clips are converted only once.
+Cut-only plans with nothing drawn or mixed on top skip both pipelines and
+are smart-cut (see `smart_cut`): packets between keyframes are copied and
+only the partial GOPs at trim edges are re-encoded.
+
+Music and SFX are pre-mixed into one cached stem per layout (see
+`audio_stems`), so an edit mixes a single track over its clip audio.
+Batches of plans over the same clips are prepared together (`prepare_group`):
+probing, normalization and audio stems run once for the group.
 """
 
 from __future__ import annotations
 
 import logging
 import subprocess
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, List, Optional, Sequence, Tuple
+from uuid import uuid4
 
 from backend.config import get_settings
+from backend.services.audio_stems import StemTrack, ensure_stem, is_stem, track_filters
+from backend.services.clip_normalizer import normalize_profile, normalize_sources
+from backend.services.probe_cache import ProbeError, probe_media
+from backend.services.smart_cut import smart_cut, smart_cut_compatible
+from backend.services.ffmpeg_runner import run_ffmpeg
+from backend.services.stage_pipeline import PipelineStage, run_stages
 
 LOGGER = logging.getLogger(__name__)
 
@@ -28,8 +52,9 @@ class VideoClip:
     path: Path
     start_time: float = 0.0  # Trim start
     end_time: Optional[float] = None  # Trim end (None = full duration)
-    duration: Optional[float] = None  # Actual duration after trim
+    duration: Optional[float] = None  # Actual duration after trim (filled in from the trim points when None)
     effects: List[str] = None  # Effects to apply
+    has_audio: Optional[bool] = None  # Filled in by probing when None
 
 
 @dataclass
@@ -52,6 +77,7 @@ class AudioTrack:
     volume: float = 1.0  # 0.0 to 1.0
     fade_in: float = 0.0  # Fade in duration in seconds
     fade_out: float = 0.0  # Fade out duration in seconds
+    weight: float = 1.0  # amix weight; a pre-mixed bed stands in for this many tracks
 
 
 @dataclass
@@ -65,6 +91,19 @@ class EditingPlan:
     transitions: str = "fade"  # fade, cut, dissolve, wipe
     output_resolution: str = "1080x1920"  # 9:16 for shorts
     output_fps: int = 30
+    normalized: bool = False  # Clips already point at normalized intermediates
+
+
+TRANSITION_DURATION = 0.5
+# xfade transition names for the plan's transition styles; "cut" uses concat.
+XFADE_TRANSITIONS = {"fade": "fade", "dissolve": "dissolve", "wipe": "wipeleft"}
+SLOWMO_SPEED = 0.5
+AUDIO_RATE = 48000
+# Share of an edit's progress spent normalizing clips; the final encode reports the rest.
+NORMALIZE_PROGRESS_SHARE = 0.3
+STAGE_VIDEO_ARGS = ["-c:v", "libx264", "-preset", "medium", "-crf", "23"]
+# Multi-pass stages that name themselves here are also written to disk (see `stage_pipeline`).
+MULTI_PASS_STAGES = ("transitions", "effects", "captions", "audio", "resize")
 
 
 class AutoEditor:
@@ -79,37 +118,22 @@ class AutoEditor:
         self.temp_dir.mkdir(parents=True, exist_ok=True)
 
     def get_video_duration(self, video_path: Path) -> float:
-        """Get duration of a video file in seconds."""
+        """Get duration of a video file in seconds (memoized by the shared probe cache)."""
         try:
-            result = subprocess.run(
-                [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-show_entries",
-                    "format=duration",
-                    "-of",
-                    "default=noprint_wrappers=1:nokey=1",
-                    str(video_path),
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            return float(result.stdout.strip())
-        except Exception as e:
+            return probe_media(video_path).duration
+        except ProbeError as e:
             LOGGER.error(f"Failed to get duration for {video_path}: {e}")
             return 0.0
 
-    def create_caption_file(self, captions: List[Caption]) -> Path:
+    def create_caption_file(self, captions: List[Caption], width: int = 1080, height: int = 1920) -> Path:
         """Create an ASS subtitle file for captions."""
         # ASS (Advanced SubStation Alpha) format for styled captions
-        ass_content = """[Script Info]
+        ass_content = f"""[Script Info]
 Title: AI Video Captions
 ScriptType: v4.00+
 WrapStyle: 0
-PlayResX: 1080
-PlayResY: 1920
+PlayResX: {width}
+PlayResY: {height}
 
 [V4+ Styles]
 Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
@@ -165,59 +189,33 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
         Returns:
             Path to concatenated video
         """
+        output_file = self.temp_dir / f"concatenated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        stage = self._transition_stage(clips, transition, transition_duration)
+        # Hard cuts of uniform clips join by stream copy; anything else is re-encoded.
+        output_args = ["-c", "copy"] if transition == "cut" else STAGE_VIDEO_ARGS
+        run_stages([stage], output_file, output_args, self.temp_dir)
+        return output_file
+
+    def _transition_stage(self, clips: List[VideoClip], transition: str, transition_duration: float = 0.5) -> PipelineStage:
         if not clips:
             raise ValueError("No clips provided")
-
-        # Create concat file for FFmpeg
-        concat_file = self.temp_dir / f"concat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-
-        with open(concat_file, "w") as f:
-            for clip in clips:
-                f.write(f"file '{clip.path.absolute()}'\n")
-
-        output_file = self.temp_dir / f"concatenated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        LOGGER.info(f"Concatenating {len(clips)} clips with {transition} transition")
 
         if transition == "cut":
             # Simple concatenation without transitions
-            cmd = [
-                "ffmpeg",
-                "-f",
-                "concat",
-                "-safe",
-                "0",
-                "-i",
-                str(concat_file),
-                "-c",
-                "copy",
-                str(output_file),
-            ]
-        else:
-            # With crossfade/dissolve transitions
-            # Build complex filter graph
-            filter_complex = self._build_transition_filter(clips, transition, transition_duration)
-
-            cmd = []
-            for clip in clips:
-                cmd.extend(["-i", str(clip.path)])
-
-            cmd.extend(
-                [
-                    "-filter_complex",
-                    filter_complex,
-                    "-c:v",
-                    "libx264",
-                    "-preset",
-                    "medium",
-                    "-crf",
-                    "23",
-                    str(output_file),
-                ]
-            )
-
-        LOGGER.info(f"Concatenating {len(clips)} clips with {transition} transition")
-        subprocess.run(cmd, check=True, capture_output=True)
-
-        return output_file
+            concat_file = self.temp_dir / f"concat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+            with open(concat_file, "w") as f:
+                for clip in clips:
+                    f.write(f"file '{clip.path.absolute()}'\n")
+            return PipelineStage("transitions", ["-f", "concat", "-safe", "0", "-i", str(concat_file)], reads_previous=False)
+
+        # With crossfade/dissolve transitions
+        # Build complex filter graph
+        args: List[str] = []
+        for clip in clips:
+            args.extend(["-i", str(clip.path)])
+        args.extend(["-filter_complex", self._build_transition_filter(clips, transition, transition_duration)])
+        return PipelineStage("transitions", args, reads_previous=False)
 
     def _build_transition_filter(self, clips: List[VideoClip], transition: str, duration: float) -> str:
         """Build FFmpeg filter graph for transitions."""
@@ -228,9 +226,10 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
         filters = []
         labels = []
 
+        # This stage reads whole files, so offsets are running sums of the source lengths, not the trims.
+        durations = [self.get_video_duration(clip.path) for clip in clips]
+
         for i in range(len(clips)):
-            # Get duration of each clip
-            clip_duration = clips[i].duration or self.get_video_duration(clips[i].path)
 
             if i == 0:
                 # First clip
@@ -238,9 +237,7 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
                 labels.append("v0")
             else:
                 # Subsequent clips with crossfade
-                offset = sum(
-                    (clips[j].duration or self.get_video_duration(clips[j].path)) - duration for j in range(i)
-                )
+                offset = sum(durations[j] - duration for j in range(i))
 
                 filters.append(f"[{i}:v]setpts=PTS-STARTPTS+{offset}/TB[v{i}]")
 
@@ -260,30 +257,14 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
         if not captions:
             return video_path
 
-        caption_file = self.create_caption_file(captions)
         output_file = self.temp_dir / f"with_captions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        run_stages([self._caption_stage(captions)], output_file, STAGE_VIDEO_ARGS + ["-c:a", "copy"], self.temp_dir, source=video_path)
+        return output_file
 
-        cmd = [
-            "ffmpeg",
-            "-i",
-            str(video_path),
-            "-vf",
-            f"ass={caption_file}",
-            "-c:a",
-            "copy",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "medium",
-            "-crf",
-            "23",
-            str(output_file),
-        ]
-
+    def _caption_stage(self, captions: List[Caption]) -> PipelineStage:
+        caption_file = self.create_caption_file(captions)
         LOGGER.info(f"Adding {len(captions)} captions to video")
-        subprocess.run(cmd, check=True, capture_output=True)
-
-        return output_file
+        return PipelineStage("captions", ["-vf", f"ass={caption_file}"])
 
     def add_audio(
         self, video_path: Path, music: Optional[AudioTrack] = None, sfx: Optional[List[AudioTrack]] = None
@@ -292,13 +273,24 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
         if not music and not sfx:
             return video_path
 
+        if self.settings.auto_edit_audio_stems:
+            stem = ensure_stem(
+                _stem_track(music) if music else None,
+                [_stem_track(track) for track in sfx or []],
+                self.get_video_duration(video_path),
+            )
+            music, sfx = AudioTrack(path=stem.path, weight=float(stem.tracks)), None
+
         output_file = self.temp_dir / f"with_audio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        run_stages([self._audio_stage(music, sfx)], output_file, ["-c:v", "copy"], self.temp_dir, source=video_path)
+        return output_file
 
+    def _audio_stage(self, music: Optional[AudioTrack], sfx: Optional[List[AudioTrack]]) -> PipelineStage:
         # Build filter graph for audio mixing
         filter_parts = ["[0:a]volume=1.0[original]"]  # Original video audio
         mix_inputs = ["[original]"]
 
-        input_files = [str(video_path)]
+        input_files: List[str] = []  # input 0 is the video from the previous stage
         audio_index = 1
 
         if music:
@@ -322,30 +314,32 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 
         # Mix all audio tracks
         mix_str = "".join(mix_inputs)
-        filter_parts.append(f"{mix_str}amix=inputs={len(mix_inputs)}:duration=first:dropout_transition=2[a]")
+        tracks = ([music] if music else []) + list(sfx or [])
+        filter_parts.append(
+            f"{mix_str}amix=inputs={len(mix_inputs)}:duration=first:dropout_transition=2{_amix_weights(tracks)}[a]"
+        )
 
         filter_complex = ";".join(filter_parts)
 
-        cmd = []
+        args: List[str] = []
         for input_file in input_files:
-            cmd.extend(["-i", input_file])
-
-        cmd.extend(
-            ["-filter_complex", filter_complex, "-map", "0:v", "-map", "[a]", "-c:v", "copy", "-shortest", str(output_file)]
-        )
+            args.extend(["-i", input_file])
+        args.extend(["-filter_complex", filter_complex, "-map", "0:v", "-map", "[a]", "-shortest"])
 
         LOGGER.info(f"Adding audio: music={music is not None}, sfx={len(sfx) if sfx else 0}")
-        subprocess.run(cmd, check=True, capture_output=True)
-
-        return output_file
+        return PipelineStage("audio", args)
 
     def apply_effects(self, video_path: Path, effects: List[str]) -> Path:
         """Apply video effects (zoom, slowmo, etc.)."""
-        if not effects:
+        stage = self._effects_stage(effects)
+        if stage is None:
             return video_path
 
         output_file = self.temp_dir / f"with_effects_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        run_stages([stage], output_file, STAGE_VIDEO_ARGS + ["-c:a", "copy"], self.temp_dir, source=video_path)
+        return output_file
 
+    def _effects_stage(self, effects: List[str]) -> Optional[PipelineStage]:
         # Build filter chain
         filters = []
 
@@ -364,36 +358,18 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
                 filters.append("vignette=PI/4")
 
         if not filters:
-            return video_path
-
-        filter_str = ",".join(filters)
-
-        cmd = [
-            "ffmpeg",
-            "-i",
-            str(video_path),
-            "-vf",
-            filter_str,
-            "-c:a",
-            "copy",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "medium",
-            "-crf",
-            "23",
-            str(output_file),
-        ]
+            return None
 
         LOGGER.info(f"Applying effects: {effects}")
-        subprocess.run(cmd, check=True, capture_output=True)
-
-        return output_file
+        return PipelineStage("effects", ["-vf", ",".join(filters)])
 
     def resize_for_platform(self, video_path: Path, platform: str = "tiktok") -> Path:
         """Resize video for specific platform requirements."""
         output_file = self.temp_dir / f"resized_{platform}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        run_stages([self._resize_stage(platform)], output_file, STAGE_VIDEO_ARGS + ["-c:a", "copy"], self.temp_dir, source=video_path)
+        return output_file
 
+    def _resize_stage(self, platform: str = "tiktok") -> PipelineStage:
         # Platform-specific resolutions
         resolutions = {
             "tiktok": "1080x1920",  # 9:16
@@ -405,29 +381,186 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
         resolution = resolutions.get(platform, "1080x1920")
         width, height = resolution.split("x")
 
-        cmd = [
-            "ffmpeg",
-            "-i",
-            str(video_path),
-            "-vf",
-            f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black",
-            "-c:a",
-            "copy",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "medium",
-            "-crf",
-            "23",
-            str(output_file),
-        ]
-
         LOGGER.info(f"Resizing for {platform}: {resolution}")
-        subprocess.run(cmd, check=True, capture_output=True)
+        return PipelineStage(
+            "resize",
+            ["-vf", f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black"],
+        )
 
-        return output_file
+    def has_audio_stream(self, video_path: Path) -> bool:
+        """Whether a media file has at least one audio stream."""
+        try:
+            return probe_media(video_path).has_audio
+        except ProbeError as e:
+            LOGGER.error(f"Failed to probe audio for {video_path}: {e}")
+            return False
+
+    def build_single_pass_command(self, plan: EditingPlan, output_path: Path) -> List[str]:
+        """
+        Compile a probed plan into one ffmpeg command.
+
+        Every clip is trimmed by input seeking, gets its own effects and is fitted
+        to the output canvas before the transition chain, so xfade/concat see
+        uniform streams and the final resize needs no extra pass. Captions are
+        burned in after the transitions and music/SFX are mixed over the joined
+        clip audio.
+        """
+        width, height = (int(value) for value in plan.output_resolution.split("x"))
+        fps = plan.output_fps
+        cmd = ["ffmpeg", "-y"]
+        filters: List[str] = []
+        durations: List[float] = []
+
+        for index, clip in enumerate(plan.clips):
+            length = self._clip_length(clip)
+            cmd.extend(["-ss", f"{clip.start_time:.3f}", "-t", f"{length:.3f}", "-i", str(clip.path)])
+            effects = [str(effect).lower() for effect in (clip.effects or [])]
+            slowmo = "slowmo" in effects
+
+            video = ["setpts=PTS-STARTPTS"]
+            if slowmo:
+                video.append(f"setpts=PTS/{SLOWMO_SPEED}")
+            video.extend(
+                [
+                    f"fps={fps}",
+                    f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black",
+                    "setsar=1",
+                ]
+            )
+            video.extend(self._effect_filters(effects, width, height, fps))
+            video.append("format=yuv420p")
+            filters.append(f"[{index}:v]" + ",".join(video) + f"[v{index}]")
+
+            if clip.has_audio:
+                audio = [f"[{index}:a]asetpts=PTS-STARTPTS"]
+                if slowmo:
+                    audio.append(f"atempo={SLOWMO_SPEED}")
+            else:
+                audio = [f"anullsrc=r={AUDIO_RATE}:cl=stereo", f"atrim=duration={length / (SLOWMO_SPEED if slowmo else 1.0):.3f}"]
+            audio.extend([f"aresample={AUDIO_RATE}", f"aformat=sample_rates={AUDIO_RATE}:channel_layouts=stereo"])
+            filters.append(",".join(audio) + f"[a{index}]")
+            durations.append(length / SLOWMO_SPEED if slowmo else length)
+
+        video_label, audio_label, total = self._join_clips(filters, durations, plan.transitions)
+
+        if plan.captions:
+            caption_file = self.create_caption_file(plan.captions, width, height)
+            filters.append(f"[{video_label}]ass={_filter_path(caption_file)}[vcap]")
+            video_label = "vcap"
+
+        audio_label = self._mix_audio(cmd, filters, audio_label, plan.music, plan.sfx or [], total)
+
+        cmd.extend(["-filter_complex", ";".join(filters), "-map", f"[{video_label}]", "-map", f"[{audio_label}]"])
+        cmd.extend(
+            [
+                "-c:v",
+                "libx264",
+                "-preset",
+                "medium",
+                "-crf",
+                "23",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "192k",
+                "-movflags",
+                "+faststart",
+                str(output_path),
+            ]
+        )
+        return cmd
+
+    def _clip_length(self, clip: VideoClip) -> float:
+        """Seconds used from `clip`: the trim points, else its (already trimmed) duration, else the source from `start_time`."""
+        if clip.end_time is not None:
+            return max(clip.end_time - clip.start_time, 0.04)
+        if clip.duration is not None:
+            return max(clip.duration, 0.04)
+        return max(self.get_video_duration(clip.path) - clip.start_time, 0.04)
 
-    def edit_video(self, plan: EditingPlan) -> Path:
+    def _effect_filters(self, effects: List[str], width: int, height: int, fps: int) -> List[str]:
+        filters = []
+        for effect in effects:
+            if effect == "zoom":
+                # d=1: one output frame per input frame, zooming progressively over the clip.
+                filters.append(f"zoompan=z='min(zoom+0.0015,1.5)':d=1:x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':s={width}x{height}:fps={fps}")
+            elif effect == "shake":
+                filters.append(f"crop=iw-20:ih-20:10+10*sin(n/10):10,scale={width}:{height}")
+            elif effect == "vignette":
+                filters.append("vignette=PI/4")
+        return filters
+
+    def _join_clips(self, filters: List[str], durations: List[float], transition: str) -> Tuple[str, str, float]:
+        """Join the per-clip streams with concat (cut) or chained xfade/acrossfade."""
+        count = len(durations)
+        xfade = XFADE_TRANSITIONS.get(transition)
+        if count == 1:
+            return "v0", "a0", durations[0]
+        if xfade is None or min(durations) <= TRANSITION_DURATION:
+            inputs = "".join(f"[v{index}][a{index}]" for index in range(count))
+            filters.append(f"{inputs}concat=n={count}:v=1:a=1[vjoin][ajoin]")
+            return "vjoin", "ajoin", sum(durations)
+
+        video_label, audio_label = "v0", "a0"
+        elapsed = durations[0]
+        for index in range(1, count):
+            offset = elapsed - TRANSITION_DURATION
+            filters.append(
+                f"[{video_label}][v{index}]xfade=transition={xfade}:duration={TRANSITION_DURATION}:offset={offset:.3f}[vx{index}]"
+            )
+            filters.append(f"[{audio_label}][a{index}]acrossfade=d={TRANSITION_DURATION}[ax{index}]")
+            video_label, audio_label = f"vx{index}", f"ax{index}"
+            elapsed = offset + durations[index]
+        return video_label, audio_label, elapsed
+
+    def _mix_audio(
+        self,
+        cmd: List[str],
+        filters: List[str],
+        base_label: str,
+        music: Optional[AudioTrack],
+        sfx: List[AudioTrack],
+        total: float,
+    ) -> str:
+        if not music and not sfx:
+            return base_label
+        labels = track_filters(
+            cmd, filters, _stem_track(music) if music else None, [_stem_track(track) for track in sfx], total
+        )
+        tracks = ([music] if music else []) + list(sfx)
+        mix_inputs = f"[{base_label}]" + "".join(f"[{label}]" for label in labels)
+        filters.append(
+            f"{mix_inputs}amix=inputs={len(labels) + 1}:duration=first:dropout_transition=2{_amix_weights(tracks)}[amix]"
+        )
+        return "amix"
+
+    def with_audio_stem(self, plan: EditingPlan) -> EditingPlan:
+        """
+        Swap the plan's music and SFX for one cached pre-mixed stem (see `audio_stems`).
+
+        The stem is mixed back with a weight equal to the number of tracks it
+        holds, so the clip audio keeps the same share of the final amix as when
+        every track was mixed in separately.
+        """
+        if not plan.music and not plan.sfx:
+            return plan
+        if plan.music and not plan.sfx and is_stem(plan.music.path):
+            return plan
+        stem = ensure_stem(
+            _stem_track(plan.music) if plan.music else None,
+            [_stem_track(track) for track in plan.sfx or []],
+            self.output_duration(plan),
+        )
+        return replace(plan, music=AudioTrack(path=stem.path, weight=float(stem.tracks)), sfx=None)
+
+    def edit_video(
+        self,
+        plan: EditingPlan,
+        single_pass: Optional[bool] = None,
+        checkpoints: Optional[Sequence[str]] = None,
+        on_progress: Optional[Callable[[float], None]] = None,
+    ) -> Path:
         """
         Execute complete video editing plan.
 
@@ -435,19 +568,201 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 
         Args:
             plan: EditingPlan with all editing instructions
+            single_pass: Compile the plan into one ffmpeg invocation (default from
+                settings); False runs the step-by-step pipeline for debugging
+            checkpoints: Step-by-step stages (`MULTI_PASS_STAGES`) whose output is
+                also written to disk (default from settings)
+            on_progress: Called with the completed fraction (0-1) as ffmpeg reports it
 
         Returns:
             Path to final edited video
         """
         LOGGER.info(f"Starting video editing with {len(plan.clips)} clips")
+        if not plan.clips:
+            raise ValueError("No clips provided")
 
         # Step 1: Fill in clip durations
         for clip in plan.clips:
             if clip.duration is None:
-                clip.duration = self.get_video_duration(clip.path)
+                clip.duration = self._clip_length(clip)
+
+        report = on_progress or (lambda fraction: None)
+        encode_start = 0.0
+        # Cut-only plans never normalize whole sources: matching sources are smart-cut as they
+        # are, and anything else is cheaper to encode as just the trimmed spans in one pass.
+        cut_only = self._is_cut_only(plan)
+        if self.settings.auto_edit_normalize and not plan.normalized and not cut_only:
+            plan = self.normalize_clips(plan, on_progress=lambda fraction: report(fraction * NORMALIZE_PROGRESS_SHARE))
+            encode_start = NORMALIZE_PROGRESS_SHARE
+
+        def _encode_progress(fraction: float) -> None:
+            report(encode_start + fraction * (1.0 - encode_start))
+
+        if self.settings.auto_edit_audio_stems:
+            plan = self.with_audio_stem(plan)
+
+        if cut_only and self.can_smart_cut(plan):
+            return self._edit_video_smart_cut(plan, _encode_progress)
+
+        use_single_pass = self.settings.auto_edit_single_pass if single_pass is None else single_pass
+        if not use_single_pass:
+            if checkpoints is None:
+                checkpoints = [name.strip() for name in self.settings.auto_edit_checkpoints.split(",") if name.strip()]
+            return self._edit_video_multi_pass(plan, checkpoints, _encode_progress)
+
+        for clip in plan.clips:
+            if clip.has_audio is None:
+                clip.has_audio = self.has_audio_stream(clip.path)
+
+        final_path = self._final_path()
+        cmd = self.build_single_pass_command(plan, final_path)
+
+        LOGGER.info(f"Rendering edit plan in one pass: {len(plan.clips)} clips, {plan.transitions} transitions")
+        try:
+            run_ffmpeg(cmd, "edit", self.output_duration(plan), _encode_progress)
+        except subprocess.CalledProcessError:
+            final_path.unlink(missing_ok=True)
+            raise
+
+        LOGGER.info(f"Video editing complete: {final_path}")
+        return final_path
+
+    def output_duration(self, plan: EditingPlan) -> float:
+        """Length of the edited video, from the (probed) clip durations; mirrors `_join_clips`."""
+        lengths = []
+        for clip in plan.clips:
+            length = self._clip_length(clip)
+            if "slowmo" in [str(effect).lower() for effect in (clip.effects or [])]:
+                length /= SLOWMO_SPEED
+            lengths.append(length)
+        if len(lengths) > 1 and plan.transitions in XFADE_TRANSITIONS and min(lengths) > TRANSITION_DURATION:
+            return sum(lengths) - TRANSITION_DURATION * (len(lengths) - 1)
+        return sum(lengths)
+
+    def _final_path(self) -> Path:
+        final_dir = self.settings.final_dir
+        final_dir.mkdir(parents=True, exist_ok=True)
+        # Suffix keeps edits finishing in the same second (concurrent queue jobs) apart.
+        return final_dir / f"edited_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:6]}.mp4"
 
+    def normalize_clips(self, plan: EditingPlan, on_progress: Optional[Callable[[float], None]] = None) -> EditingPlan:
+        """
+        Swap each clip's source for a cached intermediate matching the plan's canvas.
+
+        Trims, durations and effects are kept; intermediates always carry audio
+        (silence where the source had none).
+        """
+        width, height = (int(value) for value in plan.output_resolution.split("x"))
+        normalized = normalize_sources(
+            [clip.path for clip in plan.clips], normalize_profile(width, height, plan.output_fps), on_progress=on_progress
+        )
+        clips = [replace(clip, path=normalized[Path(clip.path)], has_audio=True) for clip in plan.clips]
+        return replace(plan, clips=clips, normalized=True)
+
+    def prepare_group(
+        self, plans: Sequence[EditingPlan], on_progress: Optional[Callable[[float], None]] = None
+    ) -> List[EditingPlan]:
+        """
+        Do the work a group of plans over the same clips has in common, once.
+
+        Every distinct source is probed and normalized a single time for the
+        whole group, and each distinct music/SFX layout is mixed into its
+        stem once (`with_audio_stem`). The returned plans are marked
+        normalized, so `edit_video` goes straight to the encode.
+        """
+        if not plans:
+            return []
+        if len({plan_group_key(plan) for plan in plans}) != 1:
+            raise ValueError("Plans in a group must share output canvas, frame rate and clips")
+        report = on_progress or (lambda fraction: None)
+
+        # Sources are probed once; the shared probe cache memoizes repeats across plans.
+        for plan in plans:
+            for clip in plan.clips:
+                if clip.duration is None:
+                    clip.duration = self._clip_length(clip)
+
+        prepared = list(plans)
+        # Cut-only plans edit straight from their sources (see `edit_video`).
+        if self.settings.auto_edit_normalize and not all(self._is_cut_only(plan) for plan in plans):
+            width, height = (int(value) for value in plans[0].output_resolution.split("x"))
+            normalized = normalize_sources(
+                [clip.path for plan in plans for clip in plan.clips],
+                normalize_profile(width, height, plans[0].output_fps),
+                on_progress=lambda fraction: report(fraction * 0.9),
+            )
+            prepared = [
+                plan
+                if self._is_cut_only(plan)
+                else replace(
+                    plan,
+                    clips=[replace(clip, path=normalized[Path(clip.path)], has_audio=True) for clip in plan.clips],
+                    normalized=True,
+                )
+                for plan in plans
+            ]
+        else:
+            for plan in prepared:
+                for clip in plan.clips:
+                    if clip.has_audio is None:
+                        clip.has_audio = self.has_audio_stream(clip.path)
+
+        stems = set()
+        if self.settings.auto_edit_audio_stems:
+            for index, plan in enumerate(prepared):
+                prepared[index] = self.with_audio_stem(plan)
+                if prepared[index].music is not plan.music:
+                    stems.add(prepared[index].music.path)
+        sources = {Path(clip.path) for plan in plans for clip in plan.clips}
+        LOGGER.info(f"Prepared {len(plans)} plans: {len(sources)} sources probed, {len(stems)} audio stems")
+        report(1.0)
+        return prepared
+
+    def _is_cut_only(self, plan: EditingPlan) -> bool:
+        """Smart cut is enabled and the plan is hard cuts with nothing drawn or mixed on top."""
+        if not self.settings.auto_edit_smart_cut:
+            return False
+        if plan.transitions != "cut" or plan.captions or plan.music or plan.sfx:
+            return False
+        return not any(clip.effects for clip in plan.clips)
+
+    def can_smart_cut(self, plan: EditingPlan) -> bool:
+        """A cut-only plan over sources already in the output format."""
+        if not self._is_cut_only(plan):
+            return False
+        width, height = (int(value) for value in plan.output_resolution.split("x"))
+        return smart_cut_compatible([clip.path for clip in plan.clips], normalize_profile(width, height, plan.output_fps))
+
+    def _edit_video_smart_cut(self, plan: EditingPlan, on_progress: Optional[Callable[[float], None]] = None) -> Path:
+        """Stream-copy everything between keyframes; only partial GOPs at trim edges are re-encoded."""
+        width, height = (int(value) for value in plan.output_resolution.split("x"))
+        final_path = self._final_path()
+        sources = [(clip.path, clip.start_time, clip.end_time) for clip in plan.clips]
+
+        LOGGER.info(f"Smart-cutting {len(plan.clips)} clips")
+        try:
+            smart_cut(sources, final_path, normalize_profile(width, height, plan.output_fps), self.temp_dir, on_progress)
+        except subprocess.CalledProcessError:
+            final_path.unlink(missing_ok=True)
+            raise
+
+        LOGGER.info(f"Video editing complete: {final_path}")
+        return final_path
+
+    def _edit_video_multi_pass(
+        self,
+        plan: EditingPlan,
+        checkpoints: Sequence[str] = (),
+        on_progress: Optional[Callable[[float], None]] = None,
+    ) -> Path:
+        """
+        Original step-by-step pipeline, kept for debugging individual stages.
+
+        Stages stream into each other through pipes; only the final output and
+        the stages named in `checkpoints` are written to disk.
+        """
         # Step 2: Concatenate clips with transitions
-        video = self.concatenate_clips_with_transitions(plan.clips, plan.transitions)
+        stages = [self._transition_stage(plan.clips, plan.transitions)]
 
         # Step 3: Apply effects if any
         all_effects = []
@@ -456,34 +771,64 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
                 all_effects.extend(clip.effects)
 
         if all_effects:
-            video = self.apply_effects(video, list(set(all_effects)))  # Unique effects
+            stages.append(self._effects_stage(list(set(all_effects))))  # Unique effects
 
         # Step 4: Add captions
         if plan.captions:
-            video = self.add_captions(video, plan.captions)
+            stages.append(self._caption_stage(plan.captions))
 
         # Step 5: Add music and SFX
         if plan.music or plan.sfx:
-            video = self.add_audio(video, plan.music, plan.sfx)
+            stages.append(self._audio_stage(plan.music, plan.sfx))
 
         # Step 6: Resize for platform
         if plan.output_resolution:
             # Determine platform from resolution
             if "1920" in plan.output_resolution and "1080" in plan.output_resolution:
-                video = self.resize_for_platform(video, "tiktok")
-
-        # Step 7: Move to final directory
-        final_dir = self.settings.final_dir
-        final_dir.mkdir(parents=True, exist_ok=True)
-
-        final_path = final_dir / f"edited_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
-        subprocess.run(["cp", str(video), str(final_path)], check=True)
+                stages.append(self._resize_stage("tiktok"))
+
+        # Step 7: Encode straight into the final directory
+        final_path = self._final_path()
+        written = run_stages(
+            [stage for stage in stages if stage is not None],
+            final_path,
+            STAGE_VIDEO_ARGS + ["-c:a", "aac", "-b:a", "192k", "-movflags", "+faststart"],
+            self.temp_dir,
+            checkpoints=checkpoints,
+            duration=self.output_duration(plan),
+            on_progress=on_progress,
+        )
+        for name, path in written.items():
+            LOGGER.info(f"Checkpoint '{name}': {path}")
 
         LOGGER.info(f"Video editing complete: {final_path}")
 
         return final_path
 
 
+def _amix_weights(tracks: Sequence[AudioTrack]) -> str:
+    """amix `weights` option for the clip audio (weight 1) followed by `tracks`; empty when all are 1."""
+    weights = [1.0] + [track.weight for track in tracks]
+    if all(weight == 1.0 for weight in weights):
+        return ""
+    return ":weights='" + " ".join(f"{weight:g}" for weight in weights) + "'"
+
+
+def _stem_track(track: AudioTrack) -> StemTrack:
+    return track.path, track.start, track.volume, track.fade_in, track.fade_out
+
+
+def plan_group_key(plan: EditingPlan) -> Tuple[str, int, Tuple[str, ...]]:
+    """Plans with equal keys share every normalized clip: same canvas, frame rate and set of sources."""
+    sources = sorted({str(Path(clip.path).resolve()) for clip in plan.clips})
+    return plan.output_resolution, plan.output_fps, tuple(sources)
+
+
+def _filter_path(path: Path) -> str:
+    """Quote a file path for use as a filter option value."""
+    return "'" + str(path).replace("'", "'\\''") + "'"
+
+
 # Singleton instance
 _editor: Optional[AutoEditor] = None
 
@@ -0,0 +1,147 @@
+"""
+Per-clip normalization for auto-edit.
+
+xfade, acrossfade and the concat demuxer need inputs that agree on frame size,
+frame rate, pixel format, timebase and audio layout. Generated clips rarely
+do, and converting them all implicitly inside one serial graph is where an
+edit spends most of its time. This pre-stage re-encodes every distinct source
+once, in parallel, to an intermediate that already matches the plan's canvas.
+
+Intermediates are content-addressed: the file name is a hash of the source
+bytes and the normalization profile, so a clip reused across many edits is
+converted only the first time.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from backend.config import get_settings
+from backend.services.ffmpeg_runner import run_ffmpeg
+from backend.services.probe_cache import probe_media
+from backend.services.render_cache import asset_content_hash, evict_lru_files
+from backend.services.render_profile import RenderProfile
+
+LOGGER = logging.getLogger(__name__)
+
+# Bump when the normalization filters change output for identical inputs.
+NORMALIZE_VERSION = 1
+# Shared mp4 track timescale, so every intermediate decodes with the same timebase.
+NORMALIZED_TIMESCALE = 90000
+NORMALIZED_AUDIO_RATE = 48000
+# Intermediates are re-encoded once more by the edit itself; keep them near-lossless.
+NORMALIZED_CRF = 16
+
+
+def normalize_profile(width: int, height: int, fps: int) -> RenderProfile:
+    """Intermediate encode settings for a plan's output canvas."""
+    return RenderProfile(
+        name="normalized",
+        width=width,
+        height=height,
+        fps=fps,
+        preset=get_settings().auto_edit_normalize_preset,
+        crf=NORMALIZED_CRF,
+        audio_fps=NORMALIZED_AUDIO_RATE,
+        fit="pad",
+    )
+
+
+def normalized_key(source: Path, profile: RenderProfile) -> str:
+    payload = {
+        "version": NORMALIZE_VERSION,
+        "source": asset_content_hash(Path(source)),
+        "profile": replace(profile, name="").as_dict(),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def normalize_command(source: Path, output_path: Path, profile: RenderProfile, has_audio: bool, threads: int = 0) -> List[str]:
+    """One ffmpeg command converting `source` to the profile's canvas, rate and audio layout.
+
+    Sources without audio get a silent stereo track, so every intermediate can
+    feed acrossfade/concat without per-clip special cases downstream.
+    """
+    cmd = ["ffmpeg", "-y", "-i", str(source)]
+    if not has_audio:
+        cmd.extend(["-f", "lavfi", "-i", f"anullsrc=r={profile.audio_fps}:cl=stereo"])
+    video = [
+        f"fps={profile.fps}",
+        f"scale={profile.width}:{profile.height}:force_original_aspect_ratio=decrease",
+        f"pad={profile.width}:{profile.height}:(ow-iw)/2:(oh-ih)/2:black",
+        "setsar=1",
+        f"format={profile.pix_fmt}",
+    ]
+    cmd.extend(["-map", "0:v:0", "-map", "0:a:0" if has_audio else "1:a:0", "-vf", ",".join(video)])
+    cmd.extend(profile.ffmpeg_output_args())
+    # A keyframe every second keeps the edit's input seeks (-ss) cheap and exact.
+    cmd.extend(["-g", str(profile.fps), "-video_track_timescale", str(NORMALIZED_TIMESCALE), "-movflags", "+faststart"])
+    if threads:
+        cmd.extend(["-threads", str(threads)])
+    if not has_audio:
+        cmd.append("-shortest")
+    cmd.append(str(output_path))
+    return cmd
+
+
+def normalize_sources(
+    sources: Sequence[Path],
+    profile: RenderProfile,
+    workers: Optional[int] = None,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> Dict[Path, Path]:
+    """Map each distinct source to its normalized intermediate, converting cache misses in parallel.
+
+    Each worker hashes its source and, on a miss, drives its own ffmpeg
+    process, so up to `workers` conversions run at once with the cores split
+    between them.
+    """
+    settings = get_settings()
+    cache_dir = settings.normalized_dir
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    unique = list(dict.fromkeys(Path(source) for source in sources))
+    if not unique:
+        return {}
+
+    workers = min(workers or settings.auto_edit_normalize_workers or os.cpu_count() or 1, len(unique))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    results: Dict[Path, Tuple[Path, bool]] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_ensure_normalized, source, profile, cache_dir, threads): source for source in unique}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_progress:
+                on_progress(len(results) / len(unique))
+
+    converted = sum(1 for _, hit in results.values() if not hit)
+    LOGGER.info("Normalized %s clips (%s cached) for %sx%s@%s", len(unique), len(unique) - converted, profile.width, profile.height, profile.fps)
+    if converted:
+        evict_lru_files(cache_dir, settings.normalized_cache_max_bytes)
+    return {source: path for source, (path, _) in results.items()}
+
+
+def _ensure_normalized(source: Path, profile: RenderProfile, cache_dir: Path, threads: int) -> Tuple[Path, bool]:
+    target = cache_dir / f"{normalized_key(source, profile)}.mp4"
+    if target.exists():
+        # mtime doubles as the LRU clock for eviction.
+        target.touch(exist_ok=True)
+        return target, True
+
+    temp_path = target.with_name(f"{target.stem}.{uuid4().hex[:8]}.tmp.mp4")
+    cmd = normalize_command(source, temp_path, profile, probe_media(source).has_audio, threads)
+    try:
+        run_ffmpeg(cmd, "normalize")
+        # Concurrent edits may race on the same key; both write identical bytes, last rename wins.
+        os.replace(temp_path, target)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return target, False
@@ -0,0 +1,362 @@
+"""
+Shared ffmpeg/ffprobe subprocess runner.
+
+Every ffmpeg invocation in the backend goes through `run_ffmpeg` (one
+command) or `run_pipeline` (processes linked stdout->stdin, see
+`stage_pipeline`). The runner:
+
+- adds `-progress pipe:1` to the last ffmpeg of a chain and turns its
+  key=value blocks into `FFmpegProgress` updates (and a completed fraction
+  when the output duration is known);
+- sends stderr to a temporary file instead of memory, keeping only its tail
+  for the error raised on failure;
+- enforces a wall-clock timeout and per-process CPU-time and address-space
+  limits (`ResourceLimits`, defaults from settings);
+- records wall time, CPU time and peak memory of every process, logs them
+  and keeps the recent ones for `timing_summary()`, so slow filter graphs
+  stand out by name.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import IO, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from backend.config import get_settings
+
+try:  # POSIX only; limits and per-process rusage are skipped elsewhere
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+LOGGER = logging.getLogger(__name__)
+
+# Invocations kept for `recent_runs` / `timing_summary`.
+STATS_HISTORY = 512
+# Bytes of stderr kept on the raised error; the rest only ever touches disk.
+STDERR_TAIL_BYTES = 64 * 1024
+# Arguments whose value is a filter graph, recorded with the timings.
+FILTER_ARGS = ("-filter_complex", "-vf", "-af", "-lavfi", "-filter:v", "-filter:a")
+
+ProgressCallback = Callable[[float], None]
+UpdateCallback = Callable[["FFmpegProgress"], None]
+
+
+class FFmpegError(subprocess.CalledProcessError):
+    """An ffmpeg (or ffprobe) process exited non-zero; `name` identifies the invocation."""
+
+    def __init__(self, name: str, returncode: int, cmd: Sequence[str], stderr: str = ""):
+        super().__init__(returncode, list(cmd), stderr=stderr)
+        self.name = name
+
+    def __str__(self) -> str:
+        if self.returncode == -getattr(signal, "SIGXCPU", -1):
+            return f"ffmpeg '{self.name}' exceeded its CPU time limit"
+        return f"ffmpeg '{self.name}' failed with exit status {self.returncode}"
+
+
+class FFmpegTimeout(FFmpegError):
+    """The invocation ran past its wall-clock limit and was killed."""
+
+    def __init__(self, name: str, timeout: float, cmd: Sequence[str], stderr: str = ""):
+        super().__init__(name, -signal.SIGKILL, cmd, stderr)
+        self.timeout = timeout
+
+    def __str__(self) -> str:
+        return f"ffmpeg '{self.name}' timed out after {self.timeout:g}s"
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """Limits for one invocation; 0 disables a limit. CPU and memory apply to each process."""
+
+    timeout: float = 0.0
+    cpu_seconds: int = 0
+    memory_bytes: int = 0
+
+    @classmethod
+    def from_settings(cls) -> "ResourceLimits":
+        settings = get_settings()
+        return cls(
+            timeout=settings.ffmpeg_timeout_seconds,
+            cpu_seconds=settings.ffmpeg_cpu_limit_seconds,
+            memory_bytes=settings.ffmpeg_memory_limit_bytes,
+        )
+
+
+@dataclass(frozen=True)
+class FFmpegProgress:
+    """One `-progress` block of the last process in a chain."""
+
+    out_time: float = 0.0
+    frame: int = 0
+    fps: float = 0.0
+    speed: Optional[float] = None
+    total_size: int = 0
+    # Share of the expected output duration written; None when the duration is unknown.
+    fraction: Optional[float] = None
+    done: bool = False
+
+
+@dataclass(frozen=True)
+class FFmpegRun:
+    """Timing of one process."""
+
+    name: str
+    program: str
+    wall_seconds: float
+    cpu_seconds: float
+    max_rss_bytes: int
+    returncode: int
+    speed: Optional[float] = None
+    filters: str = ""
+
+
+_RUNS: Deque[FFmpegRun] = deque(maxlen=STATS_HISTORY)
+_RUNS_LOCK = threading.Lock()
+
+
+def run_ffmpeg(
+    cmd: Sequence[str],
+    name: str = "ffmpeg",
+    duration: float = 0.0,
+    on_progress: Optional[ProgressCallback] = None,
+    on_update: Optional[UpdateCallback] = None,
+    limits: Optional[ResourceLimits] = None,
+) -> FFmpegRun:
+    """Run one ffmpeg command to completion.
+
+    With `duration`, `on_progress` receives the fraction of it written so far.
+    An exception raised by a callback (e.g. a cancellation check) kills the
+    process before propagating.
+    """
+    return run_pipeline([(name, list(cmd))], duration, on_progress, on_update, limits)[-1]
+
+
+def run_capture(cmd: Sequence[str], name: str = "ffprobe", limits: Optional[ResourceLimits] = None) -> bytes:
+    """Run a command that reports on stdout (ffprobe) and return what it printed."""
+    stdout: List[bytes] = []
+    run_pipeline([(name, list(cmd))], limits=limits, capture=stdout)
+    return b"".join(stdout)
+
+
+def run_pipeline(
+    chain: Sequence[Tuple[str, List[str]]],
+    duration: float = 0.0,
+    on_progress: Optional[ProgressCallback] = None,
+    on_update: Optional[UpdateCallback] = None,
+    limits: Optional[ResourceLimits] = None,
+    capture: Optional[List[bytes]] = None,
+) -> List[FFmpegRun]:
+    """Start every process of a chain wired stdout->stdin, then wait for all of them.
+
+    The last process reports progress on its free stdout, unless `capture` is
+    given, in which case its stdout is collected there instead. Returns the
+    timing of each process, in chain order.
+    """
+    limits = limits or ResourceLimits.from_settings()
+    names = " | ".join(name for name, _ in chain)
+    LOGGER.debug("Running %s", names)
+    processes: List[Tuple[str, List[str], subprocess.Popen, IO[bytes], float]] = []
+    timed_out = threading.Event()
+    timer: Optional[threading.Timer] = None
+    upstream: Optional[IO[bytes]] = None
+    last_update: Optional[FFmpegProgress] = None
+    try:
+        for index, (name, cmd) in enumerate(chain):
+            last = index == len(chain) - 1
+            if last and capture is None and _is_ffmpeg(cmd):
+                # Global options go right after the program name, ahead of every input and output.
+                cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+            # stderr goes to a file: an unread pipe could fill up and stall the whole chain.
+            log = tempfile.TemporaryFile()
+            process = subprocess.Popen(
+                cmd,
+                stdin=upstream if upstream is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE if not last or capture is not None or _is_ffmpeg(cmd) else subprocess.DEVNULL,
+                stderr=log,
+            )
+            _apply_limits(process.pid, limits)
+            if upstream is not None:
+                # Only the child holds the read end now, so a dead consumer surfaces upstream as EPIPE.
+                upstream.close()
+            upstream = process.stdout
+            processes.append((name, cmd, process, log, time.monotonic()))
+
+        if limits.timeout > 0:
+            timer = threading.Timer(limits.timeout, _kill_all, ([entry[2] for entry in processes], timed_out))
+            timer.daemon = True
+            timer.start()
+
+        if upstream is not None:
+            if capture is not None:
+                capture.append(upstream.read())
+            else:
+                last_update = _read_progress(upstream, duration, on_progress, on_update)
+            upstream.close()
+
+        runs: List[FFmpegRun] = []
+        failed: Optional[FFmpegError] = None
+        # Wait downstream-first: a failing consumer is the root cause; its producer just sees a broken pipe.
+        for name, cmd, process, log, started in reversed(processes):
+            returncode, usage = _wait(process)
+            runs.append(_record(name, cmd, started, returncode, usage, last_update if process is processes[-1][2] else None))
+            if returncode != 0 and failed is None:
+                stderr = _tail(log)
+                failed = (
+                    FFmpegTimeout(name, limits.timeout, cmd, stderr)
+                    if timed_out.is_set()
+                    else FFmpegError(name, returncode, cmd, stderr)
+                )
+                _kill_all([entry[2] for entry in processes])
+        if failed is not None:
+            LOGGER.error("%s: %s", failed, failed.stderr[-500:])
+            raise failed
+        return list(reversed(runs))
+    finally:
+        if timer is not None:
+            timer.cancel()
+        for _, _, process, log, _ in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            log.close()
+
+
+def recent_runs() -> List[FFmpegRun]:
+    with _RUNS_LOCK:
+        return list(_RUNS)
+
+
+def timing_summary() -> Dict[str, Dict[str, float]]:
+    """Per invocation name: count, total and worst wall time, and CPU time of the recent runs."""
+    summary: Dict[str, Dict[str, float]] = {}
+    for run in recent_runs():
+        entry = summary.setdefault(run.name, {"count": 0, "wall_seconds": 0.0, "max_wall_seconds": 0.0, "cpu_seconds": 0.0})
+        entry["count"] += 1
+        entry["wall_seconds"] += run.wall_seconds
+        entry["max_wall_seconds"] = max(entry["max_wall_seconds"], run.wall_seconds)
+        entry["cpu_seconds"] += run.cpu_seconds
+    return summary
+
+
+def _is_ffmpeg(cmd: Sequence[str]) -> bool:
+    return bool(cmd) and os.path.basename(cmd[0]).startswith("ffmpeg") and cmd[-1] not in ("pipe:1", "-")
+
+
+def _read_progress(
+    stream: IO[bytes], duration: float, on_progress: Optional[ProgressCallback], on_update: Optional[UpdateCallback]
+) -> Optional[FFmpegProgress]:
+    """Parse key=value lines until EOF; every `progress=` line closes one block."""
+    block: Dict[str, str] = {}
+    update: Optional[FFmpegProgress] = None
+    for line in stream:
+        key, _, value = line.decode("utf-8", "replace").strip().partition("=")
+        if key != "progress":
+            block[key] = value
+            continue
+        update = _progress_from_block(block, duration, value == "end")
+        block = {}
+        if on_update:
+            on_update(update)
+        if on_progress and update.fraction is not None and not update.done:
+            on_progress(update.fraction)
+    return update
+
+
+def _progress_from_block(block: Dict[str, str], duration: float, done: bool) -> FFmpegProgress:
+    out_time_us = block.get("out_time_us") or block.get("out_time_ms") or ""
+    out_time = int(out_time_us) / 1_000_000 if out_time_us.isdigit() else 0.0
+    speed = block.get("speed", "").rstrip("x")
+    return FFmpegProgress(
+        out_time=out_time,
+        frame=int(block["frame"]) if block.get("frame", "").isdigit() else 0,
+        fps=_float(block.get("fps")) or 0.0,
+        speed=_float(speed),
+        total_size=int(block["total_size"]) if block.get("total_size", "").isdigit() else 0,
+        fraction=min(out_time / duration, 0.99) if duration > 0 else None,
+        done=done,
+    )
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "", "N/A") else None
+    except ValueError:
+        return None
+
+
+def _apply_limits(pid: int, limits: ResourceLimits) -> None:
+    # prlimit on the child from the parent avoids preexec_fn, which is unsafe with the worker threads.
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        if limits.cpu_seconds > 0:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 5))
+        if limits.memory_bytes > 0:
+            resource.prlimit(pid, resource.RLIMIT_AS, (limits.memory_bytes, limits.memory_bytes))
+    except (OSError, ValueError) as exc:  # the process may already have exited
+        LOGGER.debug("Could not limit ffmpeg process %s: %s", pid, exc)
+
+
+def _kill_all(processes: Sequence[subprocess.Popen], flag: Optional[threading.Event] = None) -> None:
+    if flag is not None:
+        flag.set()
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+
+
+def _wait(process: subprocess.Popen) -> Tuple[int, Optional[object]]:
+    """Reap the process, with its own resource usage where the platform reports it."""
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:  # already reaped (e.g. by poll)
+        return process.wait(), None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage
+
+
+def _record(
+    name: str, cmd: Sequence[str], started: float, returncode: int, usage, progress: Optional[FFmpegProgress]
+) -> FFmpegRun:
+    filters = " ; ".join(cmd[index + 1] for index, arg in enumerate(cmd[:-1]) if arg in FILTER_ARGS)
+    run = FFmpegRun(
+        name=name,
+        program=os.path.basename(cmd[0]),
+        wall_seconds=time.monotonic() - started,
+        cpu_seconds=(usage.ru_utime + usage.ru_stime) if usage is not None else 0.0,
+        # ru_maxrss is in KiB on Linux.
+        max_rss_bytes=int(usage.ru_maxrss) * 1024 if usage is not None else 0,
+        returncode=returncode,
+        speed=progress.speed if progress is not None else None,
+        filters=filters,
+    )
+    with _RUNS_LOCK:
+        _RUNS.append(run)
+    LOGGER.info(
+        "%s '%s': %.2fs wall, %.2fs cpu, %.0f MiB peak%s",
+        run.program,
+        name,
+        run.wall_seconds,
+        run.cpu_seconds,
+        run.max_rss_bytes / 1024**2,
+        f", {run.speed:g}x" if run.speed else "",
+    )
+    return run
+
+
+def _tail(log: IO[bytes]) -> str:
+    log.seek(0, os.SEEK_END)
+    log.seek(max(log.tell() - STDERR_TAIL_BYTES, 0))
+    return log.read().decode("utf-8", "replace")
@@ -0,0 +1,388 @@
+"""
+Timeline to ffmpeg filtergraph compiler.
+
+Turns the `segments` structure of a project timeline into a single
+`ffmpeg -filter_complex` invocation (trim, zoom, slowmo, captions, sfx and the
+vertical crop) so rendering runs entirely in native code. Timelines using
+effects the compiler does not know raise `UnsupportedTimeline`; callers fall
+back to the MoviePy composition in that case.
+"""
+
+from __future__ import annotations
+
+import textwrap
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.services.render_geometry import plan_crop
+from backend.services.render_profile import RenderProfile
+
+ZOOM_FACTOR = 1.12
+SLOWMO_FACTOR = 0.85
+SFX_GAIN = 1.35
+CAPTION_FONT = "DejaVu Sans"
+# Caption metrics on the 1080x1920 reference canvas; `caption_layout` scales them to a profile.
+CAPTION_FONT_SIZE = 64
+CAPTION_BOX_WIDTH = 960
+CAPTION_BOTTOM_MARGIN = 140
+CAPTION_LINE_SPACING = 8
+CAPTION_REFERENCE_SIZE = (1080, 1920)
+CAPTION_WRAP_CHARS = 28
+
+COMPILED_EFFECTS = {"zoom", "slowmo"}
+# Markers the MoviePy path does not render either; they only drive timeline analysis.
+PASSTHROUGH_EFFECTS = {"caption", "cut", "fade_out"}
+PASSTHROUGH_PREFIXES = ("sfx:", "text:")
+
+
+@dataclass(frozen=True)
+class CaptionLayout:
+    """Caption size and placement in pixels of one output canvas."""
+
+    font_size: int
+    box_width: int
+    bottom_margin: int
+    line_spacing: int
+
+
+def caption_layout(profile: RenderProfile) -> CaptionLayout:
+    """Scale the reference caption metrics to the profile's canvas (e.g. 360x640 previews)."""
+    reference_width, reference_height = CAPTION_REFERENCE_SIZE
+    scale = min(profile.width / reference_width, profile.height / reference_height)
+    return CaptionLayout(
+        font_size=max(8, round(CAPTION_FONT_SIZE * scale)),
+        box_width=round(CAPTION_BOX_WIDTH * profile.width / reference_width),
+        bottom_margin=round(CAPTION_BOTTOM_MARGIN * profile.height / reference_height),
+        line_spacing=max(1, round(CAPTION_LINE_SPACING * scale)),
+    )
+
+
+class UnsupportedTimeline(ValueError):
+    """Raised when a timeline uses effects the filtergraph compiler cannot express."""
+
+
+@dataclass
+class SourceInfo:
+    """Properties of the source asset that shape the graph."""
+
+    width: int
+    height: int
+    duration: float
+    has_audio: bool = True
+
+    @classmethod
+    def probe(cls, path: Path) -> "SourceInfo":
+        from backend.services.probe_cache import ProbeError, probe_media  # Local import keeps the compiler free of settings
+
+        try:
+            probe = probe_media(path)
+        except ProbeError as exc:
+            raise UnsupportedTimeline(f"Could not probe {path}") from exc
+        if not probe.has_video:
+            raise UnsupportedTimeline(f"No video stream in {path}")
+        # ffmpeg autorotates on decode, so crop windows must be planned in displayed orientation.
+        width, height = probe.display_size
+        return cls(width=width, height=height, duration=probe.duration, has_audio=probe.has_audio)
+
+
+@dataclass
+class FilterGraph:
+    """A compiled graph plus the inputs it reads."""
+
+    inputs: List[List[str]] = field(default_factory=list)
+    filters: List[str] = field(default_factory=list)
+    video_label: str = "vout"
+    audio_label: str = "aout"
+    duration: float = 0.0
+
+    @property
+    def filter_complex(self) -> str:
+        return ";".join(self.filters)
+
+    def add_input(self, path: Path, start: Optional[float] = None, length: Optional[float] = None) -> int:
+        args: List[str] = []
+        if start is not None:
+            args.extend(["-ss", f"{start:.3f}"])
+        if length is not None:
+            args.extend(["-t", f"{length:.3f}"])
+        args.extend(["-i", str(path)])
+        self.inputs.append(args)
+        return len(self.inputs) - 1
+
+    def command(self, output_path: Path, output_args: List[str]) -> List[str]:
+        return self.multi_output_command([GraphOutput(output_path, output_args, self.video_label, self.audio_label)])
+
+    def multi_output_command(self, outputs: List["GraphOutput"]) -> List[str]:
+        """One decode, one graph, several encoded files."""
+        cmd = ["ffmpeg", "-y"]
+        for args in self.inputs:
+            cmd.extend(args)
+        cmd.extend(["-filter_complex", self.filter_complex])
+        for output in outputs:
+            cmd.extend(["-map", _map_label(output.video_label), "-map", _map_label(output.audio_label)])
+            cmd.extend([*output.args, output.target or str(output.path)])
+        return cmd
+
+
+@dataclass
+class GraphOutput:
+    """One encoded file produced from a pair of graph labels."""
+
+    path: Path
+    args: List[str]
+    video_label: str
+    audio_label: str
+    # Muxer target when it is not simply `path`, e.g. a tee spec.
+    target: Optional[str] = None
+
+
+def tee_target(slaves: List[Tuple[Dict[str, str], Path]]) -> str:
+    """Spec for ffmpeg's tee muxer: one encode, muxed into every (options, path) slave."""
+    parts = []
+    for options, path in slaves:
+        spec = ":".join(f"{key}={_tee_escape(value)}" for key, value in options.items())
+        parts.append(f"[{spec}]{_tee_escape(str(path))}" if spec else _tee_escape(str(path)))
+    return "|".join(parts)
+
+
+def segment_bounds(segment: Dict[str, Any], asset_duration: float) -> Tuple[float, float]:
+    start = float(segment.get("start", 0.0))
+    end = float(segment.get("end", start + 1.0))
+    if end <= start:
+        end = start + 0.5
+    return max(start, 0.0), min(end, asset_duration)
+
+
+def segment_effects(segment: Dict[str, Any]) -> List[str]:
+    return [str(effect).lower() for effect in segment.get("effects", [])]
+
+
+def unsupported_effects(segments: List[Dict[str, Any]]) -> List[str]:
+    unknown: List[str] = []
+    for segment in segments:
+        for effect in segment_effects(segment):
+            if effect in COMPILED_EFFECTS or effect in PASSTHROUGH_EFFECTS or effect.startswith(PASSTHROUGH_PREFIXES):
+                continue
+            if effect not in unknown:
+                unknown.append(effect)
+    return unknown
+
+
+def segment_output_duration(segment: Dict[str, Any], source: SourceInfo) -> float:
+    start, end = segment_bounds(segment, source.duration)
+    duration = max(end - start, 0.0)
+    if "slowmo" in segment_effects(segment):
+        duration /= SLOWMO_FACTOR
+    return duration
+
+
+def compile_segment(
+    asset_path: Path,
+    segment: Dict[str, Any],
+    source: SourceInfo,
+    profile: RenderProfile,
+    work_dir: Path,
+    watermark_filter: Optional[str] = None,
+) -> FilterGraph:
+    """Graph for one segment, sfx mixed from the segment start; used by segment-parallel renders."""
+    _ensure_supported([segment])
+    graph = FilterGraph()
+    _add_segment_chain(graph, asset_path, segment, 0, source, profile, work_dir)
+
+    graph.filters.append(f"[v0]{watermark_filter}[vout]" if watermark_filter else "[v0]null[vout]")
+
+    sfx_label = _add_sfx(graph, segment, 0, 0.0, profile)
+    if sfx_label:
+        graph.filters.append(f"[a0][{sfx_label}]amix=inputs=2:duration=first:normalize=0[aout]")
+    else:
+        graph.filters.append("[a0]anull[aout]")
+
+    graph.duration = segment_output_duration(segment, source)
+    return graph
+
+
+def compile_timeline(
+    asset_path: Path,
+    timeline: Dict[str, Any],
+    source: SourceInfo,
+    profile: RenderProfile,
+    work_dir: Path,
+    watermark_filter: Optional[str] = None,
+) -> FilterGraph:
+    """Graph for a whole timeline: every segment chain, one concat, sfx placed on the output timeline."""
+    segments = sorted(timeline.get("segments", []), key=lambda item: item.get("start", 0.0))
+    if not segments:
+        segments = [{"name": "FULL", "start": 0.0, "end": source.duration, "effects": []}]
+    _ensure_supported(segments)
+
+    graph = FilterGraph()
+    for index, segment in enumerate(segments):
+        _add_segment_chain(graph, asset_path, segment, index, source, profile, work_dir)
+
+    pairs = "".join(f"[v{index}][a{index}]" for index in range(len(segments)))
+    graph.filters.append(f"{pairs}concat=n={len(segments)}:v=1:a=1[vcat][acat]")
+    graph.filters.append(f"[vcat]{watermark_filter}[vout]" if watermark_filter else "[vcat]null[vout]")
+
+    mix_inputs = ["[acat]"]
+    offset = 0.0
+    for index, segment in enumerate(segments):
+        sfx_label = _add_sfx(graph, segment, index, offset, profile)
+        if sfx_label:
+            mix_inputs.append(f"[{sfx_label}]")
+        offset += segment_output_duration(segment, source)
+    if len(mix_inputs) > 1:
+        graph.filters.append(f"{''.join(mix_inputs)}amix=inputs={len(mix_inputs)}:duration=first:normalize=0[aout]")
+    else:
+        graph.filters.append("[acat]anull[aout]")
+
+    graph.duration = offset
+    return graph
+
+
+def add_variant_outputs(
+    graph: FilterGraph,
+    base: RenderProfile,
+    variants: List[Tuple[RenderProfile, Path, List[str]]],
+) -> List[GraphOutput]:
+    """Split the graph's composed output and fit one copy to each variant's canvas and audio format.
+
+    `graph.video_label`/`audio_label` may name a filter output (`vout`) or an input stream (`0:v`).
+    """
+    count = len(variants)
+    graph.filters.append(f"[{graph.video_label}]split={count}" + "".join(f"[vsplit{index}]" for index in range(count)))
+    graph.filters.append(f"[{graph.audio_label}]asplit={count}" + "".join(f"[asplit{index}]" for index in range(count)))
+
+    outputs: List[GraphOutput] = []
+    for index, (profile, path, args) in enumerate(variants):
+        graph.filters.append(f"[vsplit{index}]{','.join(fit_filters(base, profile))}[vvar{index}]")
+        layout = _channel_layout(profile)
+        graph.filters.append(
+            f"[asplit{index}]aresample={profile.audio_fps},"
+            f"aformat=sample_rates={profile.audio_fps}:channel_layouts={layout}[avar{index}]"
+        )
+        outputs.append(GraphOutput(path, args, f"vvar{index}", f"avar{index}"))
+    return outputs
+
+
+def fit_filters(base: RenderProfile, profile: RenderProfile) -> List[str]:
+    """Filters that fit a frame composed at `base` geometry onto `profile`'s canvas."""
+    width, height = profile.width, profile.height
+    if (width, height) == (base.width, base.height):
+        filters = ["null"]
+    elif profile.fit == "pad":
+        filters = [
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black",
+            "setsar=1",
+        ]
+    else:
+        filters = plan_crop(base.width, base.height, profile).ffmpeg_filters(profile)
+    if profile.fps != base.fps:
+        filters.insert(0, f"fps={profile.fps}")
+    return filters
+
+
+def _ensure_supported(segments: List[Dict[str, Any]]) -> None:
+    unknown = unsupported_effects(segments)
+    if unknown:
+        raise UnsupportedTimeline(f"Unsupported effects for filtergraph render: {', '.join(unknown)}")
+
+
+def _channel_layout(profile: RenderProfile) -> str:
+    return "mono" if profile.audio_channels == 1 else "stereo"
+
+
+def _add_segment_chain(
+    graph: FilterGraph,
+    asset_path: Path,
+    segment: Dict[str, Any],
+    index: int,
+    source: SourceInfo,
+    profile: RenderProfile,
+    work_dir: Path,
+) -> None:
+    start, end = segment_bounds(segment, source.duration)
+    length = max(end - start, 0.04)
+    effects = segment_effects(segment)
+    if source.width <= 0 or source.height <= 0:
+        raise UnsupportedTimeline("Source frame size is unknown")
+    window = plan_crop(source.width, source.height, profile, ZOOM_FACTOR if "zoom" in effects else 1.0)
+    input_index = graph.add_input(asset_path, start=start, length=length)
+
+    video = [f"[{input_index}:v]setpts=PTS-STARTPTS"]
+    if "slowmo" in effects:
+        video.append(f"setpts=PTS/{SLOWMO_FACTOR}")
+    # Resample the frame rate first so high-fps sources drop frames before any pixel work.
+    video.append(f"fps={profile.fps}")
+    video.extend(window.ffmpeg_filters(profile))
+    video.extend(_caption_filters(segment, start, end, index, work_dir, profile))
+    graph.filters.append(",".join(video) + f"[v{index}]")
+
+    layout = _channel_layout(profile)
+    if source.has_audio:
+        audio = [f"[{input_index}:a]asetpts=PTS-STARTPTS", f"aresample={profile.audio_fps}"]
+    else:
+        audio = [f"anullsrc=r={profile.audio_fps}:cl={layout}", f"atrim=duration={length:.3f}"]
+    audio.append(f"aformat=sample_rates={profile.audio_fps}:channel_layouts={layout}")
+    if "slowmo" in effects:
+        audio.append(f"asetrate={profile.audio_fps}*{SLOWMO_FACTOR}")
+        audio.append(f"aresample={profile.audio_fps}")
+    graph.filters.append(",".join(audio) + f"[a{index}]")
+
+
+def _caption_filters(
+    segment: Dict[str, Any], start: float, end: float, index: int, work_dir: Path, profile: RenderProfile
+) -> List[str]:
+    layout = caption_layout(profile)
+    filters: List[str] = []
+    for caption_index, caption in enumerate(segment.get("captions", [])):
+        text = str(caption.get("text", "")).strip()
+        if not text:
+            continue
+        caption_start = max(0.0, float(caption.get("start", start)) - start)
+        duration = max(0.1, float(caption.get("end", end)) - float(caption.get("start", start)))
+        text_file = work_dir / f"caption_{index:03d}_{caption_index:02d}.txt"
+        text_file.parent.mkdir(parents=True, exist_ok=True)
+        text_file.write_text("\n".join(textwrap.wrap(text, CAPTION_WRAP_CHARS)) or text, encoding="utf-8")
+        filters.append(
+            f"drawtext=textfile={_quote(str(text_file))}:font={_quote(CAPTION_FONT)}:fontsize={layout.font_size}:"
+            f"fontcolor=white:line_spacing={layout.line_spacing}:x=(w-text_w)/2:y=h-text_h-{layout.bottom_margin}:"
+            f"enable='between(t,{caption_start:.3f},{caption_start + duration:.3f})'"
+        )
+    return filters
+
+
+def _add_sfx(graph: FilterGraph, segment: Dict[str, Any], index: int, offset: float, profile: RenderProfile) -> Optional[str]:
+    sfx = segment.get("sfx") or {}
+    sfx_path = Path(str(sfx.get("path", ""))) if sfx else None
+    if not sfx_path or not sfx_path.is_file():
+        return None
+    input_index = graph.add_input(sfx_path)
+    delay_ms = int(round(offset * 1000))
+    layout = _channel_layout(profile)
+    chain = [
+        f"[{input_index}:a]volume={SFX_GAIN}",
+        f"aresample={profile.audio_fps}",
+        f"aformat=sample_rates={profile.audio_fps}:channel_layouts={layout}",
+    ]
+    if delay_ms:
+        chain.append(f"adelay={delay_ms}|{delay_ms}" if profile.audio_channels == 2 else f"adelay={delay_ms}")
+    label = f"sfx{index}"
+    graph.filters.append(",".join(chain) + f"[{label}]")
+    return label
+
+
+def _tee_escape(value: str) -> str:
+    for char in ("\\", ":", "|", "[", "]"):
+        value = value.replace(char, "\\" + char)
+    return value
+
+
+def _map_label(label: str) -> str:
+    # Input stream specifiers (0:v) are mapped bare; filter outputs need brackets.
+    return label if ":" in label else f"[{label}]"
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "'\\''") + "'"
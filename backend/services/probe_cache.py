@@ -0,0 +1,293 @@
+"""
+Shared, memoized media probing.
+
+Every ffprobe result is cached under the file's resolved path, size and
+modification time, so a file is probed once no matter how many callers ask
+about it and an edited or replaced file is probed again automatically. The
+in-memory cache is a bounded LRU; with `probe_cache_path` set, entries are
+also persisted as JSON and survive process restarts. Each save merges with the
+records already on disk under an exclusive file lock, so the API and RQ
+workers can share one file without dropping each other's entries.
+
+Keyframe timestamps are collected lazily with a demux-only packet scan, since
+most callers only need the container and stream summary.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.config import get_settings
+from backend.services.ffmpeg_runner import FFmpegError, ResourceLimits, run_capture
+
+LOGGER = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, int, int]
+# A probe (even a full packet scan) that takes longer is stuck on a bad file.
+FFPROBE_TIMEOUT = 120.0
+
+
+class ProbeError(RuntimeError):
+    """Raised when ffprobe cannot read a media file."""
+
+
+@dataclass(frozen=True)
+class MediaProbe:
+    """Container and stream summary of one media file."""
+
+    duration: float
+    start_time: float = 0.0
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    rotation: int = 0
+    has_video: bool = False
+    has_audio: bool = False
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    streams: List[Dict[str, Any]] = field(default_factory=list, compare=False)
+    # Filled in by `ProbeCache.keyframes`; None until first requested.
+    keyframes: Optional[List[float]] = field(default=None, compare=False)
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """Frame size after ffmpeg applies rotation metadata on decode."""
+        if self.rotation % 180 == 90:
+            return self.height, self.width
+        return self.width, self.height
+
+    @property
+    def resolution(self) -> str:
+        return f"{self.width}x{self.height}"
+
+    @classmethod
+    def from_ffprobe(cls, payload: Dict[str, Any]) -> "MediaProbe":
+        streams = payload.get("streams") or []
+        video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+        audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+        duration = (payload.get("format") or {}).get("duration") or (video or {}).get("duration") or 0.0
+        return cls(
+            duration=float(duration),
+            start_time=float((payload.get("format") or {}).get("start_time") or 0.0),
+            width=int((video or {}).get("width", 0)),
+            height=int((video or {}).get("height", 0)),
+            fps=_frame_rate((video or {}).get("r_frame_rate")) or _frame_rate((video or {}).get("avg_frame_rate")),
+            rotation=stream_rotation(video or {}),
+            has_video=video is not None,
+            has_audio=audio is not None,
+            video_codec=(video or {}).get("codec_name"),
+            audio_codec=(audio or {}).get("codec_name"),
+            streams=[_stream_summary(stream) for stream in streams],
+        )
+
+
+def stream_rotation(stream: Dict[str, Any]) -> int:
+    """Rotation in degrees from the legacy `rotate` tag or the display matrix side data."""
+    rotation = (stream.get("tags") or {}).get("rotate")
+    for side_data in stream.get("side_data_list") or []:
+        if "rotation" in side_data:
+            rotation = side_data["rotation"]
+    try:
+        return int(float(rotation or 0)) % 360
+    except (TypeError, ValueError):
+        return 0
+
+
+class ProbeCache:
+    """Thread-safe LRU of `MediaProbe` results keyed by (path, size, mtime)."""
+
+    def __init__(self, max_entries: Optional[int] = None, persist_path: Optional[Path] = None):
+        settings = get_settings()
+        self.max_entries = max(max_entries if max_entries is not None else settings.probe_cache_max_entries, 1)
+        self.persist_path = persist_path if persist_path is not None else settings.probe_cache_path
+        self._entries: "OrderedDict[CacheKey, MediaProbe]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, path: Path) -> MediaProbe:
+        key = self._key(path)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+        result = MediaProbe.from_ffprobe(
+            _run_ffprobe(["-show_format", "-show_streams", "-print_format", "json"], key[0])
+        )
+        self._put(key, result)
+        return result
+
+    def duration(self, path: Path) -> float:
+        return self.probe(path).duration
+
+    def keyframes(self, path: Path) -> List[float]:
+        """Keyframe times of the first video stream, in seconds from the file's start (as `-ss` counts)."""
+        probe = self.probe(path)
+        if probe.keyframes is not None:
+            return probe.keyframes
+        if not probe.has_video:
+            times: List[float] = []
+        else:
+            # Packet flags come from the demuxer, so nothing is decoded.
+            payload = _run_ffprobe(
+                ["-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-print_format", "json"],
+                self._key(path)[0],
+            )
+            times = sorted(
+                float(packet["pts_time"]) - probe.start_time
+                for packet in payload.get("packets") or []
+                if "K" in (packet.get("flags") or "") and packet.get("pts_time") not in (None, "N/A")
+            )
+        probe = _replace_keyframes(probe, times)
+        self._put(self._key(path), probe)
+        return times
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(path: Path) -> CacheKey:
+        resolved = Path(path).resolve()
+        try:
+            stat = resolved.stat()
+        except OSError as exc:
+            raise ProbeError(f"Cannot probe {path}: {exc}") from exc
+        return str(resolved), stat.st_size, stat.st_mtime_ns
+
+    def _get(self, key: CacheKey) -> Optional[MediaProbe]:
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, key: CacheKey, probe: MediaProbe) -> None:
+        with self._lock:
+            self._load()
+            # A rewritten file leaves its old key behind; drop it rather than wait for eviction.
+            for stale in [existing for existing in self._entries if existing[0] == key[0] and existing != key]:
+                del self._entries[stale]
+            self._entries[key] = probe
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.persist_path:
+            return
+        self._entries.update(_read_records(Path(self.persist_path), self.max_entries))
+
+    def _save(self) -> None:
+        """Merge our entries into the file; entries other processes wrote since we loaded are kept."""
+        if not self.persist_path:
+            return
+        path = Path(self.persist_path)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path.with_name(f".{path.name}.lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                ours = set(self._entries)
+                paths = {key[0] for key in ours}
+                merged: "OrderedDict[CacheKey, MediaProbe]" = OrderedDict()
+                for key, entry in _read_records(path, self.max_entries).items():
+                    if key in ours:
+                        # Keep keyframes another process scanned for the same file version.
+                        if self._entries[key].keyframes is None and entry.keyframes is not None:
+                            self._entries[key] = entry
+                    elif key[0] not in paths:
+                        merged[key] = entry
+                # Entries only on disk are older than anything we touched; they go first and are evicted first.
+                merged.update(self._entries)
+                while len(merged) > self.max_entries:
+                    merged.popitem(last=False)
+                self._entries = merged
+                records = [
+                    {"path": key[0], "size": key[1], "mtime_ns": key[2], "probe": asdict(entry)}
+                    for key, entry in merged.items()
+                ]
+                temp_path.write_text(json.dumps(records), encoding="utf-8")
+                os.replace(temp_path, path)
+        except OSError as exc:  # pragma: no cover - persistence is best effort
+            LOGGER.warning("Could not persist probe cache to %s: %s", path, exc)
+
+
+_CACHE: Optional[ProbeCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_probe_cache() -> ProbeCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ProbeCache()
+        return _CACHE
+
+
+def probe_media(path: Path) -> MediaProbe:
+    return get_probe_cache().probe(path)
+
+
+def _run_ffprobe(args: List[str], path: str) -> Dict[str, Any]:
+    try:
+        output = run_capture(["ffprobe", "-v", "error", *args, path], "ffprobe", ResourceLimits(timeout=FFPROBE_TIMEOUT))
+        return json.loads(output or b"{}")
+    except (OSError, FFmpegError, ValueError) as exc:
+        raise ProbeError(f"ffprobe failed for {path}: {exc}") from exc
+
+
+def _read_records(path: Path, limit: int) -> "OrderedDict[CacheKey, MediaProbe]":
+    """The newest `limit` entries of a persisted cache file; empty if it is missing or unreadable."""
+    entries: "OrderedDict[CacheKey, MediaProbe]" = OrderedDict()
+    if not path.exists():
+        return entries
+    try:
+        records = json.loads(path.read_text(encoding="utf-8"))
+        for record in records[-limit:]:
+            key = (record["path"], int(record["size"]), int(record["mtime_ns"]))
+            entries[key] = MediaProbe(**record["probe"])
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        LOGGER.warning("Ignoring unreadable probe cache %s: %s", path, exc)
+        entries.clear()
+    return entries
+
+
+def _frame_rate(value: Optional[str]) -> float:
+    try:
+        num, _, denom = str(value or "0/1").partition("/")
+        denominator = float(denom or 1)
+        return float(num) / denominator if denominator else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _stream_summary(stream: Dict[str, Any]) -> Dict[str, Any]:
+    keys = ("index", "codec_type", "codec_name", "width", "height", "pix_fmt", "sample_rate", "channels", "duration")
+    return {key: stream[key] for key in keys if key in stream}
+
+
+def _replace_keyframes(probe: MediaProbe, keyframes: List[float]) -> MediaProbe:
+    values = asdict(probe)
+    values["keyframes"] = keyframes
+    return MediaProbe(**values)
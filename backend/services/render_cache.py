@@ -0,0 +1,218 @@
+"""
+Content-addressed render result cache.
+
+A render is identified by a fingerprint over everything that determines its
+output bytes: the asset's content hash, the canonicalized timeline, the
+watermark state and the encoder profile. Finished outputs are indexed by that
+fingerprint so an unchanged project can be served without enqueueing a job.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.config import get_settings
+from backend.models import RenderCacheEntry
+from backend.services.render_profile import FINAL_PROFILE, RenderProfile
+
+LOGGER = logging.getLogger(__name__)
+
+# Bump when a pipeline change alters output for identical inputs.
+RENDER_CACHE_VERSION = 3
+
+_HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def asset_content_hash(path: Path) -> str:
+    """SHA-256 of a media file, memoized on (path, size, mtime)."""
+    stat = path.stat()
+    return _hash_file(str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _hash_file(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def canonical_timeline(timeline: Union[str, Dict[str, Any]]) -> str:
+    """Stable JSON for a timeline; the `asset` block is derived data and excluded."""
+    data = json.loads(timeline) if isinstance(timeline, str) else dict(timeline)
+    data.pop("asset", None)
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def timeline_is_empty(timeline_json: Optional[str]) -> bool:
+    return not timeline_json or timeline_json.strip() in {"", "{}"}
+
+
+def render_fingerprint(
+    asset_path: Path,
+    timeline: Union[str, Dict[str, Any]],
+    watermark: bool,
+    profile: RenderProfile = FINAL_PROFILE,
+    engine: Optional[str] = None,
+) -> str:
+    """`engine` defaults to `render_engine`; MoviePy and the ffmpeg filtergraph encode different bytes."""
+    settings = get_settings()
+    payload = {
+        "version": RENDER_CACHE_VERSION,
+        "asset": asset_content_hash(asset_path),
+        "timeline": canonical_timeline(timeline),
+        "watermark": (settings.watermark_text or settings.app_name) if watermark else None,
+        "profile": profile.as_dict(),
+        "engine": engine or settings.render_engine,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def segment_fingerprint(
+    asset_hash: str,
+    segment: Dict[str, Any],
+    watermark_text: Optional[str],
+    profile: RenderProfile = FINAL_PROFILE,
+    engine: Optional[str] = None,
+) -> str:
+    """Fingerprint of one encoded segment; only fields that change its pixels or audio count (the engine does)."""
+    sfx = segment.get("sfx") or {}
+    sfx_path = Path(str(sfx.get("path", ""))) if sfx else None
+    payload = {
+        "version": RENDER_CACHE_VERSION,
+        "asset": asset_hash,
+        "start": float(segment.get("start", 0.0)),
+        "end": float(segment.get("end", float(segment.get("start", 0.0)) + 1.0)),
+        "effects": sorted(str(effect).lower() for effect in segment.get("effects", [])),
+        "captions": [
+            {"text": str(caption.get("text", "")).strip(), "start": caption.get("start"), "end": caption.get("end")}
+            for caption in segment.get("captions", [])
+        ],
+        "sfx": asset_content_hash(sfx_path) if sfx_path and sfx_path.is_file() else None,
+        "watermark": watermark_text,
+        "profile": profile.as_dict(),
+        "engine": engine or get_settings().render_engine,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def evict_lru_files(directory: Path, max_bytes: int, pattern: str = "*.mp4") -> int:
+    """Delete the least-recently-used files in `directory` (by mtime) until it fits in `max_bytes`."""
+    files = [path for path in directory.glob(pattern) if path.is_file() and not path.stem.endswith(".tmp")]
+    total = sum(path.stat().st_size for path in files)
+    evicted = 0
+    for path in sorted(files, key=lambda item: item.stat().st_mtime):
+        if total <= max_bytes:
+            break
+        total -= path.stat().st_size
+        path.unlink(missing_ok=True)
+        evicted += 1
+    if evicted:
+        LOGGER.info("Evicted %s cached files from %s", evicted, directory)
+    return evicted
+
+
+def evict_expired_files(directory: Path, max_age_seconds: float, pattern: str = "*.mp4") -> int:
+    """Delete files in `directory` not written or reused within `max_age_seconds`."""
+    cutoff = time.time() - max_age_seconds
+    evicted = 0
+    for path in directory.glob(pattern):
+        if path.is_file() and not path.stem.endswith(".tmp") and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            evicted += 1
+    if evicted:
+        LOGGER.info("Expired %s files from %s", evicted, directory)
+    return evicted
+
+
+class RenderCache:
+    """Fingerprint -> finished output index with size-bounded LRU eviction."""
+
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        self.settings = get_settings()
+        self._max_bytes = max_bytes
+
+    @property
+    def max_bytes(self) -> int:
+        return self.settings.render_cache_max_bytes if self._max_bytes is None else self._max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.render_cache_enabled
+
+    def lookup(self, session: Session, fingerprint: str) -> Optional[RenderCacheEntry]:
+        if not self.enabled:
+            return None
+        entry = session.query(RenderCacheEntry).filter_by(fingerprint=fingerprint).one_or_none()
+        if entry is None:
+            return None
+        if not Path(entry.output_path).exists():
+            LOGGER.info("Dropping stale render cache entry %s", fingerprint[:12])
+            session.delete(entry)
+            session.flush()
+            return None
+        # Keeps file-age based sweeps (previews) from deleting an output that is still being served.
+        Path(entry.output_path).touch(exist_ok=True)
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = datetime.utcnow()
+        session.flush()
+        return entry
+
+    def store(self, session: Session, fingerprint: str, output_path: Path, output_url: str, project_id: Optional[int] = None) -> Optional[RenderCacheEntry]:
+        if not self.enabled or not output_path.exists():
+            return None
+        entry = session.query(RenderCacheEntry).filter_by(fingerprint=fingerprint).one_or_none()
+        if entry is None:
+            entry = RenderCacheEntry(fingerprint=fingerprint)
+            session.add(entry)
+        entry.project_id = project_id
+        entry.output_path = str(output_path)
+        entry.output_url = output_url
+        entry.size_bytes = output_path.stat().st_size
+        entry.last_used_at = datetime.utcnow()
+        session.flush()
+        self.evict(session, keep=fingerprint)
+        return entry
+
+    def evict(self, session: Session, keep: Optional[str] = None) -> int:
+        """Delete least-recently-used outputs until the cache fits in `max_bytes`."""
+        total = session.query(func.coalesce(func.sum(RenderCacheEntry.size_bytes), 0)).scalar() or 0
+        if total <= self.max_bytes:
+            return 0
+
+        final_dir = self.settings.final_dir.resolve()
+        evicted = 0
+        for entry in session.query(RenderCacheEntry).order_by(RenderCacheEntry.last_used_at.asc()).all():
+            if total <= self.max_bytes:
+                break
+            if entry.fingerprint == keep:
+                continue
+            path = Path(entry.output_path)
+            if path.resolve().parent == final_dir:
+                path.unlink(missing_ok=True)
+                # Output variants are encoded next to the main file and share its stem.
+                for variant in final_dir.glob(f"{path.stem}_*.mp4"):
+                    variant.unlink(missing_ok=True)
+            total -= entry.size_bytes or 0
+            session.delete(entry)
+            evicted += 1
+        session.flush()
+        if evicted:
+            LOGGER.info("Evicted %s render cache entries (now %s bytes)", evicted, total)
+        return evicted
+
+
+render_cache = RenderCache()
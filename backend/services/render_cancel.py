@@ -0,0 +1,68 @@
+"""
+Cooperative render cancellation.
+
+The API sets a short-lived Redis flag per job; the worker polls it at its
+checkpoints (between segments and on every encoder progress update) and
+unwinds with `RenderCanceled`, killing any child encoder on the way out. A
+`preempted` flag makes the job requeue itself instead of ending.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+LOGGER = logging.getLogger(__name__)
+
+CANCEL_KEY_PREFIX = "render-cancel:"
+CANCEL_FLAG_TTL_SECONDS = 60 * 60
+
+REASON_CANCELED = "canceled"
+REASON_PREEMPTED = "preempted"
+
+
+class RenderCanceled(Exception):
+    """Raised at a worker checkpoint once cancellation has been requested."""
+
+    def __init__(self, job_id: str, reason: str = REASON_CANCELED) -> None:
+        super().__init__(f"Render {job_id} {reason}")
+        self.job_id = job_id
+        self.reason = reason
+
+
+class RenderPreempted(RenderCanceled):
+    """Cancellation that should put the job back on its queue."""
+
+    def __init__(self, job_id: str) -> None:
+        super().__init__(job_id, REASON_PREEMPTED)
+
+
+def cancel_key(job_id: str) -> str:
+    return f"{CANCEL_KEY_PREFIX}{job_id}"
+
+
+def request_cancel(connection, job_id: str, reason: str = REASON_CANCELED) -> None:
+    connection.set(cancel_key(job_id), reason, ex=CANCEL_FLAG_TTL_SECONDS)
+
+
+def cancel_reason(connection, job_id: str) -> Optional[str]:
+    try:
+        value = connection.get(cancel_key(job_id))
+    except Exception as exc:  # pragma: no cover - a Redis blip must not fail the render
+        LOGGER.debug("Cancel check failed for %s: %s", job_id, exc)
+        return None
+    if value is None:
+        return None
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def clear_cancel(connection, job_id: str) -> None:
+    connection.delete(cancel_key(job_id))
+
+
+def raise_if_canceled(connection, job_id: str) -> None:
+    reason = cancel_reason(connection, job_id)
+    if reason == REASON_PREEMPTED:
+        raise RenderPreempted(job_id)
+    if reason:
+        raise RenderCanceled(job_id, reason)
@@ -0,0 +1,247 @@
+"""
+Render cost estimation and admission control.
+
+Predicts the CPU-seconds and peak resident memory of a render from what is
+known before it runs: the asset's duration, resolution and frame rate, the
+timeline's segments and effects, the encoder profile and any extra variants.
+The coefficients are per-pixel costs for libx264 and the native filters on
+one core; they are deliberately coarse and only meant to rank and budget jobs.
+
+The admission policy compares a job's estimate with the predicted work still
+outstanding on the render queues and admits, defers (demotes to the bulk
+queue) or rejects it.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from backend.config import get_settings
+from backend.services.filtergraph import SLOWMO_FACTOR, segment_bounds, segment_effects
+from backend.services.render_profile import FINAL_PROFILE, RenderProfile
+
+# CPU-seconds per pixel (width * height * frames) on one core.
+DECODE_CPU_PER_PIXEL = 2.5e-9
+FILTER_CPU_PER_PIXEL = 5e-9
+ENCODE_CPU_PER_PIXEL = 3.2e-8  # libx264 "medium"
+CAPTION_CPU_SECONDS = 0.05  # drawtext setup per caption
+SEGMENT_OVERHEAD_CPU_SECONDS = 0.5  # process start, probe and concat bookkeeping
+AUDIO_CPU_PER_SECOND = 0.02
+
+# libx264 preset cost relative to "medium".
+PRESET_COST = {
+    "ultrafast": 0.2,
+    "superfast": 0.3,
+    "veryfast": 0.45,
+    "faster": 0.65,
+    "fast": 0.8,
+    "medium": 1.0,
+    "slow": 1.6,
+    "slower": 2.6,
+    "veryslow": 5.0,
+}
+# MoviePy composes frames in Python and pipes raw RGB to ffmpeg.
+MOVIEPY_FILTER_COST = 6.0
+
+BASE_MEMORY_MB = 250.0
+DECODE_BUFFER_FRAMES = 16
+ENCODE_LOOKAHEAD_FRAMES = 60  # x264 rc-lookahead plus reference frames
+MOVIEPY_FRAME_BUFFERS = 8  # RGB frames held by MoviePy compositing
+
+ADMISSION_RETRY_AFTER_SECONDS = 60
+
+ADMIT = "admit"
+DEFER = "defer"
+REJECT = "reject"
+
+
+@dataclass(frozen=True)
+class RenderEstimate:
+    """Predicted cost of one render job."""
+
+    cpu_seconds: float
+    peak_memory_mb: float
+    output_seconds: float
+    segments: int
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class AdmissionDecision:
+    action: str
+    reason: str
+    # Predicted CPU-seconds already queued or running when the decision was made.
+    outstanding_cpu_seconds: float
+    # Set on rejections that may succeed later; None when the job can never run.
+    retry_after: Optional[int] = None
+
+
+def parse_resolution(value: Optional[str]) -> Tuple[int, int]:
+    """`"1920x1080"` -> (1920, 1080); unknown or malformed values assume 1080p."""
+    try:
+        width, height = (int(part) for part in str(value).lower().split("x", 1))
+    except (TypeError, ValueError):
+        return 1920, 1080
+    return (width, height) if width > 0 and height > 0 else (1920, 1080)
+
+
+def estimate_render(
+    asset_duration: float,
+    resolution: Optional[str],
+    fps: Optional[float],
+    timeline: Optional[Dict[str, Any]],
+    profile: RenderProfile = FINAL_PROFILE,
+    variants: Sequence[RenderProfile] = (),
+    engine: Optional[str] = None,
+    parallel: Optional[bool] = None,
+    workers: Optional[int] = None,
+) -> RenderEstimate:
+    """Predict CPU-seconds and peak memory for rendering `timeline` over an asset.
+
+    An empty timeline is generated by the worker from the whole asset, so it is
+    costed as one segment spanning the full duration.
+    """
+    settings = get_settings()
+    engine = engine or settings.render_engine
+    parallel = settings.render_parallel_segments if parallel is None else parallel
+
+    source_width, source_height = parse_resolution(resolution)
+    source_fps = fps or 30.0
+    segments = list((timeline or {}).get("segments") or []) or [{"start": 0.0, "end": asset_duration}]
+
+    source_seconds = 0.0
+    output_seconds = 0.0
+    captions = 0
+    for segment in segments:
+        start, end = segment_bounds(segment, asset_duration)
+        duration = max(end - start, 0.0)
+        effects = segment_effects(segment)
+        source_seconds += duration
+        if "slowmo" in effects:
+            duration /= SLOWMO_FACTOR
+        output_seconds += duration
+        captions += len(segment.get("captions") or [])
+
+    output_pixels_per_second = profile.width * profile.height * profile.fps
+    decode = source_seconds * source_width * source_height * source_fps * DECODE_CPU_PER_PIXEL
+    # Zoom is folded into the segment's crop window, so it adds no per-frame work.
+    filters = output_seconds * output_pixels_per_second * FILTER_CPU_PER_PIXEL
+    if engine != "ffmpeg":
+        filters *= MOVIEPY_FILTER_COST
+    encode = output_seconds * _encode_cost_per_second(profile)
+    for variant in variants:
+        # Split off the composed stream: one extra scale plus one extra encode each.
+        filters += output_seconds * variant.width * variant.height * variant.fps * FILTER_CPU_PER_PIXEL
+        encode += output_seconds * _encode_cost_per_second(variant)
+    cpu_seconds = (
+        decode
+        + filters
+        + encode
+        + captions * CAPTION_CPU_SECONDS
+        + len(segments) * SEGMENT_OVERHEAD_CPU_SECONDS
+        + output_seconds * AUDIO_CPU_PER_SECOND * (1 + len(variants))
+    )
+
+    # Parallel segment encoders are capped to the worker budget (as the worker
+    # does), so peak memory only exceeds it when a single encoder cannot fit.
+    concurrent = 1
+    if parallel:
+        concurrent = min(segment_workers(source_width, source_height, profile, variants, engine, workers), len(segments))
+    peak_memory_mb = BASE_MEMORY_MB + concurrent * _encoder_memory_mb(
+        source_width, source_height, profile, variants, engine
+    )
+
+    return RenderEstimate(
+        cpu_seconds=round(cpu_seconds, 1),
+        peak_memory_mb=round(peak_memory_mb, 1),
+        output_seconds=round(output_seconds, 2),
+        segments=len(segments),
+    )
+
+
+def segment_workers(
+    source_width: int,
+    source_height: int,
+    profile: RenderProfile = FINAL_PROFILE,
+    variants: Sequence[RenderProfile] = (),
+    engine: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> int:
+    """Parallel segment encoders that fit in `render_worker_memory_mb`; at least one.
+
+    The render worker caps its process pool with this too, so a large render
+    runs with fewer encoders instead of being refused.
+    """
+    settings = get_settings()
+    workers = workers or settings.render_segment_workers or os.cpu_count() or 1
+    per_encoder = _encoder_memory_mb(source_width, source_height, profile, variants, engine or settings.render_engine)
+    fits = int((settings.render_worker_memory_mb - BASE_MEMORY_MB) // per_encoder)
+    return max(1, min(workers, fits))
+
+
+def admission_decision(
+    estimate: RenderEstimate,
+    outstanding_cpu_seconds: float,
+    priority: str,
+) -> AdmissionDecision:
+    """Admit, defer to the bulk queue, or reject a job given the work already outstanding.
+
+    Jobs that could never fit in a worker's memory even with a single segment
+    encoder, or that alone exceed the rejection limit, are rejected outright
+    (no `retry_after`). Above
+    `render_capacity_cpu_seconds` of outstanding work new jobs are deferred to the
+    bulk class; above `render_admission_reject_factor` times that they are rejected.
+    """
+    settings = get_settings()
+    if estimate.peak_memory_mb > settings.render_worker_memory_mb:
+        return AdmissionDecision(
+            REJECT,
+            f"Predicted peak memory {estimate.peak_memory_mb:.0f} MB exceeds the "
+            f"{settings.render_worker_memory_mb} MB worker limit",
+            outstanding_cpu_seconds,
+        )
+    capacity = settings.render_capacity_cpu_seconds
+    limit = capacity * settings.render_admission_reject_factor
+    if estimate.cpu_seconds > limit:
+        # Waiting for the queues to drain would never make room for it.
+        return AdmissionDecision(
+            REJECT,
+            f"Predicted {math.ceil(estimate.cpu_seconds)} CPU-seconds exceeds the {math.ceil(limit)} CPU-second limit for one job",
+            outstanding_cpu_seconds,
+        )
+    load = outstanding_cpu_seconds + estimate.cpu_seconds
+    if load > limit:
+        return AdmissionDecision(
+            REJECT,
+            f"Render queues are full ({math.ceil(outstanding_cpu_seconds)} CPU-seconds outstanding)",
+            outstanding_cpu_seconds,
+            retry_after=ADMISSION_RETRY_AFTER_SECONDS,
+        )
+    if load > capacity and priority != "bulk":
+        return AdmissionDecision(
+            DEFER,
+            f"Predicted load {math.ceil(load)} CPU-seconds exceeds capacity {math.ceil(capacity)}; deferred to bulk",
+            outstanding_cpu_seconds,
+        )
+    return AdmissionDecision(ADMIT, "Within capacity", outstanding_cpu_seconds)
+
+
+def _encoder_memory_mb(
+    source_width: int, source_height: int, profile: RenderProfile, variants: Sequence[RenderProfile], engine: str
+) -> float:
+    """Frames one segment encoder holds: decode buffers plus x264 lookahead per output."""
+    per_encoder = source_width * source_height * 1.5 * DECODE_BUFFER_FRAMES + sum(
+        item.width * item.height * 1.5 * ENCODE_LOOKAHEAD_FRAMES for item in (profile, *variants)
+    )
+    if engine != "ffmpeg":
+        per_encoder += profile.width * profile.height * 3 * MOVIEPY_FRAME_BUFFERS
+    return per_encoder / (1024 * 1024)
+
+
+def _encode_cost_per_second(profile: RenderProfile) -> float:
+    return profile.width * profile.height * profile.fps * ENCODE_CPU_PER_PIXEL * PRESET_COST.get(profile.preset, 1.0)
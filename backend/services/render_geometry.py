@@ -0,0 +1,61 @@
+"""
+Output geometry planning.
+
+Maps a source frame onto a profile's canvas with one crop in source
+coordinates followed by one scale. The old approach scaled the whole frame to
+cover the canvas and then cropped off the overflow. Per-segment zoom narrows
+the same window, so every frame is resampled exactly once and only pixels that
+end up in the output are scaled.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List
+
+from backend.services.render_profile import RenderProfile
+
+
+@dataclass(frozen=True)
+class CropWindow:
+    """Region of the source frame, in source pixels, that becomes the output canvas."""
+
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def ffmpeg_filters(self, profile: RenderProfile) -> List[str]:
+        # crop only moves plane pointers; the single scale is the one resample per frame.
+        filters = [f"crop={self.width}:{self.height}:{self.x}:{self.y}"]
+        if (self.width, self.height) != (profile.width, profile.height):
+            filters.append(f"scale={profile.width}:{profile.height}")
+        filters.append("setsar=1")
+        return filters
+
+
+def plan_crop(source_width: int, source_height: int, profile: RenderProfile, zoom: float = 1.0) -> CropWindow:
+    """Centered window with the profile's aspect ratio that covers the canvas, narrowed by `zoom`.
+
+    Equivalent to scaling the source up until it covers the canvas, zooming in by
+    `zoom` about the center and cropping to the canvas, but done in source space.
+    Sizes and offsets are even so 4:2:0 chroma stays aligned.
+    """
+    if source_width <= 0 or source_height <= 0:
+        raise ValueError(f"Invalid source size {source_width}x{source_height}")
+    aspect = profile.width / profile.height
+    if source_width / source_height > aspect:
+        width, height = source_height * aspect, float(source_height)
+    else:
+        width, height = float(source_width), source_width / aspect
+    zoom = max(zoom, 1.0)
+    width = min(_even(width / zoom), source_width - source_width % 2)
+    height = min(_even(height / zoom), source_height - source_height % 2)
+    x = _even((source_width - width) / 2, floor=True)
+    y = _even((source_height - height) / 2, floor=True)
+    return CropWindow(x, y, width, height)
+
+
+def _even(value: float, floor: bool = False) -> int:
+    halves = int(value // 2) if floor else round(value / 2)
+    return max(halves * 2, 0 if floor else 2)
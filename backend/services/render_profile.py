@@ -0,0 +1,101 @@
+"""
+Render encoder profiles.
+
+A profile pins every codec parameter that has to match across independently
+encoded pieces of one render (segments, variants) so they can be joined with
+stream copy.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """Output geometry and encoder settings for a render."""
+
+    name: str = "final"
+    width: int = 1080
+    height: int = 1920
+    fps: int = 30
+    codec: str = "libx264"
+    preset: str = "medium"
+    crf: int = 18
+    pix_fmt: str = "yuv420p"
+    audio_codec: str = "aac"
+    audio_bitrate: str = "192k"
+    audio_fps: int = 44100
+    audio_channels: int = 2
+    # How a composed frame of another shape is fitted: "crop" fills the canvas, "pad" letterboxes.
+    fit: str = "crop"
+    max_bitrate_kbps: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def digest(self) -> str:
+        """Short hash of the encode settings (name excluded); identical digests mean identical output."""
+        encoded = json.dumps(replace(self, name="").as_dict(), sort_keys=True).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()[:10]
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RenderProfile":
+        return cls(**data)
+
+    def encoder_params(self) -> List[str]:
+        """Video encoder args not covered by MoviePy's write_videofile keywords."""
+        params = ["-crf", str(self.crf), "-pix_fmt", self.pix_fmt]
+        if self.max_bitrate_kbps:
+            # Capped CRF: quality-targeted, but bounded for bandwidth-constrained targets.
+            params.extend(["-maxrate", f"{self.max_bitrate_kbps}k", "-bufsize", f"{self.max_bitrate_kbps * 2}k"])
+        return params
+
+    def ffmpeg_output_args(self) -> List[str]:
+        """Codec args for an ffmpeg command line producing this profile."""
+        return [
+            "-c:v",
+            self.codec,
+            "-preset",
+            self.preset,
+            *self.encoder_params(),
+            "-r",
+            str(self.fps),
+            "-c:a",
+            self.audio_codec,
+            "-b:a",
+            self.audio_bitrate,
+            "-ar",
+            str(self.audio_fps),
+            "-ac",
+            str(self.audio_channels),
+        ]
+
+    def write_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for MoviePy's write_videofile."""
+        return {
+            "codec": self.codec,
+            "audio_codec": self.audio_codec,
+            "audio_bitrate": self.audio_bitrate,
+            "audio_fps": self.audio_fps,
+            "fps": self.fps,
+            "preset": self.preset,
+        }
+
+
+FINAL_PROFILE = RenderProfile()
+# Quick look at a timeline: a third of the resolution, fastest x264 preset.
+PREVIEW_PROFILE = RenderProfile(name="preview", width=360, height=640, preset="ultrafast", crf=30, audio_bitrate="96k")
+
+# Publishing targets a render can emit alongside its main output. Targets whose
+# encode settings match the main profile reuse its file instead of re-encoding.
+OUTPUT_PROFILES: Dict[str, RenderProfile] = {
+    "tiktok": RenderProfile(name="tiktok"),
+    "youtube_shorts": RenderProfile(name="youtube_shorts"),
+    "instagram_reels": RenderProfile(name="instagram_reels"),
+    "youtube": RenderProfile(name="youtube", width=1920, height=1080, fit="pad"),
+    "mobile_720p": RenderProfile(name="mobile_720p", width=720, height=1280, crf=23, audio_bitrate="128k", max_bitrate_kbps=2500),
+}
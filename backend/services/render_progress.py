@@ -0,0 +1,160 @@
+"""
+Push-based render progress.
+
+Workers publish every progress/log update to a per-job Redis channel. The API
+process runs one pattern subscriber that keeps a bounded in-memory snapshot of
+each job (served by the polling endpoint without touching Redis or SQL) and
+fans events out to Server-Sent Events streams.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from redis import asyncio as aioredis
+
+LOGGER = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "render-progress:"
+TERMINAL_STATUSES = {"finished", "failed", "canceled"}
+
+
+def channel_for(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+
+def publish_progress(connection, job_id: str, event: Dict[str, Any]) -> None:
+    """Publish one update from a worker; failures never interrupt the render."""
+    payload = {"job_id": job_id, "ts": datetime.utcnow().isoformat(), **event}
+    try:
+        connection.publish(channel_for(job_id), json.dumps(payload))
+    except Exception as exc:  # pragma: no cover - pub/sub is best effort
+        LOGGER.debug("Progress publish failed for %s: %s", job_id, exc)
+
+
+class RenderProgressHub:
+    """In-memory job snapshots and SSE fan-out fed by a Redis pattern subscription."""
+
+    def __init__(self, max_jobs: int = 1000, max_logs: int = 200) -> None:
+        self.max_jobs = max_jobs
+        self.max_logs = max_logs
+        self._snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._listeners: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+
+    def start(self, redis_url: str) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen(redis_url), name="render-progress-hub")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job, or None when unknown or while the subscriber is disconnected."""
+        if not self.connected:
+            return None
+        snapshot = self._snapshots.get(job_id)
+        return dict(snapshot, logs=list(snapshot["logs"])) if snapshot else None
+
+    def seed(self, job_id: str, status: Dict[str, Any]) -> None:
+        """Store a snapshot built by the slow path so later polls stay in memory."""
+        if job_id in self._snapshots:
+            return
+        snapshot = {
+            "status": status.get("status", "unknown"),
+            "progress": float(status.get("progress") or 0.0),
+            "logs": list(status.get("logs") or [])[-self.max_logs :],
+            "result": status.get("result"),
+            "outputs": status.get("outputs") or {},
+            "priority": status.get("priority"),
+            "error": status.get("error"),
+        }
+        self._store(job_id, snapshot)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+        self._listeners.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        listeners = self._listeners.get(job_id)
+        if listeners is None:
+            return
+        listeners.discard(queue)
+        if not listeners:
+            self._listeners.pop(job_id, None)
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        job_id = event.get("job_id")
+        if not job_id:
+            return
+        snapshot = self._snapshots.get(job_id) or {
+            "status": "queued",
+            "progress": 0.0,
+            "logs": [],
+            "result": None,
+            "outputs": {},
+            "priority": None,
+            "error": None,
+        }
+        for key in ("status", "progress", "result", "outputs", "priority", "error"):
+            if event.get(key) is not None:
+                snapshot[key] = event[key]
+        if event.get("log"):
+            logs: List[str] = snapshot["logs"]
+            logs.append(event["log"])
+            del logs[: -self.max_logs]
+        self._store(job_id, snapshot)
+
+        for queue in list(self._listeners.get(job_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                LOGGER.debug("Dropping progress event for slow listener on %s", job_id)
+
+    def _store(self, job_id: str, snapshot: Dict[str, Any]) -> None:
+        self._snapshots[job_id] = snapshot
+        self._snapshots.move_to_end(job_id)
+        while len(self._snapshots) > self.max_jobs:
+            self._snapshots.popitem(last=False)
+
+    async def _listen(self, redis_url: str) -> None:
+        while True:
+            client = aioredis.from_url(redis_url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                self.connected = True
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    try:
+                        self.apply(json.loads(message["data"]))
+                    except (TypeError, ValueError) as exc:
+                        LOGGER.debug("Ignoring malformed progress event: %s", exc)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                LOGGER.warning("Render progress subscriber error, reconnecting: %s", exc)
+                await asyncio.sleep(2.0)
+            finally:
+                self.connected = False
+                # Events may have been missed while disconnected.
+                self._snapshots.clear()
+                await pubsub.close()
+                await client.close()
+
+
+render_progress_hub = RenderProgressHub()
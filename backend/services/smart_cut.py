@@ -0,0 +1,223 @@
+"""
+Keyframe-aware smart cut.
+
+A hard-cut edit of trimmed clips does not need a full re-encode. Between the
+first keyframe after a trim's start and the last keyframe before its end, the
+compressed packets can be copied as they are. Only the partial GOPs at the
+two edges have to be decoded and re-encoded. Each clip therefore becomes at
+most three pieces (re-encoded head, copied middle, re-encoded tail). The
+pieces are written as MPEG-TS, so every piece carries its own in-band
+SPS/PPS, and then joined with the concat demuxer in stream-copy mode.
+
+Re-encoded pieces are only spliceable when they match the copied stream. This
+path is limited to H.264 sources that agree on size, frame rate and audio
+codec, which is what auto-edit's clip normalization produces.
+"""
+
+from __future__ import annotations
+
+import logging
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from backend.services.ffmpeg_runner import run_ffmpeg
+from backend.services.probe_cache import ProbeError, get_probe_cache
+from backend.services.render_profile import RenderProfile
+
+LOGGER = logging.getLogger(__name__)
+
+KEYFRAME_EPSILON = 0.001
+# A copy span shorter than this saves nothing over re-encoding the whole trim.
+MIN_COPY_SECONDS = 0.5
+
+# (path, start, end) of one trimmed source; end None = to the end of the file.
+CutSource = Tuple[Path, float, Optional[float]]
+
+
+@dataclass(frozen=True)
+class CutPiece:
+    """One span of a source: stream-copied between keyframes, or re-encoded."""
+
+    start: float
+    end: float
+    copy: bool
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def plan_cut(start: float, end: float, keyframes: Sequence[float], duration: float) -> List[CutPiece]:
+    """Split `[start, end)` into re-encoded edges and one stream-copied middle.
+
+    The copy span starts on the first keyframe at or after `start`. It ends on
+    the last keyframe at or before `end`, or runs to `end` itself when the trim
+    reaches the end of the file.
+    """
+    end = min(end, duration) if duration > 0 else end
+    if end - start <= KEYFRAME_EPSILON:
+        return []
+    copy_start = next((time for time in keyframes if time >= start - KEYFRAME_EPSILON), None)
+    if end >= duration - KEYFRAME_EPSILON:
+        copy_end: Optional[float] = end
+    else:
+        copy_end = max((time for time in keyframes if time <= end + KEYFRAME_EPSILON), default=None)
+    if copy_start is None or copy_end is None or copy_end - copy_start < MIN_COPY_SECONDS:
+        return [CutPiece(start, end, copy=False)]
+
+    copy_start = max(copy_start, start)
+    copy_end = min(copy_end, end)
+    pieces = []
+    if copy_start - start > KEYFRAME_EPSILON:
+        pieces.append(CutPiece(start, copy_start, copy=False))
+    pieces.append(CutPiece(copy_start, copy_end, copy=True))
+    if end - copy_end > KEYFRAME_EPSILON:
+        pieces.append(CutPiece(copy_end, end, copy=False))
+    return pieces
+
+
+def smart_cut_compatible(paths: Sequence[Path], profile: RenderProfile) -> bool:
+    """Whether every source can be spliced by stream copy with edges re-encoded to `profile`.
+
+    Copied pieces keep the source's stream parameters, so they must already
+    match what the re-encoded edges get: size, rate, pixel format, sample rate
+    and channel count.
+    """
+    try:
+        probes = [get_probe_cache().probe(path) for path in paths]
+    except ProbeError:
+        return False
+    if not probes:
+        return False
+    audio_codecs = {probe.audio_codec for probe in probes}
+    return all(
+        probe.video_codec == "h264"
+        and probe.rotation == 0
+        and (probe.width, probe.height) == (profile.width, profile.height)
+        and abs(probe.fps - profile.fps) < 0.01
+        and _streams_match(probe.streams, profile)
+        for probe in probes
+    ) and (audio_codecs == {None} or audio_codecs == {"aac"})
+
+
+def _streams_match(streams: Sequence[dict], profile: RenderProfile) -> bool:
+    for stream in streams:
+        if stream.get("codec_type") == "video" and stream.get("pix_fmt") != profile.pix_fmt:
+            return False
+        if stream.get("codec_type") == "audio" and (
+            str(stream.get("sample_rate")) != str(profile.audio_fps) or stream.get("channels") != profile.audio_channels
+        ):
+            return False
+    return True
+
+
+def smart_cut(
+    sources: Sequence[CutSource],
+    output_path: Path,
+    profile: RenderProfile,
+    work_dir: Path,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> Path:
+    """Join trimmed sources with hard cuts, re-encoding only partial GOPs at trim edges."""
+    cache = get_probe_cache()
+    plans = []
+    for path, start, end in sources:
+        probe = cache.probe(path)
+        plans.append((path, plan_cut(max(start, 0.0), probe.duration if end is None else end, cache.keyframes(path), probe.duration)))
+    total = sum(piece.duration for _, pieces in plans for piece in pieces) or 1.0
+
+    with tempfile.TemporaryDirectory(dir=work_dir, prefix="smartcut_") as temp:
+        temp_dir = Path(temp)
+        piece_paths: List[Path] = []
+        copied = encoded = 0.0
+        for index, (path, pieces) in enumerate(plans):
+            for piece in pieces:
+                piece_path = temp_dir / f"{index:04d}_{len(piece_paths):04d}.ts"
+                cmd = _copy_command(path, piece, piece_path) if piece.copy else _encode_command(path, piece, piece_path, profile)
+                run_ffmpeg(cmd, "smart-cut copy" if piece.copy else "smart-cut encode")
+                piece_paths.append(piece_path)
+                if piece.copy:
+                    copied += piece.duration
+                else:
+                    encoded += piece.duration
+                if on_progress:
+                    on_progress(min((copied + encoded) / total, 0.99))
+
+        list_path = temp_dir / "pieces.txt"
+        list_path.write_text("".join(f"file '{piece}'\n" for piece in piece_paths), encoding="utf-8")
+        run_ffmpeg(_concat_command(list_path, output_path), "smart-cut concat")
+    LOGGER.info("Smart cut %s clips: %.1fs copied, %.1fs re-encoded", len(sources), copied, encoded)
+    return output_path
+
+
+def _copy_command(path: Path, piece: CutPiece, output_path: Path) -> List[str]:
+    # Input seeking with stream copy lands exactly on the keyframe at piece.start.
+    return [
+        "ffmpeg",
+        "-y",
+        "-ss",
+        f"{piece.start:.6f}",
+        "-i",
+        str(path),
+        "-t",
+        f"{piece.duration:.6f}",
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-c",
+        "copy",
+        "-bsf:v",
+        "h264_mp4toannexb",
+        "-f",
+        "mpegts",
+        str(output_path),
+    ]
+
+
+def _encode_command(path: Path, piece: CutPiece, output_path: Path, profile: RenderProfile) -> List[str]:
+    return [
+        "ffmpeg",
+        "-y",
+        "-ss",
+        f"{piece.start:.6f}",
+        "-i",
+        str(path),
+        "-t",
+        f"{piece.duration:.6f}",
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        *profile.ffmpeg_output_args(),
+        # SPS/PPS in front of every IDR, so the decoder picks up this piece's parameters at the splice.
+        "-x264-params",
+        "repeat-headers=1",
+        "-f",
+        "mpegts",
+        str(output_path),
+    ]
+
+
+def _concat_command(list_path: Path, output_path: Path) -> List[str]:
+    return [
+        "ffmpeg",
+        "-y",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(list_path),
+        "-map",
+        "0",
+        "-c",
+        "copy",
+        "-bsf:a",
+        "aac_adtstoasc",
+        "-movflags",
+        "+faststart",
+        str(output_path),
+    ]
@@ -0,0 +1,109 @@
+"""
+Streaming ffmpeg stage runner.
+
+Chains ffmpeg processes through OS pipes instead of writing a full MP4 per
+stage and reading it back. Between stages, frames travel as raw video plus
+PCM audio in a NUT container. That costs no encode or decode and carries
+timestamps. Only the last stage encodes, straight into the final output.
+
+A stage named in `checkpoints` also encodes to disk. The chain is cut there,
+and the next stage reads the checkpoint file once it is complete, which is
+useful when inspecting one step of a pipeline.
+
+Processes are started, limited and timed by `ffmpeg_runner.run_pipeline`; a
+failing stage raises `FFmpegError` naming it.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from backend.services.ffmpeg_runner import run_pipeline
+
+# Uncompressed hand-off between stages; NUT keeps per-frame timestamps.
+PIPE_OUTPUT_ARGS = ["-c:v", "rawvideo", "-pix_fmt", "yuv420p", "-c:a", "pcm_s16le", "-f", "nut"]
+PIPE_INPUT_ARGS = ["-f", "nut", "-i", "pipe:0"]
+
+
+@dataclass
+class PipelineStage:
+    """One ffmpeg step: its own inputs, filters and maps; codecs and the output are set by the runner."""
+
+    name: str
+    args: List[str] = field(default_factory=list)
+    # Whether input 0 is the previous stage's output. The first stage supplies all its inputs itself.
+    reads_previous: bool = True
+
+
+def stage_commands(
+    stages: Sequence[PipelineStage],
+    output_path: Path,
+    output_args: Sequence[str],
+    work_dir: Path,
+    source: Optional[Path] = None,
+    checkpoints: Sequence[str] = (),
+) -> List[List[Tuple[str, List[str]]]]:
+    """ffmpeg commands grouped into chains; the processes of one chain run concurrently, linked by pipes.
+
+    `source` is the first stage's input 0, when it reads one.
+    """
+    if not stages:
+        raise ValueError("No pipeline stages")
+    token = uuid4().hex[:8]
+    chains: List[List[Tuple[str, List[str]]]] = [[]]
+    previous: Optional[Path] = source
+    piped = False
+    for index, stage in enumerate(stages):
+        cmd = ["ffmpeg", "-y", "-v", "error"]
+        if stage.reads_previous:
+            if piped:
+                cmd.extend(PIPE_INPUT_ARGS)
+            elif previous is not None:
+                cmd.extend(["-i", str(previous)])
+            else:
+                raise ValueError(f"Stage '{stage.name}' has no input")
+        cmd.extend(stage.args)
+
+        if index == len(stages) - 1:
+            cmd.extend([*output_args, str(output_path)])
+            chains[-1].append((stage.name, cmd))
+        elif stage.name in checkpoints:
+            previous = work_dir / f"{stage.name}_{token}.mp4"
+            cmd.extend([*output_args, str(previous)])
+            chains[-1].append((stage.name, cmd))
+            chains.append([])
+            piped = False
+        else:
+            cmd.extend([*PIPE_OUTPUT_ARGS, "pipe:1"])
+            chains[-1].append((stage.name, cmd))
+            piped = True
+    return chains
+
+
+def run_stages(
+    stages: Sequence[PipelineStage],
+    output_path: Path,
+    output_args: Sequence[str],
+    work_dir: Path,
+    source: Optional[Path] = None,
+    checkpoints: Sequence[str] = (),
+    duration: float = 0.0,
+    on_progress: Optional[Callable[[float], None]] = None,
+) -> Dict[str, Path]:
+    """Run the stages into `output_path`; returns the checkpoint files that were written, by stage name.
+
+    With `duration` and `on_progress`, the final stage reports the fraction of
+    `duration` written so far.
+    """
+    chains = stage_commands(stages, output_path, output_args, work_dir, source, checkpoints)
+    written: Dict[str, Path] = {}
+    for index, chain in enumerate(chains):
+        last = index == len(chains) - 1
+        run_pipeline(chain, duration if last else 0.0, on_progress if last else None)
+        name, cmd = chain[-1]
+        if Path(cmd[-1]) != Path(output_path):
+            written[name] = Path(cmd[-1])
+    return written
@@ -0,0 +1,155 @@
+"""
+Asset thumbnails, scrub-strip sprite sheets and WebVTT thumbnail indexes.
+
+Ingest decodes the asset once: a `split` feeds both the poster frame and an
+`fps` + `tile` chain that packs evenly spaced frames into one JPEG sprite
+sheet. A WebVTT file maps each time range to its tile (`#xywh=`), which is
+the format timeline scrubbers and most web players read.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import ffmpeg
+
+from backend.config import get_settings
+from backend.services.ffmpeg_runner import run_ffmpeg
+
+LOGGER = logging.getLogger(__name__)
+
+POSTER_WIDTH = 480
+POSTER_TIME = 1.0
+
+
+@dataclass(frozen=True)
+class SpriteLayout:
+    """Where each scrub frame sits in the sprite sheet."""
+
+    interval: float
+    count: int
+    columns: int
+    rows: int
+    tile_width: int
+    tile_height: int
+
+    def tile(self, index: int) -> Tuple[int, int]:
+        return (index % self.columns) * self.tile_width, (index // self.columns) * self.tile_height
+
+
+@dataclass(frozen=True)
+class AssetThumbnails:
+    poster_path: Optional[Path]
+    sprite_path: Optional[Path]
+    vtt_path: Optional[Path]
+
+
+def sprite_paths(asset_path: Path, thumbnails_dir: Optional[Path] = None) -> Tuple[Path, Path]:
+    """Sprite sheet and WebVTT index locations for an asset; derived from its file name."""
+    thumbnails_dir = thumbnails_dir or get_settings().thumbnails_dir
+    stem = Path(asset_path).stem
+    return thumbnails_dir / f"{stem}_sprite.jpg", thumbnails_dir / f"{stem}_sprite.vtt"
+
+
+def sprite_urls(asset_path: Path) -> Tuple[Optional[str], Optional[str]]:
+    """Public URLs of an asset's sprite sheet and WebVTT index, when ingest produced them."""
+    sprite_path, vtt_path = sprite_paths(asset_path)
+    if not sprite_path.exists() or not vtt_path.exists():
+        return None, None
+    return f"/media/thumbnails/{sprite_path.name}", f"/media/thumbnails/{vtt_path.name}"
+
+
+def plan_sprite(duration: float, width: int, height: int) -> SpriteLayout:
+    """Tiles every `sprite_interval_seconds`, widened so long assets stay within `sprite_max_tiles`."""
+    settings = get_settings()
+    duration = max(duration, 0.1)
+    interval = max(settings.sprite_interval_seconds, duration / max(settings.sprite_max_tiles, 1))
+    count = max(1, math.ceil(duration / interval))
+    columns = min(settings.sprite_columns, count)
+    tile_width = settings.sprite_tile_width
+    aspect = (height / width) if width > 0 and height > 0 else 9 / 16
+    tile_height = max(2, int(round(tile_width * aspect / 2)) * 2)
+    return SpriteLayout(interval, count, columns, math.ceil(count / columns), tile_width, tile_height)
+
+
+def sprite_vtt(layout: SpriteLayout, duration: float, sprite_name: str) -> str:
+    lines = ["WEBVTT", ""]
+    for index in range(layout.count):
+        start = index * layout.interval
+        end = min((index + 1) * layout.interval, duration)
+        if end <= start:
+            break
+        x, y = layout.tile(index)
+        lines.extend(
+            [
+                f"{_vtt_time(start)} --> {_vtt_time(end)}",
+                f"{sprite_name}#xywh={x},{y},{layout.tile_width},{layout.tile_height}",
+                "",
+            ]
+        )
+    return "\n".join(lines)
+
+
+def generate_asset_thumbnails(video_path: Path, duration: float, width: int, height: int) -> AssetThumbnails:
+    """Poster frame, sprite sheet and WebVTT index from a single decode of `video_path`."""
+    thumbnails_dir = get_settings().thumbnails_dir
+    thumbnails_dir.mkdir(parents=True, exist_ok=True)
+    poster_path = thumbnails_dir / f"{video_path.stem}_poster.jpg"
+    sprite_path, vtt_path = sprite_paths(video_path, thumbnails_dir)
+    layout = plan_sprite(duration, width, height)
+
+    source = ffmpeg.input(str(video_path)).video.filter_multi_output("split")
+    poster = (
+        source[0]
+        .trim(start=min(POSTER_TIME, duration / 2))
+        .setpts("PTS-STARTPTS")
+        .filter("scale", POSTER_WIDTH, -2)
+    )
+    sheet = (
+        source[1]
+        .filter("fps", fps=f"1/{layout.interval:g}")
+        # Fixed tile box regardless of rotation metadata, so the VTT coordinates always hold.
+        .filter("scale", layout.tile_width, layout.tile_height, force_original_aspect_ratio="decrease")
+        .filter("pad", layout.tile_width, layout.tile_height, "(ow-iw)/2", "(oh-ih)/2")
+        .filter("tile", f"{layout.columns}x{layout.rows}")
+    )
+    try:
+        outputs = ffmpeg.merge_outputs(
+            poster.output(str(poster_path), vframes=1),
+            sheet.output(str(sprite_path), vframes=1, **{"q:v": 4}),
+        )
+        run_ffmpeg(outputs.overwrite_output().compile(), "thumbnails")
+    except Exception as exc:  # pragma: no cover - thumbnail failure tolerated
+        LOGGER.warning("Thumbnail generation failed for %s: %s", video_path, exc)
+        return AssetThumbnails(poster_path if poster_path.exists() else None, None, None)
+
+    vtt_path.write_text(sprite_vtt(layout, duration, sprite_path.name), encoding="utf-8")
+    return AssetThumbnails(poster_path if poster_path.exists() else None, sprite_path, vtt_path)
+
+
+def extract_frames(video_path: Path, times: Sequence[float], output_paths: Sequence[Path], width: int = POSTER_WIDTH) -> List[Path]:
+    """Grab frames at several timestamps with one ffmpeg process.
+
+    Each timestamp becomes its own input-seeked input, so sparse frames are read
+    from the nearest keyframe instead of decoding everything in between.
+    """
+    outputs = []
+    for time, output_path in zip(times, output_paths):
+        frame = ffmpeg.input(str(video_path), ss=max(float(time), 0.0)).video.filter("scale", width, -2)
+        outputs.append(frame.output(str(output_path), vframes=1))
+    if not outputs:
+        return []
+    run_ffmpeg(ffmpeg.merge_outputs(*outputs).overwrite_output().compile(), "extract frames")
+    return [path for path in output_paths if path.exists()]
+
+
+def _vtt_time(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
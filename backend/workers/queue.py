@@ -2,17 +2,57 @@ from __future__ import annotations
 
 import logging
 from threading import Event, Thread
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from redis import Redis
-from rq import Queue
-from rq.job import Job
+from rq import Queue, Retry, Worker
+from rq.job import Dependency, Job, JobStatus
+from rq.registry import StartedJobRegistry
 from rq.worker import SimpleWorker
 
 from backend.config import get_settings
+from backend.services.render_cancel import REASON_PREEMPTED, RenderPreempted, cancel_reason, request_cancel
+from backend.services.render_progress import publish_progress
 
 LOGGER = logging.getLogger(__name__)
 
+# Priority classes, highest first, with their RQ queue name and job timeout.
+# "normal" keeps the original `renders` queue name so existing workers still pick it up.
+PRIORITY_CLASSES: Dict[str, Tuple[str, int]] = {
+    "interactive": ("render-interactive", 60 * 10),
+    "normal": ("renders", 60 * 45),
+    "bulk": ("render-bulk", 60 * 90),
+}
+QUEUE_PRIORITY = {name: priority for priority, (name, _) in PRIORITY_CLASSES.items()}
+# Edit jobs of a batch read their prepared plans from the group job's result, possibly long after it finished.
+GROUP_RESULT_TTL = 60 * 60 * 24
+
+
+class PriorityWorker(Worker):
+    """Dequeues strictly by priority class, with aging so bulk work is never starved.
+
+    Every job taken from a higher class while a lower class has jobs waiting
+    counts as a skip for that class; once a class has been skipped
+    `render_priority_starvation_limit` times in a row it is polled first for
+    the next dequeue. Run with `rq worker -w backend.workers.queue.PriorityWorker
+    render-interactive renders render-bulk`.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.starvation_limit = max(1, get_settings().render_priority_starvation_limit)
+        self._skipped: Dict[str, int] = {queue.name: 0 for queue in self.queues}
+        self.push_exc_handler(requeue_preempted)
+
+    def reorder_queues(self, reference_queue: Queue) -> None:
+        position = self.queues.index(reference_queue) if reference_queue in self.queues else len(self.queues)
+        self._skipped[reference_queue.name] = 0
+        for queue in self.queues[position + 1 :]:
+            if queue.count:
+                self._skipped[queue.name] = self._skipped.get(queue.name, 0) + 1
+        starved = [queue for queue in self.queues if self._skipped.get(queue.name, 0) >= self.starvation_limit]
+        self._ordered_queues = starved + [queue for queue in self.queues if queue not in starved]
+
 
 class WorkerHandle:
     def __init__(self, worker: SimpleWorker, thread: Thread, stop_event: Event) -> None:
@@ -26,25 +66,174 @@ class WorkerHandle:
             self.thread.join(timeout=2)
 
 
+def requeue_preempted(job: Job, exc_type, exc_value, traceback) -> bool:
+    """RQ exception handler: a render that yielded to interactive work goes back to the front of its queue."""
+    if not isinstance(exc_value, RenderPreempted):
+        return True
+    if job.get_status(refresh=True) == JobStatus.FAILED:
+        job.requeue(at_front=True)
+        LOGGER.info("Requeued preempted render job %s on %s", job.id, job.origin)
+    elif job.retries_left is not None:
+        # The retry policy already re-enqueued it; yielding must not use up a retry.
+        job.retries_left += 1
+        job.save()
+    return False
+
+
 class QueueManager:
     def __init__(self) -> None:
         self.settings = get_settings()
         self.redis = Redis.from_url(self.settings.redis_url)
-        self.queue = Queue("renders", connection=self.redis, default_timeout=60 * 45)
+        self.queues: Dict[str, Queue] = {
+            priority: Queue(name, connection=self.redis, default_timeout=timeout)
+            for priority, (name, timeout) in PRIORITY_CLASSES.items()
+        }
+        self.queue = self.queues["normal"]
         self._worker_handle: Optional[WorkerHandle] = None
 
-    def enqueue_render(self, project_id: int, watermark: Optional[bool] = None) -> Job:
+    def enqueue_render(
+        self,
+        project_id: int,
+        watermark: Optional[bool] = None,
+        preview: bool = False,
+        variants: Optional[List[str]] = None,
+        priority: Optional[str] = None,
+        progressive: bool = False,
+        estimate: Optional[Dict[str, Any]] = None,
+    ) -> Job:
         from backend.workers.tasks_render import render_project  # Local import to avoid circular dependency
 
-        watermark_enabled = self.settings.watermark_enabled if watermark is None else bool(watermark)
-        job = self.queue.enqueue(
+        priority = priority or ("interactive" if preview else "normal")
+        if priority not in self.queues:
+            raise ValueError(f"Unknown render priority: {priority}")
+        watermark_enabled = False if preview else (self.settings.watermark_enabled if watermark is None else bool(watermark))
+        retries = self.settings.render_max_retries
+        job = self.queues[priority].enqueue(
             render_project,
             project_id,
-            meta={"status": "queued", "progress": 0.0, "logs": [], "watermark": watermark_enabled},
+            # Retried attempts keep the job id and resume from the render's stage checkpoints.
+            retry=Retry(max=retries) if retries > 0 else None,
+            meta={
+                "status": "queued",
+                "progress": 0.0,
+                "logs": [],
+                "watermark": watermark_enabled,
+                "preview": preview,
+                "variants": [] if preview else list(variants or []),
+                "priority": priority,
+                "progressive": progressive and not preview,
+                "estimate": estimate,
+            },
+        )
+        LOGGER.info(
+            "Queued %s for project %s as job %s (%s priority)", "preview" if preview else "render", project_id, job.id, priority
         )
-        LOGGER.info("Queued render for project %s as job %s", project_id, job.id)
+        if priority == "interactive" and self.settings.render_preempt_bulk:
+            self.preempt_bulk()
         return job
 
+    def enqueue_auto_edit(self, plan, priority: str = "normal") -> Job:
+        """Queue an AutoEditor plan on the render workers; progress lives in the job meta like a render's."""
+        from backend.workers.tasks_auto_edit import run_auto_edit  # Local import to avoid circular dependency
+
+        if priority not in self.queues:
+            raise ValueError(f"Unknown render priority: {priority}")
+        job = self.queues[priority].enqueue(
+            run_auto_edit,
+            plan,
+            meta={"status": "queued", "progress": 0.0, "logs": [], "priority": priority, "kind": "auto_edit"},
+        )
+        LOGGER.info("Queued auto-edit of %s clips as job %s (%s priority)", len(plan.clips), job.id, priority)
+        return job
+
+    def enqueue_auto_edit_batch(self, plans, priority: str = "normal") -> List[Tuple[Job, List[Tuple[int, Job]]]]:
+        """Queue many plans, preparing each group of plans over the same clips once.
+
+        Returns one `(group_job, [(plan_index, edit_job), ...])` per group. Edit
+        jobs depend on their group job and still run if it fails; they then
+        edit their own plan from scratch.
+        """
+        from backend.services.auto_editor import plan_group_key
+        from backend.workers.tasks_auto_edit import prepare_auto_edit_group, run_auto_edit
+
+        if priority not in self.queues:
+            raise ValueError(f"Unknown render priority: {priority}")
+        queue = self.queues[priority]
+        groups: Dict[Tuple, List[int]] = {}
+        for index, plan in enumerate(plans):
+            groups.setdefault(plan_group_key(plan), []).append(index)
+
+        queued: List[Tuple[Job, List[Tuple[int, Job]]]] = []
+        for indexes in groups.values():
+            group_job = queue.enqueue(
+                prepare_auto_edit_group,
+                [plans[index] for index in indexes],
+                result_ttl=GROUP_RESULT_TTL,
+                meta={"status": "queued", "progress": 0.0, "logs": [], "priority": priority, "kind": "auto_edit_group"},
+            )
+            edit_jobs = [
+                (
+                    index,
+                    queue.enqueue(
+                        run_auto_edit,
+                        plans[index],
+                        group_position,
+                        depends_on=Dependency(jobs=[group_job], allow_failure=True),
+                        meta={"status": "queued", "progress": 0.0, "logs": [], "priority": priority, "kind": "auto_edit"},
+                    ),
+                )
+                for group_position, index in enumerate(indexes)
+            ]
+            queued.append((group_job, edit_jobs))
+        LOGGER.info("Queued auto-edit batch of %s plans in %s groups (%s priority)", len(plans), len(groups), priority)
+        return queued
+
+    def outstanding_cpu_seconds(self) -> float:
+        """Predicted CPU-seconds of render work still queued or running, from each job's estimate."""
+        job_ids: List[str] = []
+        for queue in self.queues.values():
+            job_ids.extend(queue.get_job_ids())
+            job_ids.extend(StartedJobRegistry(queue=queue).get_job_ids())
+        total = 0.0
+        for job in Job.fetch_many(job_ids, connection=self.redis):
+            if job is None:
+                continue
+            meta = job.meta or {}
+            cpu_seconds = float((meta.get("estimate") or {}).get("cpu_seconds") or 0.0)
+            # Running jobs only have their unfinished share left.
+            done = min(float(meta.get("progress") or 0.0), 100.0) / 100.0
+            total += cpu_seconds * (1.0 - done)
+        return total
+
+    def cancel_render(self, job: Job) -> bool:
+        """Cancel a render job. Returns True if it had not started and is gone already.
+
+        Started jobs only get the cancel flag; the worker stops at its next checkpoint.
+        The flag is set first so a job dequeued during this call still sees it.
+        """
+        request_cancel(self.redis, job.id)
+        if job.get_status(refresh=True) not in (JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED):
+            return False
+        job.cancel()
+        job.meta["status"] = "canceled"
+        job.save_meta()
+        publish_progress(self.redis, job.id, {"status": "canceled", "log": "Render canceled before it started"})
+        return True
+
+    def preempt_bulk(self) -> Optional[str]:
+        """Ask the most recently started bulk render to yield when every interactive worker is busy."""
+        workers = Worker.all(connection=self.redis, queue=self.queues["interactive"])
+        if not workers or any(worker.get_state() != "busy" for worker in workers):
+            return None
+        # Newest first: it has the least work to redo after the requeue.
+        for job_id in reversed(StartedJobRegistry(queue=self.queues["bulk"]).get_job_ids()):
+            if cancel_reason(self.redis, job_id):
+                continue
+            request_cancel(self.redis, job_id, REASON_PREEMPTED)
+            LOGGER.info("Preempting bulk render %s for interactive work", job_id)
+            return job_id
+        return None
+
     def fetch_job(self, job_id: str) -> Optional[Job]:
         try:
             return Job.fetch(job_id, connection=self.redis)
@@ -57,10 +246,9 @@ class QueueManager:
 
         stop_event = Event()
         # Use Worker with a unique name to avoid conflicts
-        from rq import Worker
         import uuid
         worker_name = f"render-worker-{uuid.uuid4().hex[:8]}"
-        worker = Worker([self.queue], connection=self.redis, name=worker_name)
+        worker = PriorityWorker(list(self.queues.values()), connection=self.redis, name=worker_name)
 
         def _run_worker() -> None:
             LOGGER.info(f"Starting background RQ worker: {worker_name}")
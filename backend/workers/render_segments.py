@@ -0,0 +1,278 @@
+"""
+Per-segment composition for the render worker.
+
+`render_segment` is the process-pool entry point: it composes one timeline
+segment and encodes it with a fixed `RenderProfile` so that every segment of a
+render can be joined with the ffmpeg concat demuxer without re-encoding.
+Segments go through the compiled ffmpeg filtergraph when the engine is
+"ffmpeg" and through MoviePy otherwise. Publishing variants are split off the
+same segment graph; only MoviePy segments fit them from the encoded segment.
+"""
+
+from __future__ import annotations
+
+import logging
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from moviepy.audio.AudioClip import AudioArrayClip
+from moviepy.editor import AudioFileClip, CompositeAudioClip, CompositeVideoClip, TextClip, VideoFileClip, vfx
+from proglog import ProgressBarLogger
+
+from backend.services.ffmpeg_runner import run_ffmpeg
+from backend.services.filtergraph import (
+    SLOWMO_FACTOR,
+    ZOOM_FACTOR,
+    FilterGraph,
+    GraphOutput,
+    SourceInfo,
+    UnsupportedTimeline,
+    add_variant_outputs,
+    caption_layout,
+    compile_segment,
+    segment_bounds,
+)
+from backend.services.render_geometry import plan_crop
+from backend.services.render_profile import RenderProfile
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _SegmentProgressLogger(ProgressBarLogger):
+    """Reports the frame-writing fraction of one segment into a shared mapping."""
+
+    def __init__(self, progress_map, key: int) -> None:
+        super().__init__()
+        self.progress_map = progress_map
+        self.key = key
+
+    def bars_callback(self, bar, attr, value, old_value=None):  # noqa: D401 - proglog hook
+        if bar != "t" or attr != "index":
+            return
+        total = self.bars[bar].get("total") or 0
+        if total:
+            self.progress_map[self.key] = min(value / total, 0.99)
+
+
+def build_segment_clip(
+    asset_clip: VideoFileClip,
+    segment: Dict[str, Any],
+    overlay_resources: List[TextClip],
+    profile: Optional[RenderProfile] = None,
+):
+    """Apply a segment's trim, output geometry, effects and caption overlays to the source clip.
+
+    The clip comes back at the profile's canvas size, with any zoom folded into its crop.
+    """
+    start, end = segment_bounds(segment, asset_clip.duration)
+    segment_clip = asset_clip.subclip(start, end)
+
+    effects = [str(effect).lower() for effect in segment.get("effects", [])]
+    segment_clip = ensure_vertical(segment_clip, profile, zoom=ZOOM_FACTOR if "zoom" in effects else 1.0)
+    if "slowmo" in effects:
+        segment_clip = segment_clip.fx(vfx.speedx, SLOWMO_FACTOR)
+
+    layout = caption_layout(profile or RenderProfile())
+    overlays: List[TextClip] = []
+    for caption in segment.get("captions", []):
+        text = str(caption.get("text", "")).strip()
+        if not text:
+            continue
+        caption_start = max(0.0, float(caption.get("start", start)) - start)
+        caption_end = float(caption.get("end", end))
+        duration = max(0.1, caption_end - float(caption.get("start", start)))
+        try:
+            text_clip = TextClip(
+                text,
+                fontsize=layout.font_size,
+                color="white",
+                font="DejaVu-Sans",
+                method="caption",
+                size=(layout.box_width, None),
+            )
+            text_clip = (
+                text_clip.set_start(caption_start)
+                .set_duration(duration)
+                .set_position(("center", segment_clip.h - text_clip.h - layout.bottom_margin))
+            )
+            overlays.append(text_clip)
+            overlay_resources.append(text_clip)
+        except Exception as exc:  # pragma: no cover - font/imagemagick issues
+            LOGGER.warning("Caption rendering failed: %s", exc)
+
+    if overlays:
+        segment_clip = CompositeVideoClip([segment_clip, *overlays])
+    return segment_clip
+
+
+def load_segment_sfx(segment: Dict[str, Any]) -> Optional[AudioFileClip]:
+    sfx = segment.get("sfx") or {}
+    sfx_path = Path(str(sfx.get("path", ""))) if sfx else None
+    if not sfx_path or not sfx_path.exists():
+        return None
+    try:
+        return AudioFileClip(str(sfx_path)).volumex(1.35)
+    except Exception as exc:  # pragma: no cover - optional path
+        LOGGER.warning("Failed to load SFX %s: %s", sfx_path, exc)
+        return None
+
+
+def ensure_vertical(clip: VideoFileClip, profile: Optional[RenderProfile] = None, zoom: float = 1.0):
+    """Crop the planned source window, then resize it to the profile canvas in one step."""
+    profile = profile or RenderProfile()
+    window = plan_crop(clip.w, clip.h, profile, zoom)
+    if (window.x, window.y, window.width, window.height) != (0, 0, clip.w, clip.h):
+        clip = clip.crop(x1=window.x, y1=window.y, width=window.width, height=window.height)
+    if (window.width, window.height) != (profile.width, profile.height):
+        clip = clip.resize((profile.width, profile.height))
+    return clip
+
+
+def _match_channels(audio, channels: int):
+    """Force an audio clip to a fixed channel count so segment streams stay concat-compatible."""
+
+    def _convert(frame):
+        frame = np.asarray(frame)
+        single = frame.ndim == 1
+        if single:
+            frame = frame.reshape(1, -1)
+        if frame.shape[1] != channels:
+            source = frame if frame.shape[1] == 1 else frame.mean(axis=1, keepdims=True)
+            frame = np.repeat(source, channels, axis=1)
+        return frame[0] if single else frame
+
+    converted = audio.fl(lambda get_frame, t: _convert(get_frame(t)), keep_duration=True)
+    converted.nchannels = channels
+    return converted
+
+
+def render_segment(
+    asset_path: str,
+    segment: Dict[str, Any],
+    output_path: str,
+    profile_data: Dict[str, Any],
+    watermark_filter: Optional[str] = None,
+    threads: int = 1,
+    progress_map=None,
+    index: int = 0,
+    engine: str = "moviepy",
+    variants: Sequence[Tuple[Dict[str, Any], str]] = (),
+) -> str:
+    """Compose and encode one timeline segment to `output_path`.
+
+    Runs in a worker process, so every argument is a plain picklable value.
+    `variants` are (profile data, output path) pairs encoded from the same
+    composition. The ffmpeg engine falls back to MoviePy for segments it
+    cannot compile.
+    """
+    profile = RenderProfile.from_dict(profile_data)
+    targets = [(RenderProfile.from_dict(data), Path(path)) for data, path in variants]
+    if engine == "ffmpeg":
+        try:
+            _render_segment_ffmpeg(
+                Path(asset_path), segment, Path(output_path), profile, watermark_filter, progress_map, index, targets
+            )
+            return output_path
+        except (UnsupportedTimeline, subprocess.CalledProcessError) as exc:
+            LOGGER.warning("Filtergraph segment render failed, using MoviePy: %s", exc)
+            Path(output_path).unlink(missing_ok=True)
+            for _, path in targets:
+                path.unlink(missing_ok=True)
+    _render_segment_moviepy(asset_path, segment, Path(output_path), profile, watermark_filter, threads, progress_map, index)
+    if targets:
+        _fit_variants(Path(output_path), profile, targets, index)
+    return output_path
+
+
+def _render_segment_ffmpeg(
+    asset_path: Path,
+    segment: Dict[str, Any],
+    output: Path,
+    profile: RenderProfile,
+    watermark_filter: Optional[str],
+    progress_map,
+    index: int,
+    variants: Sequence[Tuple[RenderProfile, Path]] = (),
+) -> None:
+    work_dir = output.parent / f"{output.stem}_graph"
+    try:
+        graph = compile_segment(asset_path, segment, SourceInfo.probe(asset_path), profile, work_dir, watermark_filter)
+
+        def _on_progress(fraction: float) -> None:
+            if progress_map is not None:
+                progress_map[index] = fraction
+
+        if variants:
+            targets = [(profile, output, profile.ffmpeg_output_args())]
+            targets.extend((variant, path, variant.ffmpeg_output_args()) for variant, path in variants)
+            outputs = add_variant_outputs(graph, profile, targets)
+        else:
+            outputs = [GraphOutput(output, profile.ffmpeg_output_args(), graph.video_label, graph.audio_label)]
+        run_ffmpeg(graph.multi_output_command(outputs), f"segment {index}", graph.duration, _on_progress)
+        if progress_map is not None:
+            progress_map[index] = 1.0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _fit_variants(segment_path: Path, profile: RenderProfile, variants: Sequence[Tuple[RenderProfile, Path]], index: int) -> None:
+    """Fit an encoded MoviePy segment onto each variant canvas in one decode of that segment."""
+    graph = FilterGraph(video_label="0:v", audio_label="0:a")
+    graph.add_input(segment_path)
+    outputs = add_variant_outputs(
+        graph, profile, [(variant, path, variant.ffmpeg_output_args()) for variant, path in variants]
+    )
+    run_ffmpeg(graph.multi_output_command(outputs), f"segment {index} variants")
+
+
+def _render_segment_moviepy(
+    asset_path: str,
+    segment: Dict[str, Any],
+    output: Path,
+    profile: RenderProfile,
+    watermark_filter: Optional[str],
+    threads: int,
+    progress_map,
+    index: int,
+) -> None:
+    asset_clip = VideoFileClip(asset_path, audio_fps=profile.audio_fps)
+    overlay_resources: List[TextClip] = []
+    sfx_clip = None
+    segment_clip = None
+    try:
+        segment_clip = build_segment_clip(asset_clip, segment, overlay_resources, profile)
+
+        tracks = [segment_clip.audio] if segment_clip.audio else []
+        sfx_clip = load_segment_sfx(segment)
+        if sfx_clip is not None:
+            tracks.append(sfx_clip.set_start(0).set_duration(min(sfx_clip.duration, segment_clip.duration)))
+        if not tracks:
+            silence = np.zeros((max(int(segment_clip.duration * profile.audio_fps), 1), profile.audio_channels))
+            tracks.append(AudioArrayClip(silence, fps=profile.audio_fps))
+        audio = CompositeAudioClip(tracks).set_duration(segment_clip.duration) if len(tracks) > 1 else tracks[0]
+        segment_clip = segment_clip.set_audio(_match_channels(audio, profile.audio_channels))
+
+        logger = _SegmentProgressLogger(progress_map, index) if progress_map is not None else None
+        extra_params = ["-vf", watermark_filter] if watermark_filter else []
+        segment_clip.write_videofile(
+            str(output),
+            **profile.write_kwargs(),
+            threads=threads,
+            ffmpeg_params=[*profile.encoder_params(), *extra_params],
+            temp_audiofile=str(output.with_suffix(".m4a")),
+            verbose=False,
+            logger=logger,
+        )
+        if progress_map is not None:
+            progress_map[index] = 1.0
+    finally:
+        if segment_clip is not None:
+            segment_clip.close()
+        if sfx_clip is not None:
+            sfx_clip.close()
+        for overlay in overlay_resources:
+            overlay.close()
+        asset_clip.close()
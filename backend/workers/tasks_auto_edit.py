@@ -0,0 +1,121 @@
+"""
+Auto-edit worker task.
+
+Runs an `EditingPlan` on the render workers so the API never blocks on
+ffmpeg. Progress parsed from ffmpeg's `-progress` output is stored in the
+job meta and published on the same per-job channel as renders, so
+`/api/auto-edit/status/{job_id}` and the render SSE stream both follow it.
+
+A batch enqueues one `prepare_auto_edit_group` job per group of plans over the
+same clips and makes every plan's `run_auto_edit` job depend on it. The edit
+jobs pick their prepared plan up from the group job's result and then run in
+parallel on whichever workers are free.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from rq import get_current_job
+
+from backend.config import get_settings
+from backend.services.auto_editor import EditingPlan, get_auto_editor
+from backend.services.render_progress import publish_progress
+
+LOGGER = logging.getLogger(__name__)
+SETTINGS = get_settings()
+
+# Progress below this step is not worth a Redis write.
+PROGRESS_STEP = 1.0
+
+
+def prepare_auto_edit_group(plans: List[EditingPlan]) -> List[EditingPlan]:
+    job = get_current_job()
+    _update_job(job, status="started", progress=1.0, log=f"Preparing {len(plans)} plans over shared clips")
+    try:
+        prepared = get_auto_editor().prepare_group(
+            plans, on_progress=lambda fraction: _update_job(job, status="preparing", progress=1.0 + fraction * 98.0)
+        )
+    except Exception as exc:
+        message = f"Auto-edit group preparation failed: {exc}"
+        LOGGER.exception(message)
+        _update_job(job, status="failed", progress=100.0, log=message, error=message)
+        raise
+    _update_job(job, status="finished", progress=100.0, log="Group prepared")
+    return prepared
+
+
+def run_auto_edit(plan: EditingPlan, group_index: Optional[int] = None) -> Dict[str, Any]:
+    job = get_current_job()
+    editor = get_auto_editor()
+    if group_index is not None:
+        plan = _prepared_plan(job, group_index) or plan
+    _update_job(job, status="started", progress=1.0, log=f"Starting auto-edit of {len(plan.clips)} clips")
+
+    last = {"progress": 1.0}
+
+    def _on_progress(fraction: float) -> None:
+        progress = round(1.0 + fraction * 98.0, 1)
+        if progress - last["progress"] >= PROGRESS_STEP:
+            last["progress"] = progress
+            _update_job(job, status="rendering", progress=progress)
+
+    try:
+        output_path = editor.edit_video(plan, on_progress=_on_progress)
+    except Exception as exc:
+        message = f"Auto-edit failed: {exc}"
+        LOGGER.exception(message)
+        _update_job(job, status="failed", progress=100.0, log=message, error=message)
+        raise
+
+    result = {
+        "output_path": str(output_path),
+        "output_url": f"/media/final/{output_path.name}",
+        "duration": editor.get_video_duration(output_path),
+    }
+    _update_job(job, status="finished", progress=100.0, log="Auto-edit complete", result=result["output_url"], edit=result)
+    return result
+
+
+def _prepared_plan(job, group_index: int) -> Optional[EditingPlan]:
+    """This plan as prepared by the group job this job depends on; None if that job failed or expired."""
+    group_job = job.dependency if job is not None else None
+    prepared = group_job.result if group_job is not None else None
+    if not prepared or group_index >= len(prepared):
+        LOGGER.warning("No prepared plan for auto-edit job %s; editing it on its own", job.id if job else None)
+        return None
+    return prepared[group_index]
+
+
+def _update_job(
+    job,
+    *,
+    status: Optional[str] = None,
+    progress: Optional[float] = None,
+    log: Optional[str] = None,
+    result: Optional[str] = None,
+    error: Optional[str] = None,
+    edit: Optional[Dict[str, Any]] = None,
+) -> None:
+    if job is None:
+        return
+    meta = job.meta or {}
+    if status:
+        meta["status"] = status
+    if progress is not None:
+        meta["progress"] = round(progress, 2)
+    logs = meta.setdefault("logs", [])
+    if log:
+        logs.append(log)
+        del logs[: -SETTINGS.render_job_log_limit]
+    if result is not None:
+        meta["result"] = result
+    if error is not None:
+        meta["error"] = error
+    if edit is not None:
+        meta["edit"] = edit
+    job.meta = meta
+    job.save_meta()
+    event = {"status": status, "progress": meta.get("progress") if progress is not None else None, "log": log, "result": result, "error": error}
+    publish_progress(job.connection, job.id, {key: value for key, value in event.items() if value is not None})
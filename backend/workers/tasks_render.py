@@ -2,35 +2,65 @@ from __future__ import annotations
 
 import json
 import logging
+import multiprocessing
+import os
+import shutil
 import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from uuid import uuid4
 
-from moviepy.editor import (
-    AudioFileClip,
-    CompositeAudioClip,
-    CompositeVideoClip,
-    TextClip,
-    VideoFileClip,
-    concatenate_videoclips,
-    vfx,
-)
+from moviepy.editor import AudioFileClip, CompositeAudioClip, TextClip, VideoFileClip, concatenate_videoclips
+from proglog import ProgressBarLogger
 from rq import get_current_job
+from sqlalchemy.orm import object_session
 
 from backend.config import get_settings
 from backend.database import session_scope
-from backend.models import Consent, Project, Render
+from backend.models import Consent, Project, Render, RenderCheckpoint, RenderEvent, RenderOutput
 from backend.services.beat_detection import BeatDetectionService
 from backend.services.captions import CaptionService
+from backend.services.ffmpeg_runner import run_ffmpeg
+from backend.services.filtergraph import (
+    FilterGraph,
+    GraphOutput,
+    SourceInfo,
+    UnsupportedTimeline,
+    add_variant_outputs,
+    compile_timeline,
+    tee_target,
+)
+from backend.services.render_cache import (
+    asset_content_hash,
+    evict_expired_files,
+    evict_lru_files,
+    render_cache,
+    render_fingerprint,
+    segment_fingerprint,
+    timeline_is_empty,
+)
+from backend.services.render_cancel import RenderCanceled, RenderPreempted, clear_cancel, raise_if_canceled
+from backend.services.render_estimator import segment_workers
+from backend.services.render_profile import FINAL_PROFILE, OUTPUT_PROFILES, PREVIEW_PROFILE, RenderProfile
+from backend.services.render_progress import publish_progress
 from backend.services.timeline_engine import TimelineEngine
+from backend.workers.render_segments import (
+    build_segment_clip,
+    ensure_vertical,
+    load_segment_sfx,
+    render_segment,
+)
 
 LOGGER = logging.getLogger(__name__)
+
+STREAM_PLAYLIST = "index.m3u8"
 SETTINGS = get_settings()
 
 
-def render_project(project_id: int) -> str:
+def render_project(project_id: int) -> Optional[str]:
     job = get_current_job()
     job_id = job.id if job else f"manual-{uuid4().hex}"
 
@@ -38,6 +68,14 @@ def render_project(project_id: int) -> str:
     watermark_override = None
     if job and "watermark" in (job.meta or {}):
         watermark_override = bool(job.meta["watermark"])
+    preview = bool(job and (job.meta or {}).get("preview"))
+    if preview:
+        watermark_override = False
+    profile = PREVIEW_PROFILE if preview else FINAL_PROFILE
+    variant_names = (job.meta or {}).get("variants", []) if job else []
+    variants = [OUTPUT_PROFILES[name] for name in variant_names if name in OUTPUT_PROFILES]
+    progressive = bool(job and (job.meta or {}).get("progressive")) and not preview
+    stream_dir = SETTINGS.final_dir / job_id if progressive else None
 
     caption_service = CaptionService()
     beat_service = BeatDetectionService()
@@ -47,17 +85,20 @@ def render_project(project_id: int) -> str:
         project: Optional[Project] = session.get(Project, project_id)
         if not project:
             message = f"Project {project_id} not found"
+            _disable_retry(job)
             _update_job(job, status="failed", progress=100.0, log=message, error=message)
             raise ValueError(message)
 
         if not project.asset:
             message = f"Project {project_id} has no associated asset"
+            _disable_retry(job)
             _update_job(job, status="failed", progress=100.0, log=message, error=message)
             raise ValueError(message)
 
         consent: Optional[Consent] = project.asset.consent
         if not consent or not consent.has_checkbox or not consent.document_path:
             message = "Consent must be completed before rendering"
+            _disable_retry(job)
             _update_job(job, status="failed", progress=100.0, log=message, error=message)
             raise PermissionError(message)
 
@@ -66,65 +107,682 @@ def render_project(project_id: int) -> str:
             render_record = Render(project=project, job_id=job_id)
         render_record.status = "started"
         render_record.progress = 5.0
-        render_record.logs = _append_log(render_record.logs, "Render job started")
         session.add(render_record)
         session.flush()
+        _record_event(render_record, "Render job started")
 
         asset_path = Path(project.asset.path)
         if not asset_path.exists():
             message = f"Asset path not found: {asset_path}"
             render_record.status = "failed"
             render_record.progress = 100.0
-            render_record.logs = _append_log(render_record.logs, message)
+            _record_event(render_record, message, level="error")
             session.flush()
+            _disable_retry(job)
             _update_job(job, status="failed", progress=100.0, log=message, error=message)
             raise FileNotFoundError(message)
 
-        _update_job(job, status="analyzing", progress=15.0, log="Preparing timeline")
+        try:
+            _update_job(job, status="analyzing", progress=15.0, log="Preparing timeline")
+            _checkpoint(job)
+
+            timeline_data: Dict[str, Any]
+            if timeline_is_empty(project.timeline_json):
+                LOGGER.info("Generating timeline on the fly for project %s", project.id)
+                transcription = caption_service.transcribe(asset_path)
+                beat_analysis = beat_service.detect_beats(asset_path)
+                timeline_data = timeline_engine.build_timeline(project.asset, beat_analysis, transcription)
+                project.timeline_json = timeline_engine.to_json(timeline_data)
+                project.status = "analyzed"
+            else:
+                timeline_data = json.loads(project.timeline_json)
+
+            watermark_state = SETTINGS.watermark_enabled if watermark_override is None else watermark_override
+            # A live playlist needs the single filtergraph encode, whatever the configured engine.
+            engine = "ffmpeg" if stream_dir is not None else SETTINGS.render_engine
+            fingerprint = render_fingerprint(asset_path, timeline_data, bool(watermark_state), profile, engine)
+
+            render_record.status = "rendering"
+            render_record.progress = 25.0
+            _record_event(render_record, "Timeline ready; beginning composition")
+            # Commit the generated timeline now, so a retry never re-runs transcription/beat analysis.
+            session.commit()
+            _checkpoint(job)
+
+            _update_job(
+                job,
+                status="rendering",
+                progress=25.0,
+                log=f"Composing video segments (watermark={'on' if watermark_state else 'off'})",
+            )
+
+            cached = render_cache.lookup(session, fingerprint)
+            resumed = None if cached else _stage_path(render_record, "final", fingerprint)
+            if cached:
+                output_path = Path(cached.output_path)
+                _record_event(render_record, f"Render cache hit ({fingerprint[:12]})")
+                _update_job(job, status="rendering", progress=90.0 if variants else 95.0, log="Identical render found in cache")
+            elif resumed:
+                output_path = resumed
+                _record_event(render_record, "Resuming after final checkpoint; skipping composition")
+                _update_job(job, status="rendering", progress=90.0, log="Resuming from final checkpoint")
+            else:
+                output_path = _compose_video(
+                    asset_path,
+                    timeline_data,
+                    job,
+                    render_record,
+                    watermark_override,
+                    single_pass=True if preview else None,
+                    engine=engine,
+                    profile=profile,
+                    output_dir=SETTINGS.preview_dir if preview else None,
+                    variants=variants,
+                    resume_key=fingerprint,
+                    stream_dir=stream_dir,
+                )
+                _mark_stage(render_record, "final", fingerprint, output_path)
+
+            public_url = f"/media/{'previews' if preview else 'final'}/{output_path.name}"
+            if not cached:
+                render_cache.store(session, fingerprint, output_path, public_url, project_id=project.id)
+            render_record.output_path = str(output_path)
+            render_record.output_url = public_url
+
+            variant_paths = _variant_outputs(output_path, timeline_data, profile, variants, job, render_record) if variants else {}
+            render_record.outputs = [
+                RenderOutput(
+                    variant=name,
+                    width=variant_profile.width,
+                    height=variant_profile.height,
+                    output_path=str(path),
+                    output_url=f"/media/final/{path.name}",
+                    size_bytes=path.stat().st_size,
+                )
+                for name, (variant_profile, path) in variant_paths.items()
+            ]
+            if stream_dir is not None and _stream_complete(stream_dir):
+                render_record.outputs.append(
+                    RenderOutput(
+                        variant="stream",
+                        width=profile.width,
+                        height=profile.height,
+                        output_path=str(stream_dir / STREAM_PLAYLIST),
+                        output_url=_stream_url(stream_dir),
+                        size_bytes=sum(path.stat().st_size for path in stream_dir.iterdir() if path.is_file()),
+                    )
+                )
+            output_urls = {output.variant: output.output_url for output in render_record.outputs}
+            render_record.status = "finished"
+            render_record.progress = 100.0
+            _record_event(render_record, f"Render complete -> {public_url}")
+            render_record.updated_at = datetime.utcnow()
+            if not preview:
+                project.status = "rendered"
+            session.flush()
+
+            _update_job(job, status="finished", progress=100.0, log="Render completed", result=public_url, outputs=output_urls or None)
+            LOGGER.info("Render finished for project %s with job %s", project_id, job_id)
+            if preview:
+                _prune_previews(keep=output_path)
+            if progressive:
+                _prune_streams(keep=stream_dir)
+            return public_url
+        except RenderCanceled as exc:
+            _finish_canceled(job, render_record, exc)
+            if isinstance(exc, RenderPreempted):
+                # Keep the record/event updates; the worker's exception handler requeues the job.
+                session.commit()
+                raise
+            if not preview:
+                project.status = "canceled"
+            return None
+
+
+def _checkpoint(job) -> None:
+    """Cancellation point: raises RenderCanceled/RenderPreempted once the API has flagged this job."""
+    if job is not None:
+        raise_if_canceled(job.connection, job.id)
+
+
+def _disable_retry(job) -> None:
+    """Input errors fail the same way on every attempt; stop RQ from retrying them."""
+    if job is not None:
+        job.retries_left = 0
+
+
+def _mark_stage(render_record: Render, stage: str, fingerprint: Optional[str], path: Optional[Path] = None) -> None:
+    """Persist a completed stage and commit immediately so it survives a worker crash."""
+    session = object_session(render_record)
+    if session is None or render_record.id is None or not fingerprint:
+        return
+    checkpoint = session.query(RenderCheckpoint).filter_by(render_id=render_record.id, stage=stage).one_or_none()
+    if checkpoint is None:
+        checkpoint = RenderCheckpoint(render_id=render_record.id, stage=stage)
+        session.add(checkpoint)
+    checkpoint.fingerprint = fingerprint
+    checkpoint.path = str(path) if path else None
+    checkpoint.created_at = datetime.utcnow()
+    session.commit()
+
+
+def _stage_path(render_record: Render, stage: str, fingerprint: Optional[str]) -> Optional[Path]:
+    """Output of a stage an earlier attempt completed from the same inputs, if it is still on disk."""
+    session = object_session(render_record)
+    if session is None or render_record.id is None or not fingerprint:
+        return None
+    checkpoint = (
+        session.query(RenderCheckpoint).filter_by(render_id=render_record.id, stage=stage, fingerprint=fingerprint).one_or_none()
+    )
+    if checkpoint is None or not checkpoint.path:
+        return None
+    path = Path(checkpoint.path)
+    return path if path.exists() else None
+
+
+def _finish_canceled(job, render_record: Render, exc: RenderCanceled) -> None:
+    preempted = isinstance(exc, RenderPreempted)
+    message = "Preempted by interactive work; requeued" if preempted else "Render canceled"
+    LOGGER.info("%s (job %s)", message, exc.job_id)
+    render_record.status = "queued" if preempted else "canceled"
+    if preempted:
+        render_record.progress = 0.0
+    _record_event(render_record, message, level="warning")
+    if job is not None:
+        clear_cancel(job.connection, job.id)
+    _update_job(job, status=render_record.status, progress=render_record.progress, log=message)
+
+
+class _ExportCheckpointLogger(ProgressBarLogger):
+    """Polls for cancellation while MoviePy writes audio chunks and frames; raising aborts the export."""
+
+    def __init__(self, job, interval: float = 0.5) -> None:
+        super().__init__()
+        self.job = job
+        self.interval = interval
+        self._last_check = 0.0
+
+    def bars_callback(self, bar, attr, value, old_value=None):  # noqa: D401 - proglog hook
+        now = time.monotonic()
+        if now - self._last_check >= self.interval:
+            self._last_check = now
+            _checkpoint(self.job)
+
+
+def _prune_previews(keep: Optional[Path] = None) -> None:
+    """Previews are disposable: drop old ones, then hold the directory to its size budget."""
+    preview_dir = SETTINGS.preview_dir
+    if keep is not None and keep.exists():
+        os.utime(keep)
+    evict_expired_files(preview_dir, SETTINGS.preview_max_age_seconds)
+    evict_lru_files(preview_dir, SETTINGS.preview_max_bytes)
+
+
+def _prune_streams(keep: Optional[Path] = None) -> None:
+    """Progressive playlists only matter while a render runs; the faststart MP4 is the durable output."""
+    cutoff = time.time() - SETTINGS.render_progressive_max_age_seconds
+    for playlist in SETTINGS.final_dir.glob(f"*/{STREAM_PLAYLIST}"):
+        stream_dir = playlist.parent
+        if stream_dir != keep and playlist.stat().st_mtime < cutoff:
+            shutil.rmtree(stream_dir, ignore_errors=True)
+
+
+def _stream_url(stream_dir: Path) -> str:
+    return f"/media/final/{stream_dir.name}/{STREAM_PLAYLIST}"
+
+
+def _stream_complete(stream_dir: Path) -> bool:
+    playlist = stream_dir / STREAM_PLAYLIST
+    return playlist.exists() and "#EXT-X-ENDLIST" in playlist.read_text(encoding="utf-8")
+
+
+def _stream_output(output: GraphOutput, stream_dir: Path, profile: RenderProfile, timeline: Dict[str, Any]) -> GraphOutput:
+    """Mux the primary encode into the faststart MP4 and a growing fMP4 HLS playlist at once.
+
+    Forced keyframes give the playlist segments of `render_progressive_segment_seconds`,
+    so a player can start on the first segment while the rest of the timeline encodes.
+    """
+    shutil.rmtree(stream_dir, ignore_errors=True)
+    stream_dir.mkdir(parents=True, exist_ok=True)
+    seconds = SETTINGS.render_progressive_segment_seconds
+    hls = {
+        "f": "hls",
+        "hls_time": f"{seconds:g}",
+        "hls_playlist_type": "event",
+        "hls_segment_type": "fmp4",
+        "hls_flags": "independent_segments",
+    }
+    target = tee_target([({"f": "mp4", "movflags": "+faststart"}, output.path), (hls, stream_dir / STREAM_PLAYLIST)])
+    args = [
+        *profile.ffmpeg_output_args(),
+        *_metadata_args(timeline),
+        "-force_key_frames",
+        f"expr:gte(t,n_forced*{seconds:g})",
+        # The MP4 and fMP4 init segments both need SPS/PPS out of band.
+        "-flags",
+        "+global_header",
+        "-f",
+        "tee",
+    ]
+    return GraphOutput(output.path, args, output.video_label, output.audio_label, target=target)
+
+
+def _compose_video(
+    asset_path: Path,
+    timeline: Dict[str, Any],
+    job,
+    render_record: Render,
+    watermark_override: Optional[bool],
+    single_pass: Optional[bool] = None,
+    parallel: Optional[bool] = None,
+    engine: Optional[str] = None,
+    profile: RenderProfile = FINAL_PROFILE,
+    output_dir: Optional[Path] = None,
+    variants: Sequence[RenderProfile] = (),
+    resume_key: Optional[str] = None,
+    stream_dir: Optional[Path] = None,
+) -> Path:
+    """Compose the main output; the filtergraph engine also emits `variants` from the same decode.
+
+    `resume_key` (the render fingerprint) scopes stage checkpoints, letting a retried
+    job skip straight to post-processing when an earlier attempt left a composed file.
+    `stream_dir` asks for a progressive HLS playlist there as well, which only the
+    single filtergraph invocation can write while it encodes.
+    """
+    segments = sorted(timeline.get("segments", []), key=lambda item: item.get("start", 0.0))
+
+    composed = _stage_path(render_record, "composed", resume_key)
+    if composed is not None:
+        final_path = composed.with_name(composed.name.replace("_temp.mp4", ".mp4"))
+        _record_event(render_record, "Resuming after composed checkpoint; post-processing only")
+        _update_job(job, status="post-processing", progress=85.0, log="Resuming from composed checkpoint")
+        _apply_watermark_and_metadata(composed, final_path, timeline, watermark_override, profile)
+        return final_path
+
+    output_dir = output_dir or SETTINGS.final_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_name = f"project_{asset_path.stem}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    final_path = output_dir / f"{output_name}.mp4"
+
+    engine = engine or SETTINGS.render_engine
+    use_parallel = SETTINGS.render_parallel_segments if parallel is None else parallel
+    if stream_dir is not None:
+        # Parallel segments finish out of order; only one sequential encode can feed a live playlist.
+        use_parallel, engine = False, "ffmpeg"
+    if use_parallel and segments:
+        try:
+            pending = _pending_variants(final_path, profile, variants)
+            return _compose_segments_parallel(
+                asset_path, segments, timeline, job, render_record, watermark_override, final_path, engine, profile, pending
+            )
+        except RenderCanceled:
+            raise
+        except Exception as exc:
+            LOGGER.warning("Segment-parallel render failed, composing in one pass: %s", exc)
+            final_path.unlink(missing_ok=True)
+            for variant in pending:
+                _variant_path(final_path, variant).unlink(missing_ok=True)
+            _record_event(render_record, "Segment-parallel render failed; composing in one pass", level="warning")
+
+    _checkpoint(job)
+    if engine == "ffmpeg":
+        try:
+            pending = _pending_variants(final_path, profile, variants)
+            return _compose_filtergraph(
+                asset_path, timeline, job, render_record, watermark_override, final_path, profile, pending, stream_dir
+            )
+        except (UnsupportedTimeline, subprocess.CalledProcessError) as exc:
+            LOGGER.warning("Filtergraph render unavailable, composing with MoviePy: %s", exc)
+            final_path.unlink(missing_ok=True)
+            if stream_dir is not None:
+                shutil.rmtree(stream_dir, ignore_errors=True)
+                _update_job(job, outputs={})
+            _record_event(render_record, f"Filtergraph render unavailable ({exc}); using MoviePy", level="warning")
+
+    return _compose_single(
+        asset_path, segments, timeline, job, render_record, watermark_override, final_path, single_pass, profile, resume_key
+    )
+
+
+def _compose_segments_parallel(
+    asset_path: Path,
+    segments: List[Dict[str, Any]],
+    timeline: Dict[str, Any],
+    job,
+    render_record: Render,
+    watermark_override: Optional[bool],
+    final_path: Path,
+    engine: str = "moviepy",
+    profile: RenderProfile = FINAL_PROFILE,
+    variants: Sequence[RenderProfile] = (),
+) -> Path:
+    """Encode dirty segments in a process pool with identical codec settings, then stream-copy concat.
+
+    Encoded segments are kept in `segments_dir` under their segment fingerprint, so
+    segments whose bounds, effects, captions and sfx are unchanged are reused as-is.
+    Each segment encode also writes its `variants`, which are joined the same way.
+    """
+    total_segments = len(segments)
+    watermark = _watermark_filter(watermark_override)
+    watermark_enabled = SETTINGS.watermark_enabled if watermark_override is None else watermark_override
+    watermark_text = (SETTINGS.watermark_text or SETTINGS.app_name) if watermark_enabled else None
+
+    segments_dir = SETTINGS.segments_dir
+    segments_dir.mkdir(parents=True, exist_ok=True)
+    asset_hash = asset_content_hash(asset_path)
+    segment_paths = [
+        segments_dir / f"{segment_fingerprint(asset_hash, segment, watermark_text, profile, engine)}.mp4" for segment in segments
+    ]
 
-        timeline_data: Dict[str, Any]
-        if not project.timeline_json or project.timeline_json.strip() in {"", "{}"}:
-            LOGGER.info("Generating timeline on the fly for project %s", project.id)
-            transcription = caption_service.transcribe(asset_path)
-            beat_analysis = beat_service.detect_beats(asset_path)
-            timeline_data = timeline_engine.build_timeline(project.asset, beat_analysis, transcription)
-            project.timeline_json = timeline_engine.to_json(timeline_data)
-            project.status = "analyzed"
+    dirty: List[int] = []
+    for index, segment_path in enumerate(segment_paths):
+        outputs = [segment_path, *(_variant_segment_path(segment_path, variant) for variant in variants)]
+        if all(path.exists() for path in outputs):
+            for path in outputs:
+                os.utime(path)
         else:
-            timeline_data = json.loads(project.timeline_json)
-        session.flush()
+            dirty.append(index)
+    reused = total_segments - len(dirty)
 
-        render_record.status = "rendering"
-        render_record.progress = 25.0
-        render_record.logs = _append_log(render_record.logs, "Timeline ready; beginning composition")
-        session.flush()
+    summary = f"Segments: {reused} reused, {len(dirty)} re-encoded"
+    LOGGER.info("%s for %s", summary, final_path.name)
+    _record_event(render_record, summary)
+    _update_job(job, status="rendering", progress=25.0, log=summary)
 
-        watermark_state = SETTINGS.watermark_enabled if watermark_override is None else watermark_override
-        _update_job(
-            job,
-            status="rendering",
-            progress=25.0,
-            log=f"Composing video segments (watermark={'on' if watermark_state else 'off'})",
+    if dirty:
+        _encode_segments(
+            asset_path, segments, segment_paths, dirty, watermark, profile, engine, job, render_record, variants
         )
 
-        output_path = _compose_video(asset_path, timeline_data, job, render_record, watermark_override)
+    _checkpoint(job)
+    _update_job(job, status="post-processing", progress=85.0, log="Joining segments")
+    _record_event(render_record, "Joining segments with stream copy")
+    _concat_segments(segment_paths, final_path, timeline)
+    for variant in variants:
+        variant_segments = [_variant_segment_path(segment_path, variant) for segment_path in segment_paths]
+        _concat_segments(variant_segments, _variant_path(final_path, variant), timeline)
+    evict_lru_files(segments_dir, SETTINGS.segment_cache_max_bytes)
+    return final_path
+
+
+def _encode_segments(
+    asset_path: Path,
+    segments: List[Dict[str, Any]],
+    segment_paths: List[Path],
+    dirty: List[int],
+    watermark: Optional[str],
+    profile: RenderProfile,
+    engine: str,
+    job,
+    render_record: Render,
+    variants: Sequence[RenderProfile] = (),
+) -> None:
+    total_segments = len(segments)
+    source = SourceInfo.probe(asset_path)
+    # Fewer encoders for large frames, so the job stays inside the memory budget it was admitted under.
+    workers = min(segment_workers(source.width, source.height, profile, variants, engine), len(dirty))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    token = uuid4().hex[:8]
+    temp_paths = {index: segment_paths[index].with_name(f"{segment_paths[index].stem}.{token}.tmp.mp4") for index in dirty}
+    # (profile, temp, final) of each variant a dirty segment also writes.
+    variant_temps: Dict[int, List[Tuple[RenderProfile, Path, Path]]] = {index: [] for index in dirty}
+    for index in dirty:
+        for variant in variants:
+            path = _variant_segment_path(segment_paths[index], variant)
+            variant_temps[index].append((variant, path.with_name(f"{path.stem}.{token}.tmp.mp4"), path))
+
+    _record_event(render_record, f"Encoding {len(dirty)} segments across {workers} processes")
+    _update_job(job, log=f"Encoding {len(dirty)} segments in parallel ({workers} workers)")
+
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Manager() as manager:
+            progress_map = manager.dict({index: 1.0 for index in range(total_segments) if index not in temp_paths})
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            try:
+                futures = {
+                    pool.submit(
+                        render_segment,
+                        str(asset_path),
+                        segments[index],
+                        str(temp_paths[index]),
+                        profile.as_dict(),
+                        watermark,
+                        threads,
+                        progress_map,
+                        index,
+                        engine,
+                        [(variant.as_dict(), str(temp)) for variant, temp, _ in variant_temps[index]],
+                    ): index
+                    for index in dirty
+                }
+                pending = set(futures)
+                completed = 0
+                last_progress = None
+                while pending:
+                    _checkpoint(job)
+                    done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                        index = futures[future]
+                        # Segments are cached under their fingerprint, so a retry reuses this file without a checkpoint row.
+                        os.replace(temp_paths[index], segment_paths[index])
+                        for _, temp, path in variant_temps[index]:
+                            os.replace(temp, path)
+                        completed += 1
+                        _record_event(render_record, f"Encoded segment {segments[index].get('name', index + 1)}")
+                        _update_job(job, log=f"Segment {completed}/{len(dirty)} encoded")
+
+                    fraction = sum(float(progress_map.get(index, 0.0)) for index in range(total_segments)) / total_segments
+                    progress = round(25.0 + fraction * 55.0, 1)
+                    if progress != last_progress:
+                        render_record.progress = progress
+                        _update_job(job, status="rendering", progress=progress)
+                        last_progress = progress
+            except RenderCanceled:
+                _terminate_pool(pool)
+                raise
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+    finally:
+        for temp_path in temp_paths.values():
+            temp_path.unlink(missing_ok=True)
+            temp_path.with_suffix(".m4a").unlink(missing_ok=True)
+        for temps in variant_temps.values():
+            for _, temp, _ in temps:
+                temp.unlink(missing_ok=True)
 
-        public_url = f"/media/final/{output_path.name}"
-        render_record.output_path = str(output_path)
-        render_record.output_url = public_url
-        render_record.status = "finished"
-        render_record.progress = 100.0
-        render_record.logs = _append_log(render_record.logs, f"Render complete -> {public_url}")
-        render_record.updated_at = datetime.utcnow()
-        project.status = "rendered"
-        session.flush()
 
-        _update_job(job, status="finished", progress=100.0, log="Render completed", result=public_url)
-        LOGGER.info("Render finished for project %s with job %s", project_id, job_id)
-        return public_url
+def _terminate_pool(pool: ProcessPoolExecutor) -> None:
+    """Stop in-flight segment encodes now; their ffmpeg children exit once the pipe to the dead worker breaks."""
+    for process in list(getattr(pool, "_processes", {}).values()):
+        process.terminate()
 
 
-def _compose_video(asset_path: Path, timeline: Dict[str, Any], job, render_record: Render, watermark_override: Optional[bool]) -> Path:
+def _concat_segments(segment_paths: List[Path], final_path: Path, timeline: Dict[str, Any]) -> None:
+    list_path = final_path.parent / f"{final_path.stem}_concat.txt"
+    list_path.write_text("".join(_concat_entry(path) for path in segment_paths), encoding="utf-8")
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(list_path),
+        "-map",
+        "0",
+        "-c",
+        "copy",
+        *_metadata_args(timeline),
+        "-movflags",
+        "+faststart",
+        str(final_path),
+    ]
+    try:
+        run_ffmpeg(cmd, "concat segments")
+    finally:
+        list_path.unlink(missing_ok=True)
+
+
+def _concat_entry(path: Path) -> str:
+    escaped = str(path.resolve()).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+
+def _compose_filtergraph(
+    asset_path: Path,
+    timeline: Dict[str, Any],
+    job,
+    render_record: Render,
+    watermark_override: Optional[bool],
+    final_path: Path,
+    profile: RenderProfile = FINAL_PROFILE,
+    variants: Sequence[RenderProfile] = (),
+    stream_dir: Optional[Path] = None,
+) -> Path:
+    """Render the whole timeline with one native ffmpeg -filter_complex invocation.
+
+    Variants are split off the composed stream inside the same graph, so the
+    source is decoded and composed once no matter how many files are written.
+    """
+    work_dir = final_path.parent / f"{final_path.stem}_graph"
+    try:
+        graph = compile_timeline(
+            asset_path,
+            timeline,
+            SourceInfo.probe(asset_path),
+            profile,
+            work_dir,
+            watermark_filter=_watermark_filter(watermark_override),
+        )
+        _record_event(render_record, "Rendering timeline through ffmpeg filtergraph")
+        _update_job(job, status="rendering", progress=30.0, log="Rendering timeline with native filtergraph")
+
+        def _on_progress(fraction: float) -> None:
+            _checkpoint(job)
+            progress = round(30.0 + fraction * 60.0, 1)
+            render_record.progress = progress
+            _update_job(job, progress=progress)
+
+        output_args = [*profile.ffmpeg_output_args(), *_metadata_args(timeline), "-movflags", "+faststart"]
+        if variants:
+            targets = [(profile, final_path, output_args)]
+            for variant in variants:
+                targets.append((variant, _variant_path(final_path, variant), _variant_output_args(variant, timeline)))
+            outputs = add_variant_outputs(graph, profile, targets)
+            _record_event(render_record, f"Emitting {len(variants)} extra variants from the same graph")
+        else:
+            outputs = [GraphOutput(final_path, output_args, graph.video_label, graph.audio_label)]
+        if stream_dir is not None:
+            outputs[0] = _stream_output(outputs[0], stream_dir, profile, timeline)
+            _record_event(render_record, f"Streaming progressive HLS to {_stream_url(stream_dir)}")
+            _update_job(job, log="Progressive stream available", outputs={"stream": _stream_url(stream_dir)})
+        cmd = graph.multi_output_command(outputs)
+        try:
+            run_ffmpeg(cmd, "render", graph.duration, _on_progress)
+        except (subprocess.CalledProcessError, RenderCanceled):
+            final_path.unlink(missing_ok=True)
+            for variant in variants:
+                _variant_path(final_path, variant).unlink(missing_ok=True)
+            raise
+        return final_path
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _variant_path(final_path: Path, profile: RenderProfile) -> Path:
+    """Deterministic per-encode path next to the main output; variants with identical settings share it."""
+    return final_path.with_name(f"{final_path.stem}_{profile.width}x{profile.height}_{profile.digest()}.mp4")
+
+
+def _variant_segment_path(segment_path: Path, variant: RenderProfile) -> Path:
+    """A variant's copy of a cached segment; the main segment's fingerprint already covers its composition."""
+    return segment_path.with_name(f"{segment_path.stem}_{variant.digest()}.mp4")
+
+
+def _variant_output_args(profile: RenderProfile, timeline: Dict[str, Any]) -> List[str]:
+    return [*profile.ffmpeg_output_args(), *_metadata_args(timeline), "-movflags", "+faststart"]
+
+
+def _pending_variants(final_path: Path, profile: RenderProfile, variants: Sequence[RenderProfile]) -> List[RenderProfile]:
+    """Distinct variant encodes still missing; ones matching the main profile reuse the main file."""
+    pending: Dict[str, RenderProfile] = {}
+    for variant in variants:
+        digest = variant.digest()
+        if digest == profile.digest() or digest in pending or _variant_path(final_path, variant).exists():
+            continue
+        pending[digest] = variant
+    return list(pending.values())
+
+
+def _variant_outputs(
+    output_path: Path,
+    timeline: Dict[str, Any],
+    profile: RenderProfile,
+    variants: Sequence[RenderProfile],
+    job,
+    render_record: Render,
+) -> Dict[str, Tuple[RenderProfile, Path]]:
+    """Variant name -> (profile, file), encoding whatever the main pass did not already produce."""
+    pending = _pending_variants(output_path, profile, variants)
+    if pending:
+        _encode_variants(output_path, timeline, profile, pending, job, render_record)
+
+    outputs: Dict[str, Tuple[RenderProfile, Path]] = {profile.name: (profile, output_path)}
+    for variant in variants:
+        path = output_path if variant.digest() == profile.digest() else _variant_path(output_path, variant)
+        outputs[variant.name] = (variant, path)
+    return outputs
+
+
+def _encode_variants(
+    source_path: Path,
+    timeline: Dict[str, Any],
+    base: RenderProfile,
+    variants: List[RenderProfile],
+    job,
+    render_record: Render,
+) -> None:
+    """Encode every variant from one decode of the finished main output (split, then fit per variant)."""
+    graph = FilterGraph(video_label="0:v", audio_label="0:a")
+    graph.add_input(source_path)
+    outputs = add_variant_outputs(
+        graph,
+        base,
+        [(variant, _variant_path(source_path, variant), _variant_output_args(variant, timeline)) for variant in variants],
+    )
+    names = ", ".join(variant.name for variant in variants)
+    _record_event(render_record, f"Encoding variants in one pass: {names}")
+    _update_job(job, status="post-processing", progress=90.0, log=f"Encoding output variants ({names})")
+
+    def _on_progress(fraction: float) -> None:
+        _checkpoint(job)
+        progress = round(90.0 + fraction * 8.0, 1)
+        render_record.progress = progress
+        _update_job(job, progress=progress)
+
+    try:
+        run_ffmpeg(graph.multi_output_command(outputs), "variants", SourceInfo.probe(source_path).duration, _on_progress)
+    except (subprocess.CalledProcessError, RenderCanceled):
+        for output in outputs:
+            output.path.unlink(missing_ok=True)
+        raise
+
+
+def _compose_single(
+    asset_path: Path,
+    segments: List[Dict[str, Any]],
+    timeline: Dict[str, Any],
+    job,
+    render_record: Render,
+    watermark_override: Optional[bool],
+    final_path: Path,
+    single_pass: Optional[bool],
+    profile: RenderProfile = FINAL_PROFILE,
+    resume_key: Optional[str] = None,
+) -> Path:
     asset_clip = VideoFileClip(str(asset_path))
     segment_clips: List[VideoFileClip] = []
     overlay_audio: List[AudioFileClip] = []
@@ -133,70 +791,25 @@ def _compose_video(asset_path: Path, timeline: Dict[str, Any], job, render_recor
     final_clip = None
 
     try:
-        segments = sorted(timeline.get("segments", []), key=lambda item: item.get("start", 0.0))
         total_segments = max(len(segments), 1)
         for index, segment in enumerate(segments, start=1):
-            start = float(segment.get("start", 0.0))
-            end = float(segment.get("end", start + 1.0))
-            if end <= start:
-                end = start + 0.5
-            segment_clip = asset_clip.subclip(max(start, 0.0), min(end, asset_clip.duration))
-
-            effects = [str(effect).lower() for effect in segment.get("effects", [])]
-            if "zoom" in effects:
-                segment_clip = segment_clip.fx(vfx.resize, 1.12)
-            if "slowmo" in effects:
-                segment_clip = segment_clip.fx(vfx.speedx, 0.85)
-
-            overlays: List[TextClip] = []
-            for caption in segment.get("captions", []):
-                text = str(caption.get("text", "")).strip()
-                if not text:
-                    continue
-                caption_start = max(0.0, float(caption.get("start", start)) - start)
-                caption_end = float(caption.get("end", end))
-                duration = max(0.1, caption_end - float(caption.get("start", start)))
-                try:
-                    text_clip = (
-                        TextClip(
-                            text,
-                            fontsize=64,
-                            color="white",
-                            font="DejaVu-Sans",
-                            method="caption",
-                            size=(960, None),
-                        )
-                        .set_start(caption_start)
-                        .set_duration(duration)
-                        .set_position(("center", "bottom"))
-                    )
-                    overlays.append(text_clip)
-                    overlay_resources.append(text_clip)
-                except Exception as exc:  # pragma: no cover - font/imagemagick issues
-                    LOGGER.warning("Caption rendering failed: %s", exc)
-
-            if overlays:
-                segment_clip = CompositeVideoClip([segment_clip, *overlays])
-
-            sfx = segment.get("sfx") or {}
-            sfx_path = Path(str(sfx.get("path", ""))) if sfx else None
-            if sfx_path and sfx_path.exists():
-                try:
-                    sfx_clip = AudioFileClip(str(sfx_path)).volumex(1.35)
-                    overlay_audio.append(sfx_clip.set_start(cumulative_time))
-                except Exception as exc:  # pragma: no cover - optional path
-                    LOGGER.warning("Failed to load SFX %s: %s", sfx_path, exc)
+            _checkpoint(job)
+            segment_clip = build_segment_clip(asset_clip, segment, overlay_resources, profile)
+
+            sfx_clip = load_segment_sfx(segment)
+            if sfx_clip is not None:
+                overlay_audio.append(sfx_clip.set_start(cumulative_time))
 
             segment_clips.append(segment_clip)
             cumulative_time += segment_clip.duration
 
             progress = 25.0 + (index / total_segments) * 40.0
             render_record.progress = progress
-            render_record.logs = _append_log(render_record.logs, f"Processed segment {segment.get('name', index)}")
+            _record_event(render_record, f"Processed segment {segment.get('name', index)}")
             _update_job(job, status="rendering", progress=progress, log=f"Segment {index}/{total_segments} composed")
 
         if not segment_clips:
-            segment_clips = [asset_clip]
+            segment_clips = [ensure_vertical(asset_clip, profile)]
             cumulative_time = asset_clip.duration
 
         final_clip = concatenate_videoclips(segment_clips, method="compose")
@@ -207,32 +820,54 @@ def _compose_video(asset_path: Path, timeline: Dict[str, Any], job, render_recor
             tracks.extend(overlay_audio)
             final_clip = final_clip.set_audio(CompositeAudioClip(tracks))
 
-        final_clip = _ensure_vertical(final_clip)
-
-        output_dir = SETTINGS.final_dir
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_name = f"project_{asset_path.stem}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        output_dir = final_path.parent
+        output_name = final_path.stem
         temp_path = output_dir / f"{output_name}_temp.mp4"
-        final_path = output_dir / f"{output_name}.mp4"
 
-        render_record.logs = _append_log(render_record.logs, "Writing video stream")
+        _record_event(render_record, "Writing video stream")
         _update_job(job, status="rendering", progress=70.0, log="Exporting composed video")
+        export_logger = _ExportCheckpointLogger(job) if job is not None else None
+
+        use_single_pass = SETTINGS.render_single_pass if single_pass is None else single_pass
+        if use_single_pass:
+            try:
+                final_clip.write_videofile(
+                    str(final_path),
+                    **profile.write_kwargs(),
+                    threads=4,
+                    ffmpeg_params=_single_pass_params(timeline, watermark_override, profile),
+                    temp_audiofile=str(output_dir / f"{output_name}_audio.m4a"),
+                    verbose=False,
+                    logger=export_logger,
+                )
+                _record_event(render_record, "Watermark/metadata applied in main encode")
+                return final_path
+            except OSError as exc:
+                LOGGER.warning("Single-pass export failed, falling back to post-pass: %s", exc)
+                final_path.unlink(missing_ok=True)
+                _record_event(render_record, "Single-pass export failed; using post-pass", level="warning")
+
         final_clip.write_videofile(
             str(temp_path),
-            codec="libx264",
-            audio_codec="aac",
-            fps=30,
-            preset="medium",
+            **profile.write_kwargs(),
             threads=4,
             verbose=False,
-            logger=None,
+            logger=export_logger,
         )
+        _mark_stage(render_record, "composed", resume_key, temp_path)
+        _checkpoint(job)
 
         _update_job(job, status="post-processing", progress=85.0, log="Applying watermark & metadata")
-        render_record.logs = _append_log(render_record.logs, "Applying watermark/metadata")
-        _apply_watermark_and_metadata(temp_path, final_path, timeline, watermark_override)
+        _record_event(render_record, "Applying watermark/metadata")
+        _apply_watermark_and_metadata(temp_path, final_path, timeline, watermark_override, profile)
 
         return final_path
+    except RenderCanceled as exc:
+        final_path.unlink(missing_ok=True)
+        if not isinstance(exc, RenderPreempted):
+            # A preempted job resumes from the composed checkpoint, so its temp file stays.
+            final_path.with_name(f"{final_path.stem}_temp.mp4").unlink(missing_ok=True)
+        raise
     finally:
         if final_clip is not None:
             final_clip.close()
@@ -245,32 +880,20 @@ def _compose_video(asset_path: Path, timeline: Dict[str, Any], job, render_recor
             overlay.close()
 
 
-def _ensure_vertical(clip: VideoFileClip) -> VideoFileClip:
-    target_height = 1920
-    target_width = 1080
-    resized = clip.resize(height=target_height)
-    if resized.w < target_width:
-        scale_factor = target_width / resized.w
-        resized = resized.resize(scale_factor)
-    return resized.crop(width=target_width, height=target_height, x_center=resized.w / 2, y_center=resized.h / 2)
-
-
-def _apply_watermark_and_metadata(temp_path: Path, final_path: Path, timeline: Dict[str, Any], watermark_override: Optional[bool]) -> None:
-    watermark_filters: List[str] = []
+def _watermark_filter(watermark_override: Optional[bool]) -> Optional[str]:
     watermark_enabled = SETTINGS.watermark_enabled if watermark_override is None else watermark_override
-    if watermark_enabled:
-        text = SETTINGS.watermark_text or SETTINGS.app_name
-        safe_text = text.replace("\\", "\\\\").replace(":", "\\:").replace("'", "\\'")
-        watermark_filters.append(
-            "drawtext=text='{}':fontcolor=white@0.82:fontsize=48:x=w-text_w-40:y=h-text_h-40:".format(safe_text)
-            + "box=1:boxcolor=black@0.35:boxborderw=15"
-        )
-
-    vf_arg = []
-    if watermark_filters:
-        vf_arg = ["-vf", ",".join(watermark_filters)]
-
-    metadata_args = [
+    if not watermark_enabled:
+        return None
+    text = SETTINGS.watermark_text or SETTINGS.app_name
+    safe_text = text.replace("\\", "\\\\").replace(":", "\\:").replace("'", "\\'")
+    return (
+        "drawtext=text='{}':fontcolor=white@0.82:fontsize=48:x=w-text_w-40:y=h-text_h-40:".format(safe_text)
+        + "box=1:boxcolor=black@0.35:boxborderw=15"
+    )
+
+
+def _metadata_args(timeline: Dict[str, Any]) -> List[str]:
+    return [
         "-metadata",
         f"comment=Generated by {SETTINGS.app_name}",
         "-metadata",
@@ -279,6 +902,30 @@ def _apply_watermark_and_metadata(temp_path: Path, final_path: Path, timeline: D
         f"rendered_at={datetime.utcnow().isoformat()}",
     ]
 
+
+def _single_pass_params(timeline: Dict[str, Any], watermark_override: Optional[bool], profile: RenderProfile = FINAL_PROFILE) -> List[str]:
+    """Extra output args so MoviePy's encode matches what the post-pass would produce."""
+    params: List[str] = []
+    watermark = _watermark_filter(watermark_override)
+    if watermark:
+        params.extend(["-vf", watermark])
+    params.extend(_metadata_args(timeline))
+    params.extend(profile.encoder_params())
+    params.extend(["-movflags", "+faststart"])
+    return params
+
+
+def _apply_watermark_and_metadata(
+    temp_path: Path,
+    final_path: Path,
+    timeline: Dict[str, Any],
+    watermark_override: Optional[bool],
+    profile: RenderProfile = FINAL_PROFILE,
+) -> None:
+    watermark = _watermark_filter(watermark_override)
+    vf_arg = ["-vf", watermark] if watermark else []
+    metadata_args = _metadata_args(timeline)
+
     cmd = [
         "ffmpeg",
         "-y",
@@ -287,30 +934,35 @@ def _apply_watermark_and_metadata(temp_path: Path, final_path: Path, timeline: D
         *vf_arg,
         *metadata_args,
         "-c:v",
-        "libx264",
+        profile.codec,
         "-preset",
-        "medium",
-        "-crf",
-        "18",
-        "-pix_fmt",
-        "yuv420p",
+        profile.preset,
+        *profile.encoder_params(),
         "-c:a",
-        "aac",
+        profile.audio_codec,
         "-b:a",
-        "192k",
+        profile.audio_bitrate,
         "-movflags",
         "+faststart",
         str(final_path),
     ]
 
-    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-    if watermark_enabled:
+    run_ffmpeg(cmd, "watermark" if watermark else "metadata")
+    if watermark:
         LOGGER.info("Applied watermark to %s", final_path)
-    LOGGER.debug("ffmpeg output: %s", result.stderr.strip())
     temp_path.unlink(missing_ok=True)
 
 
-def _update_job(job, *, status: Optional[str] = None, progress: Optional[float] = None, log: Optional[str] = None, result: Optional[str] = None, error: Optional[str] = None) -> None:
+def _update_job(
+    job,
+    *,
+    status: Optional[str] = None,
+    progress: Optional[float] = None,
+    log: Optional[str] = None,
+    result: Optional[str] = None,
+    error: Optional[str] = None,
+    outputs: Optional[Dict[str, str]] = None,
+) -> None:
     if job is None:
         return
     meta = job.meta or {}
@@ -321,18 +973,40 @@ def _update_job(job, *, status: Optional[str] = None, progress: Optional[float]
     logs = meta.setdefault("logs", [])
     if log:
         logs.append(log)
+        # Ring buffer for live display; full history lives in render_events.
+        del logs[: -SETTINGS.render_job_log_limit]
     if result is not None:
         meta["result"] = result
     if error is not None:
         meta["error"] = error
+    if outputs is not None:
+        meta["outputs"] = outputs
     job.meta = meta
     job.save_meta()
-
-
-def _append_log(existing: str, message: str) -> str:
-    existing = existing or ""
-    timestamp = datetime.utcnow().isoformat()
-    entry = f"[{timestamp}] {message}"
-    if existing:
-        return existing + "\n" + entry
-    return entry
+    event = {
+        "status": status,
+        "progress": meta.get("progress") if progress is not None else None,
+        "log": log,
+        "result": result,
+        "outputs": outputs,
+        "error": error,
+    }
+    publish_progress(job.connection, job.id, {key: value for key, value in event.items() if value is not None})
+
+
+def _record_event(render_record: Render, message: str, *, level: str = "info", stage: Optional[str] = None) -> None:
+    """Append one row to render_events; never rewrites earlier log output."""
+    session = object_session(render_record)
+    if session is None or render_record.id is None:
+        LOGGER.debug("Render event (%s): %s", level, message)
+        return
+    session.add(
+        RenderEvent(
+            render_id=render_record.id,
+            job_id=render_record.job_id,
+            stage=stage or render_record.status,
+            level=level,
+            message=message,
+            progress=render_record.progress,
+        )
+    )
@@ -18,7 +18,7 @@ export async function saveTimeline(projectId: number, timeline: Record<string, a
   return client.post(`/timeline/${projectId}`, { timeline }).then((r) => r.data);
 }
 
-export async function startRender(projectId: number, options: { watermark?: boolean } = {}) {
+export async function startRender(projectId: number, options: { watermark?: boolean; preview?: boolean; variants?: string[]; priority?: 'interactive' | 'normal' | 'bulk'; progressive?: boolean } = {}) {
   return client.post(`/render/${projectId}`, { ...options }).then((r) => r.data);
 }
 
@@ -26,6 +26,19 @@ export async function getRenderStatus(jobId: string) {
   return client.get(`/render/status/${jobId}`).then((r) => r.data);
 }
 
+export async function cancelRender(jobId: string) {
+  return client.post(`/render/cancel/${jobId}`).then((r) => r.data);
+}
+
+export function subscribeRenderStatus(jobId: string, onEvent: (event: Record<string, any>) => void) {
+  const source = new EventSource(`${API_BASE}/render/stream/${jobId}`);
+  const handler = (message: MessageEvent) => onEvent(JSON.parse(message.data));
+  source.addEventListener("status", handler as EventListener);
+  source.addEventListener("progress", handler as EventListener);
+  source.onerror = () => source.close();
+  return () => source.close();
+}
+
 export async function healthCheck() {
   return client.get(`/healthz`).then((r) => r.data);
 }
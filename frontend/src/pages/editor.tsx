@@ -98,6 +98,9 @@ export default function Editor() {
         } else if (status.status === "failed") {
           setRendering(false);
           setError(status.error || "Render failed");
+        } else if (status.status === "canceled") {
+          setRendering(false);
+          setToast("Render canceled");
         }
       } catch (err) {
         setError((err as Error).message);
@@ -45,6 +45,8 @@ export type ProjectDetail = {
     path: string;
     ingest_url?: string | null;
     thumbnail_url?: string | null;
+    sprite_url?: string | null;
+    sprite_vtt_url?: string | null;
   };
   consent?: ConsentStatus | null;
   timeline: TimelineData;
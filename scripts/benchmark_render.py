@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Render pipeline benchmark.
+
+Generates a synthetic source clip, then times `_compose_video` in each render
+mode so changes to the worker pipeline can be compared per job.
+
+Usage:
+    python scripts/benchmark_render.py --duration 20 --runs 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from backend.config import get_settings  # noqa: E402
+from backend.models import Render  # noqa: E402
+from backend.services.render_profile import PREVIEW_PROFILE  # noqa: E402
+from backend.workers import tasks_render  # noqa: E402
+
+
+def make_source(path: Path, duration: float, size: str) -> Path:
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={size}:rate=30:duration={duration}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:duration={duration}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-c:a",
+            "aac",
+            "-shortest",
+            str(path),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return path
+
+
+def make_timeline(duration: float, segment_count: int) -> Dict[str, Any]:
+    length = duration / segment_count
+    segments: List[Dict[str, Any]] = []
+    for index in range(segment_count):
+        start = index * length
+        end = start + length
+        segments.append(
+            {
+                "name": f"SEG{index + 1}",
+                "start": start,
+                "end": end,
+                "effects": ["zoom"] if index == 0 else [],
+                "captions": [{"text": f"Caption {index + 1}", "start": start + 0.2, "end": end - 0.2}],
+                "sfx": None,
+            }
+        )
+    return {"template_name": "benchmark", "segments": segments}
+
+
+def time_mode(label: str, runs: int, render: Callable[[], Path]) -> List[float]:
+    timings: List[float] = []
+    for run in range(1, runs + 1):
+        started = time.perf_counter()
+        output = render()
+        elapsed = time.perf_counter() - started
+        timings.append(elapsed)
+        print(f"  {label} run {run}: {elapsed:.2f}s -> {output.name}")
+        output.unlink(missing_ok=True)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20.0, help="Source clip duration in seconds")
+    parser.add_argument("--size", default="1280x720", help="Source clip resolution")
+    parser.add_argument("--segments", type=int, default=4, help="Timeline segment count")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per mode")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    with tempfile.TemporaryDirectory() as workdir:
+        settings.final_dir = Path(workdir) / "final"
+        settings.final_dir.mkdir(parents=True, exist_ok=True)
+        source = make_source(Path(workdir) / "source.mp4", args.duration, args.size)
+        timeline = make_timeline(args.duration, args.segments)
+
+        settings.segments_dir = Path(workdir) / "segments"
+
+        def compose(watermark: Optional[bool] = None, **options: Any) -> Callable[[], Path]:
+            def _render() -> Path:
+                # Segment reuse would hide encode cost between runs.
+                shutil.rmtree(settings.segments_dir, ignore_errors=True)
+                return tasks_render._compose_video(source, timeline, None, Render(), watermark, **options)
+
+            return _render
+
+        modes: Dict[str, Callable[[], Path]] = {
+            "two-pass": compose(single_pass=False, parallel=False, engine="moviepy"),
+            "single-pass": compose(single_pass=True, parallel=False, engine="moviepy"),
+            "filtergraph": compose(parallel=False, engine="ffmpeg"),
+            "segments-moviepy": compose(parallel=True, engine="moviepy"),
+            "segments-ffmpeg": compose(parallel=True, engine="ffmpeg"),
+            "preview": compose(parallel=False, engine="ffmpeg", watermark=False, profile=PREVIEW_PROFILE),
+        }
+
+        results: Dict[str, float] = {}
+        for label, render in modes.items():
+            print(f"{label}:")
+            results[label] = statistics.median(time_mode(label, args.runs, render))
+
+    baseline = results["two-pass"]
+    print("\nMedian wall time per job:")
+    for label, median in results.items():
+        saved = baseline - median
+        print(f"  {label:<17} {median:8.2f}s  saved {saved:7.2f}s ({(saved / baseline) * 100 if baseline else 0.0:5.1f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,12 +10,37 @@ Tests the complete auto-editing functionality including:
 """
 
 from pathlib import Path
+import time
 import httpx
 import json
 
 # Configuration
 API_BASE = "http://localhost:8000/api"
 MEDIA_DIR = Path(__file__).parent / "media"
+POLL_INTERVAL = 2.0
+POLL_TIMEOUT = 600.0
+
+
+def wait_for_edit(client: httpx.Client, response: httpx.Response):
+    """Result of an edit request: immediate for 200, otherwise poll the queued job's status_url."""
+    if response.status_code == 200:
+        return response.json()
+    if response.status_code != 202:
+        return None
+    status_url = response.json()["status_url"]
+    print(f"   Queued, polling {status_url}")
+    deadline = time.monotonic() + POLL_TIMEOUT
+    while time.monotonic() < deadline:
+        status = client.get(f"http://localhost:8000{status_url}").json()
+        if status["status"] == "finished":
+            return status
+        if status["status"] in ("failed", "canceled"):
+            print(f"   Edit {status['status']}: {status.get('error')}")
+            return None
+        print(f"   {status['status']} {status.get('progress', 0):.0f}%")
+        time.sleep(POLL_INTERVAL)
+    print("   Timed out waiting for the edit")
+    return None
 
 
 def test_auto_edit_full_features():
@@ -100,8 +125,8 @@ def test_auto_edit_full_features():
                 json=request_data
             )
 
-            if response.status_code == 200:
-                result = response.json()
+            result = wait_for_edit(client, response)
+            if result:
                 print("\n✅ SUCCESS! Video edited successfully")
                 print(f"   Output path: {result['output_path']}")
                 print(f"   Output URL: {result['output_url']}")
@@ -150,8 +175,8 @@ def test_quick_edit():
                 json=clip_paths
             )
 
-            if response.status_code == 200:
-                result = response.json()
+            result = wait_for_edit(client, response)
+            if result:
                 print("\n✅ Quick edit successful!")
                 print(f"   Output path: {result['output_path']}")
                 print(f"   Output URL: {result['output_url']}")
@@ -15,3 +15,139 @@ def test_healthz_smoke(monkeypatch):
         data = response.json()
         assert data["status"] == "ok"
         assert data["redis"] is True
+
+
+def test_auto_edit_is_queued_and_reports_status(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(queue_manager, "ensure_worker", lambda: None)
+    monkeypatch.setattr(queue_manager, "shutdown_worker", lambda: None)
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"")
+    queued = []
+    job = SimpleNamespace(
+        id="edit-1",
+        is_failed=False,
+        meta={"kind": "auto_edit", "status": "rendering", "progress": 42.0, "logs": ["Starting"]},
+        get_status=lambda refresh=False: "started",
+    )
+    monkeypatch.setattr(queue_manager, "enqueue_auto_edit", lambda plan: queued.append(plan) or job)
+    monkeypatch.setattr(queue_manager, "fetch_job", lambda job_id: job if job_id == "edit-1" else None)
+
+    with TestClient(app) as client:
+        response = client.post("/api/auto-edit/edit", json={"clips": [{"path": str(clip)}] * 3, "transitions": "cut"})
+        assert response.status_code == 202
+        assert response.json()["status_url"] == "/api/auto-edit/status/edit-1"
+        assert len(queued) == 1 and len(queued[0].clips) == 3
+
+        # Blocking edits are refused for anything but tiny plans.
+        response = client.post("/api/auto-edit/edit", json={"clips": [{"path": str(clip)}] * 3, "wait": True})
+        assert response.status_code == 422
+
+        status = client.get("/api/auto-edit/status/edit-1").json()
+        assert status["status"] == "rendering" and status["progress"] == 42.0
+        assert client.get("/api/auto-edit/status/missing").status_code == 404
+
+
+def test_auto_edit_batch_groups_plans_over_the_same_clips(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    from backend.workers import queue as queue_module
+
+    monkeypatch.setattr(queue_manager, "ensure_worker", lambda: None)
+    monkeypatch.setattr(queue_manager, "shutdown_worker", lambda: None)
+    first, second = tmp_path / "a.mp4", tmp_path / "b.mp4"
+    first.write_bytes(b"")
+    second.write_bytes(b"")
+    enqueued = []
+
+    def _enqueue(func, *args, **kwargs):
+        enqueued.append((func.__name__, args, kwargs))
+        return SimpleNamespace(id=f"job-{len(enqueued)}")
+
+    monkeypatch.setattr(queue_manager.queues["normal"], "enqueue", _enqueue)
+    # rq's Dependency only accepts real jobs; record what the edits depend on instead.
+    monkeypatch.setattr(queue_module, "Dependency", lambda jobs, allow_failure: SimpleNamespace(jobs=jobs, allow_failure=allow_failure))
+    plans = [
+        {"clips": [{"path": str(first)}, {"path": str(second)}], "captions": [{"text": "A", "start": 0, "end": 1}]},
+        # Reordered clips still share normalization with the first plan.
+        {"clips": [{"path": str(second)}, {"path": str(first)}]},
+        {"clips": [{"path": str(first)}], "output_resolution": "1920x1080"},
+    ]
+
+    with TestClient(app) as client:
+        response = client.post("/api/auto-edit/batch", json={"plans": plans})
+        assert response.status_code == 202
+        data = response.json()
+        assert [group["plan_indexes"] for group in data["groups"]] == [[0, 1], [2]]
+        assert [job["job_id"] for job in data["jobs"]] == ["job-2", "job-3", "job-5"]
+
+        names = [name for name, _, _ in enqueued]
+        assert names == ["prepare_auto_edit_group", "run_auto_edit", "run_auto_edit", "prepare_auto_edit_group", "run_auto_edit"]
+        assert len(enqueued[0][1][0]) == 2
+        # Each edit knows its position in the group job's result.
+        assert [args[1] for name, args, _ in enqueued if name == "run_auto_edit"] == [0, 1, 0]
+        dependency = enqueued[1][2]["depends_on"]
+        assert [job.id for job in dependency.jobs] == ["job-1"] and dependency.allow_failure
+
+        unknown = client.post("/api/auto-edit/batch", json={"plans": plans, "priority": "urgent"})
+        assert unknown.status_code == 400 and len(enqueued) == 5
+
+        missing = client.post("/api/auto-edit/batch", json={"plans": [{"clips": [{"path": str(tmp_path / "nope.mp4")}]}]})
+        assert missing.status_code == 404
+
+
+def test_thumbnail_tool_rejects_non_numeric_times(monkeypatch, tmp_path):
+    monkeypatch.setattr(queue_manager, "ensure_worker", lambda: None)
+    monkeypatch.setattr(queue_manager, "shutdown_worker", lambda: None)
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"")
+
+    with TestClient(app) as client:
+        for times in (["1.5", "soon"], [None], ["nan"]):
+            response = client.post("/api/tools", json={"tool": "thumbnail", "args": {"path": str(clip), "times": times}})
+            assert response.status_code == 400, times
+
+
+def test_render_events_page_by_id_and_legacy_logs_fall_back(monkeypatch, tmp_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.database import get_session
+    from backend.models import Base, Render, RenderEvent
+
+    monkeypatch.setattr(queue_manager, "ensure_worker", lambda: None)
+    monkeypatch.setattr(queue_manager, "shutdown_worker", lambda: None)
+    monkeypatch.setattr(queue_manager, "fetch_job", lambda job_id: None)
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}", connect_args={"check_same_thread": False}, future=True)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as session:
+        current = Render(project_id=1, job_id="job-events", status="rendering")
+        # Rendered before render_events existed; its history only lives in `logs`.
+        legacy = Render(project_id=1, job_id="job-legacy", status="finished", logs="Render job started\nRender complete")
+        session.add_all([current, legacy])
+        session.flush()
+        session.add_all(RenderEvent(render_id=current.id, job_id="job-events", message=f"step {index}") for index in range(3))
+        session.commit()
+
+    def _session():
+        with Session() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = _session
+    try:
+        with TestClient(app) as client:
+            first = client.get("/api/render/events/job-events", params={"limit": 2}).json()
+            assert [event["message"] for event in first["events"]] == ["step 0", "step 1"]
+            assert first["next_after_id"] == first["events"][-1]["id"]
+
+            rest = client.get("/api/render/events/job-events", params={"limit": 2, "after_id": first["next_after_id"]}).json()
+            assert [event["message"] for event in rest["events"]] == ["step 2"]
+            assert rest["next_after_id"] is None
+            assert client.get("/api/render/events/missing").status_code == 404
+
+            assert client.get("/api/render/status/job-events").json()["logs"] == ["step 0", "step 1", "step 2"]
+            assert client.get("/api/render/status/job-legacy").json()["logs"] == ["Render job started", "Render complete"]
+    finally:
+        app.dependency_overrides.pop(get_session, None)
@@ -0,0 +1,290 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from backend.services.filtergraph import (
+    FilterGraph,
+    GraphOutput,
+    SourceInfo,
+    UnsupportedTimeline,
+    add_variant_outputs,
+    caption_layout,
+    compile_segment,
+    compile_timeline,
+    tee_target,
+)
+from backend.services.render_cache import canonical_timeline, evict_expired_files, render_fingerprint, segment_fingerprint
+from backend.services.render_geometry import plan_crop
+from backend.services.render_profile import OUTPUT_PROFILES, PREVIEW_PROFILE, RenderProfile
+
+
+def _timeline():
+    return {
+        "template_name": "realistic_chaos",
+        "asset": {"path": "/tmp/video.mp4", "url": "/media/ingest/video.mp4"},
+        "segments": [
+            {"name": "HOOK", "start": 0.0, "end": 2.0, "effects": ["zoom"], "captions": [{"text": "Hi", "start": 0.2, "end": 1.0}]},
+        ],
+    }
+
+
+def test_canonical_timeline_ignores_key_order_and_asset_block():
+    timeline = _timeline()
+    reordered = json.loads(json.dumps(timeline, sort_keys=True))
+    reordered["asset"] = {"url": "/media/ingest/other.mp4"}
+    assert canonical_timeline(timeline) == canonical_timeline(json.dumps(reordered, indent=2))
+
+
+def test_render_fingerprint_tracks_inputs(tmp_path):
+    asset = tmp_path / "asset.mp4"
+    asset.write_bytes(b"frames")
+    timeline = _timeline()
+
+    base = render_fingerprint(asset, timeline, watermark=True)
+    assert base == render_fingerprint(asset, json.dumps(timeline), watermark=True)
+    assert base != render_fingerprint(asset, timeline, watermark=False)
+    assert base != render_fingerprint(asset, timeline, watermark=True, profile=RenderProfile(crf=23))
+    assert render_fingerprint(asset, timeline, True, engine="moviepy") != render_fingerprint(asset, timeline, True, engine="ffmpeg")
+
+    edited = _timeline()
+    edited["segments"][0]["captions"][0]["text"] = "Hello"
+    assert base != render_fingerprint(asset, edited, watermark=True)
+
+
+def test_preview_profile_is_cached_apart_from_final(tmp_path):
+    asset = tmp_path / "asset.mp4"
+    asset.write_bytes(b"frames")
+    assert render_fingerprint(asset, _timeline(), watermark=False) != render_fingerprint(
+        asset, _timeline(), watermark=False, profile=PREVIEW_PROFILE
+    )
+    assert "-crf" in PREVIEW_PROFILE.ffmpeg_output_args()
+    assert (PREVIEW_PROFILE.width, PREVIEW_PROFILE.height) == (360, 640)
+
+
+def test_evict_expired_files_keeps_fresh_and_in_flight(tmp_path):
+    stale = tmp_path / "old.mp4"
+    fresh = tmp_path / "new.mp4"
+    in_flight = tmp_path / "seg.abc.tmp.mp4"
+    for path in (stale, fresh, in_flight):
+        path.write_bytes(b"x")
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    os.utime(in_flight, (old, old))
+
+    assert evict_expired_files(tmp_path, max_age_seconds=60) == 1
+    assert not stale.exists()
+    assert fresh.exists() and in_flight.exists()
+
+
+def test_segment_fingerprint_only_changes_for_dirty_segment():
+    segment = _timeline()["segments"][0]
+    renamed = dict(segment, name="INTRO", beats=[0.5, 1.0])
+    assert segment_fingerprint("abc", segment, "wm") == segment_fingerprint("abc", renamed, "wm")
+
+    recaptioned = dict(segment, captions=[{"text": "Changed", "start": 0.2, "end": 1.0}])
+    assert segment_fingerprint("abc", segment, "wm") != segment_fingerprint("abc", recaptioned, "wm")
+    assert segment_fingerprint("abc", segment, "wm") != segment_fingerprint("abc", dict(segment, end=2.5), "wm")
+    assert segment_fingerprint("abc", segment, "wm") != segment_fingerprint("abc", segment, None)
+    assert segment_fingerprint("abc", segment, "wm", engine="moviepy") != segment_fingerprint("abc", segment, "wm", engine="ffmpeg")
+
+
+def test_captions_scale_with_the_output_canvas(tmp_path):
+    full = caption_layout(RenderProfile())
+    preview = caption_layout(PREVIEW_PROFILE)
+    assert (full.font_size, full.box_width, full.bottom_margin) == (64, 960, 140)
+    assert (preview.font_size, preview.box_width, preview.bottom_margin) == (21, 320, 47)
+
+    segment = {"name": "HOOK", "start": 0.0, "end": 2.0, "effects": [], "captions": [{"text": "Hi", "start": 0.0, "end": 1.0}]}
+    source = SourceInfo(width=1920, height=1080, duration=10.0, has_audio=True)
+    graph = compile_segment(Path("/tmp/video.mp4"), segment, source, PREVIEW_PROFILE, tmp_path)
+    assert "fontsize=21:" in graph.filter_complex and "y=h-text_h-47:" in graph.filter_complex
+
+
+def test_compile_timeline_builds_single_native_graph(tmp_path):
+    timeline = _timeline()
+    timeline["segments"].append({"name": "PUNCH", "start": 2.0, "end": 4.0, "effects": ["slowmo", "sfx:vine_boom"], "captions": []})
+    source = SourceInfo(width=1920, height=1080, duration=10.0, has_audio=True)
+
+    graph = compile_timeline(Path("/tmp/video.mp4"), timeline, source, RenderProfile(), tmp_path, watermark_filter="drawtext=text='wm'")
+
+    assert graph.inputs[0] == ["-ss", "0.000", "-t", "2.000", "-i", "/tmp/video.mp4"]
+    assert "concat=n=2:v=1:a=1[vcat][acat]" in graph.filter_complex
+    assert "setpts=PTS/0.85" in graph.filter_complex
+    # Crop in source space first, then one scale to the canvas.
+    assert "fps=30,crop=608:1080:656:0,scale=1080:1920,setsar=1" in graph.filter_complex
+    assert "force_original_aspect_ratio" not in graph.filter_complex
+    assert "[vcat]drawtext=text='wm'[vout]" in graph.filter_complex
+    assert graph.duration == pytest.approx(2.0 + 2.0 / 0.85)
+    assert (tmp_path / "caption_000_00.txt").read_text() == "Hi"
+
+    cmd = graph.command(tmp_path / "out.mp4", RenderProfile().ffmpeg_output_args())
+    assert cmd[:2] == ["ffmpeg", "-y"] and cmd[-1].endswith("out.mp4")
+
+
+def test_plan_crop_works_in_source_space_and_folds_zoom():
+    profile = RenderProfile()
+    landscape = plan_crop(3840, 2160, profile)
+    assert (landscape.width, landscape.height) == (1216, 2160) and landscape.x == 1312
+    assert landscape.ffmpeg_filters(profile) == ["crop=1216:2160:1312:0", "scale=1080:1920", "setsar=1"]
+
+    native = plan_crop(1080, 1920, profile)
+    assert native.ffmpeg_filters(profile) == ["crop=1080:1920:0:0", "setsar=1"]
+
+    zoomed = plan_crop(1080, 1920, profile, zoom=1.12)
+    assert (zoomed.width, zoomed.height) == (964, 1714)
+    # Offsets round down to even so chroma planes stay aligned.
+    assert (zoomed.x, zoomed.y) == (58, 102)
+
+
+def test_compile_segment_without_source_audio_uses_silence(tmp_path):
+    segment = _timeline()["segments"][0]
+    source = SourceInfo(width=720, height=1280, duration=5.0, has_audio=False)
+    graph = compile_segment(Path("/tmp/video.mp4"), segment, source, RenderProfile(), tmp_path)
+    assert "anullsrc=r=44100:cl=stereo" in graph.filter_complex
+    assert len(graph.inputs) == 1
+
+
+def test_compile_rejects_unknown_effects(tmp_path):
+    segment = dict(_timeline()["segments"][0], effects=["glitch"])
+    with pytest.raises(UnsupportedTimeline):
+        compile_segment(Path("/tmp/video.mp4"), segment, SourceInfo(1920, 1080, 5.0), RenderProfile(), tmp_path)
+
+
+def test_segment_encode_splits_variants_off_the_same_graph(tmp_path, monkeypatch):
+    from backend.workers import render_segments
+
+    commands = []
+    monkeypatch.setattr(render_segments, "run_ffmpeg", lambda cmd, *args: commands.append(cmd))
+    monkeypatch.setattr(render_segments.SourceInfo, "probe", staticmethod(lambda path: SourceInfo(1920, 1080, 10.0, True)))
+    youtube = OUTPUT_PROFILES["youtube"]
+    segment = dict(_timeline()["segments"][0], captions=[])
+
+    render_segments.render_segment(
+        "/tmp/video.mp4",
+        segment,
+        str(tmp_path / "seg.mp4"),
+        RenderProfile().as_dict(),
+        engine="ffmpeg",
+        variants=[(youtube.as_dict(), str(tmp_path / "seg_youtube.mp4"))],
+    )
+
+    assert len(commands) == 1
+    cmd = commands[0]
+    assert cmd.count("-i") == 1 and cmd.count("-filter_complex") == 1
+    assert "split=2" in cmd[cmd.index("-filter_complex") + 1]
+    assert cmd.index(str(tmp_path / "seg.mp4")) < cmd.index(str(tmp_path / "seg_youtube.mp4")) == len(cmd) - 1
+
+
+def test_variant_outputs_split_one_decode(tmp_path):
+    base = RenderProfile()
+    youtube = OUTPUT_PROFILES["youtube"]
+    graph = FilterGraph(video_label="0:v", audio_label="0:a")
+    graph.add_input(tmp_path / "final.mp4")
+
+    outputs = add_variant_outputs(
+        graph,
+        base,
+        [(base, tmp_path / "a.mp4", base.ffmpeg_output_args()), (youtube, tmp_path / "b.mp4", youtube.ffmpeg_output_args())],
+    )
+    cmd = graph.multi_output_command(outputs)
+
+    assert cmd.count("-i") == 1
+    assert "[0:v]split=2[vsplit0][vsplit1]" in graph.filter_complex
+    assert "[vsplit0]null[vvar0]" in graph.filter_complex
+    assert "pad=1920:1080:(ow-iw)/2:(oh-ih)/2:black" in graph.filter_complex
+    assert cmd.index(str(tmp_path / "a.mp4")) < cmd.index("[vvar1]") and cmd[-1].endswith("b.mp4")
+
+
+def test_tee_target_muxes_one_encode_into_mp4_and_hls(tmp_path):
+    target = tee_target(
+        [
+            ({"f": "mp4", "movflags": "+faststart"}, tmp_path / "out.mp4"),
+            ({"f": "hls", "hls_time": "2"}, Path("/media/final/job:1/index.m3u8")),
+        ]
+    )
+    assert target == f"[f=mp4:movflags=+faststart]{tmp_path / 'out.mp4'}|[f=hls:hls_time=2]/media/final/job\\:1/index.m3u8"
+
+    graph = FilterGraph(video_label="0:v", audio_label="0:a")
+    graph.add_input(tmp_path / "in.mp4")
+    cmd = graph.multi_output_command([GraphOutput(tmp_path / "out.mp4", ["-f", "tee"], "0:v", "0:a", target=target)])
+    assert cmd[-3:] == ["-f", "tee", target]
+
+
+def test_output_profiles_dedupe_identical_encodes():
+    assert OUTPUT_PROFILES["tiktok"].digest() == RenderProfile().digest()
+    assert OUTPUT_PROFILES["youtube"].digest() != RenderProfile().digest()
+    assert "-maxrate" in OUTPUT_PROFILES["mobile_720p"].encoder_params()
+
+
+@pytest.fixture
+def checkpointed_render(tmp_path):
+    """A persisted render whose session stays open, so `_mark_stage`/`_stage_path` see it."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from backend.models import Base, Render
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'checkpoints.db'}", future=True)
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as session:
+        render = Render(project_id=1, job_id="job-1")
+        session.add(render)
+        session.commit()
+        yield session, render
+    engine.dispose()
+
+
+def _mark_composed(session, render, tmp_path):
+    from backend.models import RenderCheckpoint
+    from backend.workers import tasks_render
+
+    composed = tmp_path / "project_clip_20240101_000000_temp.mp4"
+    composed.write_bytes(b"composed")
+    tasks_render._mark_stage(render, "final", "fp-1", composed)
+    tasks_render._mark_stage(render, "composed", "fp-1", composed)
+    stored = session.query(RenderCheckpoint).filter_by(render_id=render.id).order_by(RenderCheckpoint.stage).all()
+    assert [(row.stage, row.fingerprint, row.path) for row in stored] == [
+        ("composed", "fp-1", str(composed)),
+        ("final", "fp-1", str(composed)),
+    ]
+    return composed
+
+
+def test_retried_render_resumes_from_matching_checkpoints(tmp_path, monkeypatch, checkpointed_render):
+    from backend.workers import tasks_render
+
+    session, render = checkpointed_render
+    composed = _mark_composed(session, render, tmp_path)
+
+    post_processed = []
+    monkeypatch.setattr(tasks_render, "_apply_watermark_and_metadata", lambda temp, final, *args: post_processed.append((temp, final)))
+    monkeypatch.setattr(tasks_render, "_compose_single", lambda *args, **kwargs: pytest.fail("composition re-ran"))
+
+    assert tasks_render._stage_path(render, "final", "fp-1") == composed
+    final_path = tasks_render._compose_video(tmp_path / "clip.mp4", {"segments": []}, None, render, False, resume_key="fp-1")
+    assert final_path == tmp_path / "project_clip_20240101_000000.mp4"
+    assert post_processed == [(composed, final_path)]
+
+
+def test_changed_fingerprint_ignores_stale_checkpoints(tmp_path, monkeypatch, checkpointed_render):
+    from backend.workers import tasks_render
+
+    session, render = checkpointed_render
+    composed = _mark_composed(session, render, tmp_path)
+
+    composed_again = []
+    monkeypatch.setattr(tasks_render, "_apply_watermark_and_metadata", lambda *args: pytest.fail("resumed a stale checkpoint"))
+    monkeypatch.setattr(tasks_render, "_compose_single", lambda *args, **kwargs: composed_again.append(args) or args[6])
+    monkeypatch.setattr(tasks_render.SETTINGS, "final_dir", tmp_path / "final")
+
+    # The same rows still resume the fingerprint they were written for.
+    assert tasks_render._stage_path(render, "final", "fp-1") == composed
+    assert tasks_render._stage_path(render, "final", "fp-2") is None
+    assert tasks_render._stage_path(render, "composed", "fp-2") is None
+    tasks_render._compose_video(
+        tmp_path / "clip.mp4", {"segments": []}, None, render, False, parallel=False, engine="moviepy", resume_key="fp-2"
+    )
+    assert len(composed_again) == 1
@@ -0,0 +1,182 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services.render_cancel import (
+    REASON_PREEMPTED,
+    RenderCanceled,
+    RenderPreempted,
+    clear_cancel,
+    raise_if_canceled,
+    request_cancel,
+)
+from backend.services.render_estimator import ADMIT, DEFER, REJECT, admission_decision, estimate_render, segment_workers
+from backend.services.render_profile import OUTPUT_PROFILES, PREVIEW_PROFILE, RenderProfile
+from backend.workers.queue import PRIORITY_CLASSES, PriorityWorker, requeue_preempted
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode("utf-8")
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def _worker(limit=2):
+    queues = [SimpleNamespace(name=name, count=0) for name, _ in PRIORITY_CLASSES.values()]
+    worker = PriorityWorker.__new__(PriorityWorker)
+    worker.queues = queues
+    worker._ordered_queues = queues[:]
+    worker.starvation_limit = limit
+    worker._skipped = {queue.name: 0 for queue in queues}
+    return worker, queues
+
+
+def test_priority_worker_keeps_strict_order_without_waiting_work():
+    worker, (interactive, normal, bulk) = _worker()
+    for _ in range(5):
+        worker.reorder_queues(interactive)
+    assert worker._ordered_queues == [interactive, normal, bulk]
+
+
+def test_priority_worker_promotes_starved_bulk_queue():
+    worker, (interactive, normal, bulk) = _worker(limit=2)
+    bulk.count = 3
+
+    worker.reorder_queues(interactive)
+    assert worker._ordered_queues[0] is interactive
+    worker.reorder_queues(normal)
+    assert worker._ordered_queues == [bulk, interactive, normal]
+
+    worker.reorder_queues(bulk)
+    assert worker._ordered_queues == [interactive, normal, bulk]
+
+
+def test_cancel_flag_raises_at_checkpoint():
+    redis = _FakeRedis()
+    raise_if_canceled(redis, "job-1")
+
+    request_cancel(redis, "job-1")
+    with pytest.raises(RenderCanceled) as excinfo:
+        raise_if_canceled(redis, "job-1")
+    assert not isinstance(excinfo.value, RenderPreempted)
+
+    request_cancel(redis, "job-1", REASON_PREEMPTED)
+    with pytest.raises(RenderPreempted):
+        raise_if_canceled(redis, "job-1")
+
+    clear_cancel(redis, "job-1")
+    raise_if_canceled(redis, "job-1")
+
+
+def test_requeue_handler_ignores_ordinary_failures():
+    assert requeue_preempted(SimpleNamespace(id="job-1"), ValueError, ValueError("boom"), None) is True
+
+
+def _timeline(effects=()):
+    return {"segments": [{"start": 0.0, "end": 10.0, "effects": list(effects), "captions": []}]}
+
+
+def test_estimate_scales_with_resolution_effects_and_variants():
+    base = estimate_render(10.0, "1920x1080", 30.0, _timeline(), engine="ffmpeg", parallel=False)
+    assert base.output_seconds == 10.0 and base.segments == 1
+    assert estimate_render(10.0, "3840x2160", 30.0, _timeline(), engine="ffmpeg", parallel=False).cpu_seconds > base.cpu_seconds
+    slowmo = estimate_render(10.0, "1920x1080", 30.0, _timeline(["slowmo"]), engine="ffmpeg", parallel=False)
+    assert slowmo.output_seconds > base.output_seconds and slowmo.cpu_seconds > base.cpu_seconds
+    with_variant = estimate_render(
+        10.0, "1920x1080", 30.0, _timeline(), variants=[OUTPUT_PROFILES["youtube"]], engine="ffmpeg", parallel=False
+    )
+    assert with_variant.cpu_seconds > base.cpu_seconds and with_variant.peak_memory_mb > base.peak_memory_mb
+    preview = estimate_render(10.0, "1920x1080", 30.0, _timeline(), PREVIEW_PROFILE, engine="ffmpeg", parallel=False)
+    assert preview.cpu_seconds < base.cpu_seconds
+
+
+def test_empty_timeline_is_costed_over_the_whole_asset():
+    estimate = estimate_render(42.0, "bogus", None, None, engine="ffmpeg", parallel=False)
+    assert estimate.output_seconds == 42.0 and estimate.segments == 1
+
+
+def test_admission_defers_then_rejects_as_load_grows(monkeypatch):
+    from backend.services import render_estimator
+
+    settings = SimpleNamespace(render_capacity_cpu_seconds=100.0, render_admission_reject_factor=2.0, render_worker_memory_mb=4096)
+    monkeypatch.setattr(render_estimator, "get_settings", lambda: settings)
+    estimate = render_estimator.RenderEstimate(cpu_seconds=30.0, peak_memory_mb=500.0, output_seconds=10.0, segments=1)
+
+    assert admission_decision(estimate, 50.0, "normal").action == ADMIT
+    assert admission_decision(estimate, 80.0, "normal").action == DEFER
+    assert admission_decision(estimate, 80.0, "bulk").action == ADMIT
+    rejected = admission_decision(estimate, 180.0, "normal")
+    assert rejected.action == REJECT and rejected.retry_after
+
+    too_big = render_estimator.RenderEstimate(cpu_seconds=1.0, peak_memory_mb=8000.0, output_seconds=1.0, segments=1)
+    refused = admission_decision(too_big, 0.0, "normal")
+    assert refused.action == REJECT and refused.retry_after is None
+
+    # Larger than the limit on its own: retrying after the queues drain would never help.
+    huge = render_estimator.RenderEstimate(cpu_seconds=250.0, peak_memory_mb=500.0, output_seconds=600.0, segments=1)
+    hopeless = admission_decision(huge, 0.0, "normal")
+    assert hopeless.action == REJECT and hopeless.retry_after is None
+
+
+def test_4k_render_caps_segment_workers_to_fit_the_memory_budget(monkeypatch):
+    from backend.services import render_estimator
+
+    settings = SimpleNamespace(
+        render_engine="ffmpeg",
+        render_parallel_segments=True,
+        render_segment_workers=32,
+        render_worker_memory_mb=8192,
+        render_capacity_cpu_seconds=4 * 60 * 60,
+        render_admission_reject_factor=2.0,
+    )
+    monkeypatch.setattr(render_estimator, "get_settings", lambda: settings)
+    uhd = RenderProfile(name="4k", width=2160, height=3840)
+    timeline = {"segments": [{"start": float(index), "end": index + 1.0, "effects": [], "captions": []} for index in range(32)]}
+
+    estimate = estimate_render(32.0, "3840x2160", 30.0, timeline, uhd)
+    workers = segment_workers(3840, 2160, uhd)
+    assert 1 < workers < 32
+    assert estimate.peak_memory_mb <= settings.render_worker_memory_mb
+    assert admission_decision(estimate, 0.0, "normal").action == ADMIT
+
+    # Only a budget too small for a single encoder is a permanent rejection.
+    settings.render_worker_memory_mb = 1024
+    assert segment_workers(3840, 2160, uhd) == 1
+    refused = admission_decision(estimate_render(32.0, "3840x2160", 30.0, timeline, uhd), 0.0, "normal")
+    assert refused.action == REJECT and refused.retry_after is None
+
+
+def test_batch_edit_job_reads_its_prepared_plan_from_the_group_job(monkeypatch, tmp_path):
+    from pathlib import Path
+
+    from backend.services.auto_editor import EditingPlan, VideoClip
+    from backend.workers import tasks_auto_edit
+
+    own = EditingPlan(clips=[VideoClip(path=Path("a.mp4"))])
+    prepared = [EditingPlan(clips=[VideoClip(path=tmp_path / f"normalized_{index}.mp4")], normalized=True) for index in range(2)]
+    edited = []
+    editor = SimpleNamespace(
+        edit_video=lambda plan, on_progress=None: edited.append(plan) or tmp_path / "out.mp4",
+        get_video_duration=lambda path: 4.0,
+    )
+    job = SimpleNamespace(id="edit-1", meta={}, connection=None, save_meta=lambda: None, dependency=SimpleNamespace(result=prepared))
+    monkeypatch.setattr(tasks_auto_edit, "get_current_job", lambda: job)
+    monkeypatch.setattr(tasks_auto_edit, "get_auto_editor", lambda: editor)
+    monkeypatch.setattr(tasks_auto_edit, "publish_progress", lambda *args: None)
+
+    result = tasks_auto_edit.run_auto_edit(own, 1)
+    assert edited == [prepared[1]] and result["output_url"] == "/media/final/out.mp4"
+    assert job.meta["status"] == "finished"
+
+    # A failed or expired group job leaves no result; the edit falls back to its own plan.
+    job.dependency = SimpleNamespace(result=None)
+    tasks_auto_edit.run_auto_edit(own, 1)
+    assert edited[-1] is own
@@ -2,11 +2,14 @@ from pathlib import Path
 
 import librosa
 import numpy as np
+import pytest
 import soundfile as sf
 
 from backend.models import Asset
+from backend.services.auto_editor import AudioTrack, AutoEditor, Caption, EditingPlan, VideoClip
 from backend.services.beat_detection import BeatAnalysis, BeatDetectionService
 from backend.services.captions import CaptionSegment, CaptionService, TranscriptionResult
+from backend.services.thumbnails import plan_sprite, sprite_vtt
 from backend.services.timeline_engine import TimelineEngine
 
 
@@ -55,3 +58,353 @@ def test_timeline_engine_merges_segments(tmp_path):
     first_segment = timeline["segments"][0]
     assert "effects" in first_segment
     assert "captions" in first_segment
+
+
+def test_sprite_layout_and_vtt_index():
+    layout = plan_sprite(duration=25.0, width=1920, height=1080)
+    assert (layout.interval, layout.count, layout.columns, layout.rows) == (2.0, 13, 10, 2)
+    assert (layout.tile_width, layout.tile_height) == (160, 90)
+
+    vtt = sprite_vtt(layout, 25.0, "a_sprite.jpg")
+    assert vtt.startswith("WEBVTT")
+    assert "00:00:00.000 --> 00:00:02.000\na_sprite.jpg#xywh=0,0,160,90" in vtt
+    # The 13th tile sits on the second row; the last cue ends at the asset's duration.
+    assert "00:00:24.000 --> 00:00:25.000\na_sprite.jpg#xywh=320,90,160,90" in vtt
+
+    long_layout = plan_sprite(duration=3600.0, width=1080, height=1920)
+    assert long_layout.count == 100 and long_layout.interval == 36.0
+
+
+def test_auto_editor_compiles_plan_into_one_invocation(tmp_path):
+    editor = AutoEditor.__new__(AutoEditor)
+    editor.temp_dir = tmp_path
+    plan = EditingPlan(
+        clips=[
+            VideoClip(path=Path("a.mp4"), duration=4.0, has_audio=True, effects=["zoom"]),
+            VideoClip(path=Path("b.mp4"), start_time=1.0, end_time=3.0, duration=2.0, has_audio=False),
+            # `duration` is the trimmed length; it is not shortened by start_time again.
+            VideoClip(path=Path("c.mp4"), start_time=2.0, duration=3.0, has_audio=True),
+        ],
+        captions=[Caption(text="Hi", start=0.5, end=2.0)],
+        music=AudioTrack(path=Path("music.mp3"), volume=0.3, fade_out=1.0),
+    )
+
+    cmd = editor.build_single_pass_command(plan, tmp_path / "out.mp4")
+    graph = cmd[cmd.index("-filter_complex") + 1]
+
+    assert cmd.count("ffmpeg") == 1 and cmd.count("-filter_complex") == 1
+    assert cmd[cmd.index("b.mp4") - 5 : cmd.index("b.mp4")] == ["-ss", "1.000", "-t", "2.000", "-i"]
+    assert cmd[cmd.index("c.mp4") - 5 : cmd.index("c.mp4")] == ["-ss", "2.000", "-t", "3.000", "-i"]
+    assert "xfade=transition=fade:duration=0.5:offset=3.500[vx1]" in graph
+    assert "anullsrc=r=48000:cl=stereo" in graph
+    assert "[vx2]ass=" in graph and "afade=t=out:st=7.000" in graph
+    assert cmd[-1].endswith("out.mp4")
+
+
+
+def test_probe_cache_memoizes_by_path_size_and_mtime(tmp_path, monkeypatch):
+    from backend.services import probe_cache
+
+    calls = []
+
+    def fake_ffprobe(args, path):
+        calls.append(args)
+        if "packet=pts_time,flags" in args:
+            return {"packets": [{"pts_time": "2.0", "flags": "K_"}, {"pts_time": "0.5", "flags": "__"}, {"pts_time": "0.0", "flags": "K_"}]}
+        return {
+            "format": {"duration": "12.5"},
+            "streams": [
+                {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080, "avg_frame_rate": "30000/1001", "tags": {"rotate": "90"}},
+                {"codec_type": "audio", "codec_name": "aac"},
+            ],
+        }
+
+    monkeypatch.setattr(probe_cache, "_run_ffprobe", fake_ffprobe)
+    media = tmp_path / "clip.mp4"
+    media.write_bytes(b"v1")
+    persist = tmp_path / "probes.json"
+    cache = probe_cache.ProbeCache(max_entries=2, persist_path=persist)
+
+    probe = cache.probe(media)
+    assert cache.probe(media) is probe and len(calls) == 1
+    assert probe.display_size == (1080, 1920) and probe.has_audio and round(probe.fps, 2) == 29.97
+    assert cache.keyframes(media) == [0.0, 2.0] and cache.keyframes(media) == [0.0, 2.0]
+    assert len(calls) == 2
+
+    # Reloaded from disk without probing again.
+    assert probe_cache.ProbeCache(persist_path=persist).probe(media).duration == 12.5
+    assert len(calls) == 2
+
+    media.write_bytes(b"v2 changed")
+    cache.probe(media)
+    assert len(calls) == 3 and len(cache) == 1
+
+
+def test_probe_cache_processes_sharing_a_file_keep_each_others_entries(tmp_path, monkeypatch):
+    from backend.services import probe_cache
+
+    calls = []
+    monkeypatch.setattr(probe_cache, "_run_ffprobe", lambda args, path: calls.append(path) or {"format": {"duration": "3.0"}})
+    media = [tmp_path / f"{name}.mp4" for name in "abc"]
+    for path in media:
+        path.write_bytes(path.name.encode())
+    persist = tmp_path / "probes.json"
+    api, worker = probe_cache.ProbeCache(persist_path=persist), probe_cache.ProbeCache(persist_path=persist)
+
+    api.probe(media[0])
+    worker.probe(media[1])
+    # The API never saw the worker's entry; its next save must not drop it.
+    api.probe(media[2])
+    assert len(calls) == 3
+
+    restarted = probe_cache.ProbeCache(persist_path=persist)
+    for path in media:
+        restarted.probe(path)
+    assert len(calls) == 3 and len(restarted) == 3
+
+
+def test_clip_normalizer_converts_each_source_once(tmp_path, monkeypatch):
+    from backend.services import clip_normalizer
+    from backend.services.probe_cache import MediaProbe
+
+    settings = clip_normalizer.get_settings()
+    monkeypatch.setattr(settings, "normalized_dir", tmp_path / "normalized")
+    monkeypatch.setattr(clip_normalizer, "probe_media", lambda path: MediaProbe(duration=3.0, has_video=True, has_audio=False))
+    commands = []
+
+    def fake_run(cmd, name="ffmpeg", *args, **kwargs):
+        commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b"normalized")
+
+    monkeypatch.setattr(clip_normalizer, "run_ffmpeg", fake_run)
+    first, second = tmp_path / "a.mp4", tmp_path / "b.mp4"
+    first.write_bytes(b"clip")
+    second.write_bytes(b"clip")  # same bytes: same content address
+    profile = clip_normalizer.normalize_profile(1080, 1920, 30)
+
+    mapping = clip_normalizer.normalize_sources([first, second, first], profile, workers=2)
+    assert mapping[first] == mapping[second] and mapping[first].exists()
+    assert len(commands) <= 2
+    cmd = commands[0]
+    assert "anullsrc=r=48000:cl=stereo" in cmd and "-shortest" in cmd
+    assert "fps=30,scale=1080:1920:force_original_aspect_ratio=decrease" in cmd[cmd.index("-vf") + 1]
+
+    commands.clear()
+    assert clip_normalizer.normalize_sources([second], profile) == {second: mapping[first]}
+    assert commands == []
+
+
+def test_audio_stems_are_mixed_once_per_layout(tmp_path, monkeypatch):
+    from backend.services import audio_stems
+
+    settings = audio_stems.get_settings()
+    monkeypatch.setattr(settings, "stems_dir", tmp_path / "stems")
+    commands = []
+
+    def fake_run(cmd, name="ffmpeg", *args):
+        commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b"pcm")
+
+    monkeypatch.setattr(audio_stems, "run_ffmpeg", fake_run)
+    music, hit = tmp_path / "music.mp3", tmp_path / "hit.wav"
+    music.write_bytes(b"music")
+    hit.write_bytes(b"hit")
+    layout = ((music, 0.0, 0.3, 1.0, 2.0), [(hit, 1.5, 1.0, 0.0, 0.0)])
+
+    stem = audio_stems.ensure_stem(*layout, 10.0)
+    assert stem.tracks == 2 and stem.path.exists() and audio_stems.is_stem(stem.path)
+    graph = commands[0][commands[0].index("-filter_complex") + 1]
+    assert "afade=t=out:st=8.000:d=2.0" in graph and "adelay=1500|1500" in graph
+    assert "amix=inputs=2:duration=longest" in graph and "atrim=duration=10.000" in graph
+
+    assert audio_stems.ensure_stem(*layout, 10.0) == stem and len(commands) == 1
+    assert audio_stems.ensure_stem((music, 0.0, 0.5, 1.0, 2.0), layout[1], 10.0) != stem
+    assert len(commands) == 2
+
+    editor = AutoEditor.__new__(AutoEditor)
+    editor.temp_dir = tmp_path
+    plan = EditingPlan(
+        clips=[VideoClip(path=Path("a.mp4"), duration=10.0, has_audio=True)],
+        music=AudioTrack(path=music, volume=0.3, fade_in=1.0, fade_out=2.0),
+        sfx=[AudioTrack(path=hit, start=1.5)],
+    )
+    stemmed = editor.with_audio_stem(plan)
+    assert stemmed.music.path == stem.path and stemmed.sfx is None and len(commands) == 2
+    assert editor.with_audio_stem(stemmed) is stemmed
+    graph = editor.build_single_pass_command(stemmed, tmp_path / "out.mp4")
+    graph = graph[graph.index("-filter_complex") + 1]
+    assert "amix=inputs=2:duration=first:dropout_transition=2:weights='1 2'" in graph
+
+
+def test_prepare_group_normalizes_shared_sources_once(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from backend.services import auto_editor, clip_normalizer
+    from backend.services.probe_cache import MediaProbe
+
+    settings = clip_normalizer.get_settings()
+    monkeypatch.setattr(settings, "normalized_dir", tmp_path / "normalized")
+    probe = lambda path: MediaProbe(duration=6.0, has_video=True, has_audio=True)
+    monkeypatch.setattr(clip_normalizer, "probe_media", probe)
+    monkeypatch.setattr(auto_editor, "probe_media", probe)
+    commands = []
+
+    def fake_run(cmd, name="ffmpeg", *args, **kwargs):
+        commands.append(cmd)
+        Path(cmd[-1]).write_bytes(b"normalized")
+
+    monkeypatch.setattr(clip_normalizer, "run_ffmpeg", fake_run)
+    first, second = tmp_path / "a.mp4", tmp_path / "b.mp4"
+    first.write_bytes(b"first")
+    second.write_bytes(b"second")
+    editor = AutoEditor.__new__(AutoEditor)
+    editor.settings = SimpleNamespace(auto_edit_normalize=True, auto_edit_audio_stems=False, auto_edit_smart_cut=True)
+    plans = [
+        EditingPlan(clips=[VideoClip(path=first, start_time=1.0, end_time=3.0), VideoClip(path=second)]),
+        EditingPlan(clips=[VideoClip(path=second, start_time=2.0), VideoClip(path=first)]),
+    ]
+
+    prepared = editor.prepare_group(plans)
+    assert len(commands) == 2
+    assert all(plan.normalized for plan in prepared)
+    assert all(clip.path.parent == tmp_path / "normalized" for plan in prepared for clip in plan.clips)
+    # Trims survive normalization and durations are the trimmed lengths.
+    assert [(clip.start_time, clip.duration) for clip in prepared[0].clips] == [(1.0, 2.0), (0.0, 6.0)]
+    assert [(clip.start_time, clip.duration) for clip in prepared[1].clips] == [(2.0, 4.0), (0.0, 6.0)]
+
+
+def test_trimmed_cut_only_edit_never_encodes_whole_sources(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from backend.services import auto_editor
+
+    editor = AutoEditor.__new__(AutoEditor)
+    editor.temp_dir = tmp_path
+    editor.settings = SimpleNamespace(
+        auto_edit_normalize=True, auto_edit_smart_cut=True, auto_edit_audio_stems=True, auto_edit_single_pass=True, final_dir=tmp_path
+    )
+    monkeypatch.setattr(auto_editor, "normalize_sources", lambda *args, **kwargs: pytest.fail("normalized whole sources"))
+    cut, encoded = [], []
+    monkeypatch.setattr(auto_editor, "smart_cut", lambda sources, output_path, *args: cut.append(sources))
+    monkeypatch.setattr(auto_editor, "run_ffmpeg", lambda cmd, *args: encoded.append(cmd))
+
+    def plan():
+        clips = [
+            VideoClip(path=tmp_path / "a.mp4", start_time=5.0, end_time=9.0, has_audio=True),
+            VideoClip(path=tmp_path / "b.mp4", start_time=60.0, end_time=62.0, has_audio=True),
+        ]
+        return EditingPlan(clips=clips, transitions="cut")
+
+    # Sources already in the output format are smart-cut as they are.
+    monkeypatch.setattr(auto_editor, "smart_cut_compatible", lambda paths, profile: True)
+    editor.edit_video(plan())
+    assert cut == [[(tmp_path / "a.mp4", 5.0, 9.0), (tmp_path / "b.mp4", 60.0, 62.0)]] and encoded == []
+
+    # Anything else encodes only the trimmed spans, fitted to the canvas in the same pass.
+    monkeypatch.setattr(auto_editor, "smart_cut_compatible", lambda paths, profile: False)
+    editor.edit_video(plan())
+    assert len(cut) == 1 and len(encoded) == 1
+    cmd = encoded[0]
+    assert cmd[cmd.index(str(tmp_path / "b.mp4")) - 5 : cmd.index(str(tmp_path / "b.mp4"))] == ["-ss", "60.000", "-t", "2.000", "-i"]
+
+
+def test_smart_cut_copies_between_keyframes():
+    from backend.services.smart_cut import CutPiece, plan_cut
+
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert plan_cut(1.0, 7.0, keyframes, 10.0) == [
+        CutPiece(1.0, 2.0, copy=False),
+        CutPiece(2.0, 6.0, copy=True),
+        CutPiece(6.0, 7.0, copy=False),
+    ]
+    # Starting on a keyframe and running to the end of the file copies everything.
+    assert plan_cut(4.0, 10.0, keyframes, 10.0) == [CutPiece(4.0, 10.0, copy=True)]
+    # No whole GOP inside the trim: one re-encode.
+    assert plan_cut(2.5, 3.5, keyframes, 10.0) == [CutPiece(2.5, 3.5, copy=False)]
+
+
+def test_smart_cut_requires_matching_stream_parameters(tmp_path, monkeypatch):
+    from backend.services import smart_cut
+    from backend.services.clip_normalizer import normalize_profile
+    from backend.services.probe_cache import MediaProbe
+
+    def fake_probe(sample_rate):
+        return MediaProbe(
+            duration=10.0,
+            width=1080,
+            height=1920,
+            fps=30.0,
+            has_video=True,
+            has_audio=True,
+            video_codec="h264",
+            audio_codec="aac",
+            streams=[
+                {"codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p"},
+                {"codec_type": "audio", "codec_name": "aac", "sample_rate": sample_rate, "channels": 2},
+            ],
+        )
+
+    probes = {tmp_path / "a.mp4": fake_probe("48000"), tmp_path / "b.mp4": fake_probe("44100")}
+    monkeypatch.setattr(smart_cut, "get_probe_cache", lambda: type("Cache", (), {"probe": lambda self, path: probes[path]})())
+    profile = normalize_profile(1080, 1920, 30)
+
+    assert smart_cut.smart_cut_compatible([tmp_path / "a.mp4"], profile)
+    # Copied 44.1 kHz pieces could not be spliced with 48 kHz re-encoded edges.
+    assert not smart_cut.smart_cut_compatible([tmp_path / "a.mp4", tmp_path / "b.mp4"], profile)
+
+
+def test_stage_pipeline_streams_between_stages(tmp_path):
+    from backend.services.stage_pipeline import PIPE_OUTPUT_ARGS, PipelineStage, stage_commands
+
+    stages = [
+        PipelineStage("transitions", ["-i", "a.mp4", "-i", "b.mp4", "-filter_complex", "xfade"], reads_previous=False),
+        PipelineStage("captions", ["-vf", "ass=c.ass"]),
+        PipelineStage("audio", ["-i", "music.mp3", "-filter_complex", "amix"]),
+        PipelineStage("resize", ["-vf", "scale=1080:1920"]),
+    ]
+    chains = stage_commands(stages, tmp_path / "final.mp4", ["-c:v", "libx264"], tmp_path, checkpoints=["captions"])
+
+    assert [[name for name, _ in chain] for chain in chains] == [["transitions", "captions"], ["audio", "resize"]]
+    (_, transitions), (_, captions) = chains[0]
+    assert transitions[-len(PIPE_OUTPUT_ARGS) - 1 :] == PIPE_OUTPUT_ARGS + ["pipe:1"]
+    assert captions[captions.index("-f") : captions.index("-f") + 4] == ["-f", "nut", "-i", "pipe:0"]
+    checkpoint = captions[-1]
+    assert checkpoint.startswith(str(tmp_path / "captions_")) and captions[-3:-1] == ["-c:v", "libx264"]
+    (_, audio), (_, resize) = chains[1]
+    assert audio[audio.index("-i") + 1] == checkpoint and audio.index(checkpoint) < audio.index("music.mp3")
+    assert resize[-1] == str(tmp_path / "final.mp4")
+
+
+def test_ffmpeg_runner_reports_progress_and_limits(tmp_path):
+    import pytest
+
+    from backend.services import ffmpeg_runner
+
+    fake = tmp_path / "ffmpeg"
+    fake.write_text(
+        "#!/bin/sh\n"
+        'case "$*" in *fail*) echo "Invalid filter" >&2; exit 1;; *hang*) exec sleep 5;; esac\n'
+        "printf 'frame=30\\nout_time_us=1000000\\nspeed=2.5x\\nprogress=continue\\n'\n"
+        "printf 'frame=60\\nout_time_us=2000000\\nspeed=2.5x\\nprogress=end\\n'\n"
+    )
+    fake.chmod(0o755)
+    fractions, updates = [], []
+
+    run = ffmpeg_runner.run_ffmpeg(
+        [str(fake), "-i", "in.mp4", "-vf", "scale=2:2", "out.mp4"],
+        "scale",
+        duration=4.0,
+        on_progress=fractions.append,
+        on_update=updates.append,
+        limits=ffmpeg_runner.ResourceLimits(timeout=10.0, cpu_seconds=30),
+    )
+    assert fractions == [0.25] and updates[-1].done and updates[-1].frame == 60
+    assert run.name == "scale" and run.speed == 2.5 and run.filters == "scale=2:2"
+    assert ffmpeg_runner.timing_summary()["scale"]["count"] >= 1
+
+    with pytest.raises(ffmpeg_runner.FFmpegError) as failed:
+        ffmpeg_runner.run_ffmpeg([str(fake), "fail", "out.mp4"], "broken", limits=ffmpeg_runner.ResourceLimits())
+    assert failed.value.name == "broken" and "Invalid filter" in failed.value.stderr
+
+    with pytest.raises(ffmpeg_runner.FFmpegTimeout):
+        ffmpeg_runner.run_ffmpeg([str(fake), "hang", "out.mp4"], "stuck", limits=ffmpeg_runner.ResourceLimits(timeout=0.2))